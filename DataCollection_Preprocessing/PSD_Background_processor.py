@@ -22,9 +22,17 @@ Key Parameters:
 - `fs_out = 100`: Target resample rate (Hz)
 - `delta_t = 10`: Window length in seconds
 - `overlap = 0.5`: 50% overlap between windows
+- `PAROS_PRECISION=float32` (environment): float32 signal path and float32 PSDs
+  in the output pickle (half the size), see paros_quake/preprocessing.py
+
+Incremental runs:
+- Only waveforms that are new or changed since the last run are processed; the
+  others reuse their PSDs from the previous output (see pipeline_state.py). A
+  change of the parameters above, the filter settings or PAROS_PRECISION
+  reprocesses everything, as does `--full`.
 
 Requirements:
-- numpy, tqdm, pickle, os, Preprocessing_fun script
+- numpy, tqdm, pickle, os, Preprocessing_fun script, pipeline_state
 - Data must include `parost2_141929` waveform key
 
 Note: Events with fewer than 11 windows or insufficient samples are skipped.
@@ -36,7 +44,10 @@ import pickle
 import numpy as np
 import os
 from tqdm import tqdm
-from Preprocessing_fun import preprocess, welch_psd, safe_resample
+from Preprocessing_fun import preprocess, welch_psd, safe_resample, as_waveform
+from pipeline_state import PSDCache, parse_args, psd_settings, waveform_hash
+
+args = parse_args("Background waveforms -> PSD_Windows_Background_100Hz.pkl.")
 
 
 ## --- Load pickle file --- ##
@@ -51,16 +62,23 @@ fs_out = 100        # Target sampling frequency (Hz)
 delta_t = 10        # Window length in seconds
 overlap = 0.5       # 50% overlap
 fs = fs_out
-psdResults = {}
-goodEventCounter = 1
 
-mean_psds = [] # array to store means for each event
+settings = psd_settings(fs_in, fs_out, delta_t, overlap)
+output_path = os.path.join(os.getcwd(), "Exported_Paros_Data/PSD_Windows_Background_100Hz.pkl")
+cache = PSDCache(output_path, settings, full=args.full)
+
 eventNames = list(data.keys())
 for eventName in tqdm(eventNames, colour="green"):
     try:
         eventStuct = data[eventName]
+        inputHash = waveform_hash(eventStuct)
+        found, cachedPSD = cache.lookup(inputHash)
+        if found:
+            cache.add(inputHash, eventName, cachedPSD, reused=True)
+            continue
+
         waveform = eventStuct['waveform']['parost2_141929'][:, -1]
-        waveform = np.array(waveform, dtype=float)
+        waveform = as_waveform(waveform)  # float64, or float32 with PAROS_PRECISION=float32
 
         # Resample the waveform to the target frequency
         waveform = safe_resample(waveform, fs_in, fs_out)
@@ -71,6 +89,7 @@ for eventName in tqdm(eventNames, colour="green"):
 
         if len(waveform) < window_size:
             tqdm.write(f'Skipping {eventName}: not enough samples ({len(waveform)})')
+            cache.add(inputHash, eventName, None, note='not enough samples')
             continue
 
         # Preprocess
@@ -84,6 +103,7 @@ for eventName in tqdm(eventNames, colour="green"):
 
         if num_windows < 11:
             tqdm.write(f'Skipping {eventName}: only {num_windows} windows (need at least 11)')
+            cache.add(inputHash, eventName, None, note='too few windows')
             continue
 
         eventPSD = {}
@@ -98,17 +118,14 @@ for eventName in tqdm(eventNames, colour="green"):
             eventPSD[winName] = {'power': pxx, 'frequency': f}
 
 
-        keyName = f'event_{goodEventCounter:03d}'
-        psdResults[keyName] = eventPSD
-        goodEventCounter += 1
+        cache.add(inputHash, eventName, eventPSD)
 
     except Exception as e:
         tqdm.write(f'Error processing {eventName}: {e}')
 
 
-# Save as pickle
-output_path = os.path.join(os.getcwd(), "Exported_Paros_Data/PSD_Windows_Background_100Hz.pkl")
-with open(output_path, 'wb') as f:
-    pickle.dump(psdResults, f)
-
-print(f'Saved PSDs to {output_path}')
+# Save as pickle (only rewritten if an entry changed)
+if cache.save():
+    print(f'Saved PSDs to {output_path} ({cache.summary()})')
+else:
+    print(f'{output_path} is up to date ({cache.summary()})')
@@ -24,9 +24,17 @@ Parameters:
 - `fs_out = 100`: Output resample rate (Hz)
 - `delta_t = 10`: Window duration (seconds)
 - `overlap = 0.5`: 50% window overlap
+- `PAROS_PRECISION=float32` (environment): float32 signal path and float32 PSDs
+  in the output pickle (half the size), see paros_quake/preprocessing.py
+
+Incremental runs:
+- Only waveforms that are new or changed since the last run are processed; the
+  others reuse their PSDs from the previous output (see pipeline_state.py). A
+  change of the parameters above, the filter settings or PAROS_PRECISION
+  reprocesses everything, as does `--full`.
 
 Dependencies:
-- numpy, tqdm, pickle, os, Preprocessing_fun script
+- numpy, tqdm, pickle, os, Preprocessing_fun script, pipeline_state
 - Assumes waveform data is structured with `waveform['parost2_141929']` and includes `metadata`
 
 Note: This script is nearly identical to the background processor, but includes event metadata
@@ -39,7 +47,10 @@ import pickle
 import numpy as np
 import os
 from tqdm import tqdm
-from Preprocessing_fun import preprocess, welch_psd, safe_resample
+from Preprocessing_fun import preprocess, welch_psd, safe_resample, as_waveform
+from pipeline_state import PSDCache, parse_args, psd_settings, waveform_hash
+
+args = parse_args("Earthquake waveforms -> PSD_Windows_Earthquake_100Hz.pkl.")
 
 ## --- load pickle file --- ##
 file_path = "Exported_Paros_Data/EarthQuakeEvents.pkl"
@@ -55,15 +66,23 @@ fs_out = 100        # target sampling frequency (Hz)
 delta_t = 10        # window length in seconds
 overlap = 0.5       # 50% overlap
 fs = fs_out
-psdResults = {}
-goodEventCounter = 1
+
+settings = psd_settings(fs_in, fs_out, delta_t, overlap)
+output_path = os.path.join(os.getcwd(), "Exported_Paros_Data/PSD_Windows_Earthquake_100Hz.pkl")
+cache = PSDCache(output_path, settings, full=args.full)
 
 eventNames = list(data.keys())
 for eventName in tqdm(eventNames, colour="green"):
     try:
         eventStuct = data[eventName]
+        inputHash = waveform_hash(eventStuct)
+        found, cachedPSD = cache.lookup(inputHash)
+        if found:
+            cache.add(inputHash, eventName, cachedPSD, reused=True)
+            continue
+
         waveform = eventStuct['waveform']['parost2_141929'][:, -1]
-        waveform = np.array(waveform, dtype=float)
+        waveform = as_waveform(waveform)  # float64, or float32 with PAROS_PRECISION=float32
         metadata = eventStuct['metadata']
 
         waveform = safe_resample(waveform, fs_in, fs_out)
@@ -73,6 +92,7 @@ for eventName in tqdm(eventNames, colour="green"):
 
         if len(waveform) < window_size:
             tqdm.write(f'Skipping {eventName}: not enough samples ({len(waveform)})')
+            cache.add(inputHash, eventName, None, note='not enough samples')
             continue
 
         waveform = preprocess(waveform, fs)
@@ -85,6 +105,7 @@ for eventName in tqdm(eventNames, colour="green"):
 
         if num_windows < 11:
             tqdm.write(f'Skipping {eventName}: only {num_windows} windows (need at least 11)')
+            cache.add(inputHash, eventName, None, note='too few windows')
             continue
 
         eventPSD = {'metadata': metadata}
@@ -98,16 +119,13 @@ for eventName in tqdm(eventNames, colour="green"):
 
             eventPSD[winName] = {'power': pxx, 'frequency': f}
                 
-        keyName = f'event_{goodEventCounter:03d}'
-        psdResults[keyName] = eventPSD
-        goodEventCounter += 1
+        cache.add(inputHash, eventName, eventPSD)
             
     except Exception as e:
         tqdm.write(f'Error processing {eventName}: {e}')
         
-# Save as pickle
-output_path = os.path.join(os.getcwd(), "Exported_Paros_Data/PSD_Windows_Earthquake_100Hz.pkl")
-with open(output_path, 'wb') as f:
-    pickle.dump(psdResults, f)
-
-print(f'Saved PSDs with metadata to {output_path}')
\ No newline at end of file
+# Save as pickle (only rewritten if an entry changed)
+if cache.save():
+    print(f'Saved PSDs with metadata to {output_path} ({cache.summary()})')
+else:
+    print(f'{output_path} is up to date ({cache.summary()})')
@@ -13,8 +13,19 @@ Key steps:
 6. Store the retrieved data (if available) in a dictionary with timestamps.
 7. Save the data to a `.pkl` file for later use.
 
+Incremental runs:
+- `background_data.pkl.manifest.json` records every sampled hour and its query
+  result. Later runs keep the sampled hours that are still valid background
+  (a newly added earthquake may exclude some), copy their waveforms from the
+  previous pickle, and only sample and query as many new hours as are needed to
+  get back to 1000. Hours with no data are not queried again unless
+  `--retry-missing` is given; hours whose query failed are retried. On a first
+  run (or with `--full`) the sample is the same as a from-scratch run.
+- Changing the InfluxDB box/sensor or the query window refetches everything.
+  See pipeline_state.py.
+
 Modules required:
-- pandas, numpy, pickle, pathlib, datetime
+- pandas, numpy, pickle, pathlib, datetime, pipeline_state
 - paros_data_grabber.query_influx_data (custom module for InfluxDB queries)
 - tqdm (for progress bar display)
 
@@ -31,6 +42,9 @@ import os
 from pathlib import Path
 from paros_data_grabber import query_influx_data
 from tqdm import tqdm
+from pipeline_state import load_manifest, parse_args, save_output, settings_hash
+
+args = parse_args("Query background hours from InfluxDB into background_data.pkl.", fetch=True)
 
 def generate_background_hours(start_time, end_time, earthquake_datetimes, buffer_hours=1):
     """Generate hourly timestamps excluding ±buffer_hours around earthquake times."""
@@ -51,6 +65,14 @@ def sample_background_hours(available_hours, num_samples, seed=42):
     rng = np.random.default_rng(seed)
     return pd.DatetimeIndex(rng.choice(available_hours, size=num_samples, replace=False))
 
+def update_background_sample(available_hours, kept_hours, num_samples, seed=42):
+    """Keep the previously sampled hours and top the sample up to num_samples."""
+    if len(kept_hours) >= num_samples:
+        return sample_background_hours(kept_hours, num_samples, seed)
+    new_hours = sample_background_hours(available_hours.difference(kept_hours),
+                                        num_samples - len(kept_hours), seed)
+    return kept_hours.union(new_hours)
+
 # --- Load earthquake data ---
 earthquake_data = pd.read_csv("EarthQuakeData.csv")
 earthquake_datetimes = pd.to_datetime(earthquake_data['time'])
@@ -63,23 +85,49 @@ end_time = earthquake_datetimes.max().ceil('h')
 # --- Get valid background hours ---
 background_hours = generate_background_hours(start_time, end_time, earthquake_datetimes, buffer_hours=1)
 
-# --- Sample N background hours ---
-selected_hours = sample_background_hours(background_hours, num_samples=1000)
-
-print(f"Selected {len(selected_hours)} background hours.")
-
 # --- InfluxDB fetch config ---
 box_id = "parost2"
 sensor_id = "141929"
 time_before = timedelta(seconds=15)
 time_after = timedelta(seconds=45)
+settings = {'box_id': box_id, 'sensor_id': sensor_id,
+            'time_before_s': time_before.total_seconds(), 'time_after_s': time_after.total_seconds()}
+
+# --- Previous run: sampled hours, their query results and waveforms ---
+output_file = "Exported_Paros_Data/background_data.pkl"
+manifest = None if args.full else load_manifest(output_file, settings_hash(settings))
+previous_records, previous_data = {}, {}
+if manifest is not None:
+    previous_records = manifest['records']
+    with open(output_file, 'rb') as f:
+        previous_data = pickle.load(f)
+previous_hours = pd.DatetimeIndex(pd.to_datetime(sorted(previous_records))).tz_localize(background_hours.tz)
+kept_hours = previous_hours.intersection(background_hours)
+
+# --- Sample N background hours ---
+selected_hours = update_background_sample(background_hours, kept_hours, num_samples=1000)
+
+print(f"Selected {len(selected_hours)} background hours ({len(kept_hours)} from the previous run).")
 
 # --- Fetch and store ---
 all_data = {}
+records = {}
 event_counter = 1
+queried = added = 0
+
+for idx, timestamp in enumerate(tqdm(selected_hours.sort_values(), desc="Processing Events", colour="green")):
+    hour = timestamp.strftime("%Y-%m-%dT%H:%M:%S")
+    previous = previous_records.get(hour)
+    if previous is not None and previous['status'] == "ok" and previous['output'] in previous_data:
+        key = f"background_{event_counter:04d}"
+        all_data[key] = previous_data[previous['output']]
+        records[hour] = {'status': "ok", 'output': key}
+        event_counter += 1
+        continue
+    if previous is not None and previous['status'] == "no data" and not args.retry_missing:
+        records[hour] = previous
+        continue
 
-for idx in tqdm(range(len(selected_hours)), desc="Processing Events", colour="green"):
-    timestamp = selected_hours.sort_values()[idx]
     try:
         start_t = (timestamp - time_before).strftime("%Y-%m-%dT%H:%M:%S")
         end_t = (timestamp + time_after).strftime("%Y-%m-%dT%H:%M:%S")
@@ -91,30 +139,35 @@ for idx in tqdm(range(len(selected_hours)), desc="Processing Events", colour="gr
             sensor_id=sensor_id,
             password="*****",  # Replace with actual password
         )
+        queried += 1
 
         if not data:
             tqdm.write(f"No data returned for hour {idx+1} at {timestamp}")
+            records[hour] = {'status': "no data", 'output': None}
             continue
 
         data_arrays = {key: df_.values for key, df_ in data.items()}
 
-        all_data[f"background_{event_counter:04d}"] = {
+        key = f"background_{event_counter:04d}"
+        all_data[key] = {
             'waveform': data_arrays,
-            'timestamp': timestamp.strftime("%Y-%m-%dT%H:%M:%S")
+            'timestamp': hour
         }
+        records[hour] = {'status': "ok", 'output': key}
 
         event_counter += 1
+        added += 1
 
     except Exception as e:
         tqdm.write(f"Failed on hour {idx+1}: {e}")
+        # Stays in the sample and is queried again on the next run
+        records[hour] = {'status': "error", 'output': None}
         continue
 
-# --- Save as .mat file ---
-dir = "Exported_Paros_Data"
-os.makedirs(dir, exist_ok=True)
-output_file = "Exported_Paros_Data/background_data.pkl"
-
-with open(output_file, 'wb') as f:
-            pickle.dump(all_data, f)
-        
-print(f"[Done] Data saved to {"Exported_Paros_Data/background_data.pkl"}")
+# --- Save as .pkl file (only rewritten if an hour changed) ---
+os.makedirs("Exported_Paros_Data", exist_ok=True)
+summary = f"{queried} queried, {len(all_data)} hours with data"
+if save_output(output_file, all_data, settings, records, previous_records, changed=added > 0):
+    print(f"[Done] Data saved to {output_file} ({summary})")
+else:
+    print(f"[Done] {output_file} is up to date ({summary})")
@@ -0,0 +1,263 @@
+"""
+Incremental State for the Data Collection Pipeline
+--------------------------------------------------
+
+Lets the four pipeline scripts (generateBackgroundData.py,
+usgsEarthquakeDataGrabber.py and the two PSD processors) redo only the work
+whose inputs changed, instead of refetching and recomputing everything whenever
+one catalog row is added.
+
+Each output pickle gets a manifest next to it (`<output>.manifest.json`) with
+the hash of the settings it was built with and one record per input:
+
+- EarthQuakeEvents.pkl: per catalog id, a hash of the catalog row (time,
+  location, depth, magnitude) and the status of its query. Rows that are new
+  or were revised by USGS are fetched again; the others are copied over.
+- background_data.pkl: per sampled hour, the status of its query. Hours that
+  are still valid background (not within the buffer of a newly added
+  earthquake) are kept, and the sample is topped up with new hours.
+- PSD_Windows_*_100Hz.pkl: per input waveform, a hash of its samples (and
+  metadata) mapped to its entry in the previous output. Only waveforms without
+  a cached entry are processed.
+
+A changed settings hash (query window, station, fs_in / fs_out / delta_t /
+overlap, FILTER_SETTINGS or the code of the preprocessing functions,
+PAROS_PRECISION) invalidates the whole stage. Queries that failed with an
+error are never cached; "no data" results are, unless --retry-missing is given.
+Outputs are renumbered in input order on every run (event_001, ...,
+background_0001, ...), exactly as a full run would number them.
+
+Key Components:
+---------------
+- settings_hash(settings): short, stable hash of a JSON-able dict.
+- psd_settings(fs_in, fs_out, delta_t, overlap): the parameters and code the
+  PSD processors depend on.
+- waveform_hash(entry, sensor): hash of a raw waveform entry.
+- load_manifest(output_path, expected_hash): the previous manifest, if valid.
+- save_output(...): writes an output pickle and its manifest, or only touches
+  the pickle when nothing changed.
+- PSDCache: previous PSD results keyed by waveform hash; collects the new
+  output and writes it (plus manifest) only if something changed.
+- parse_args(description, fetch): the shared --full (and, for the fetchers,
+  --retry-missing) options.
+
+Usage:
+------
+    make                         # incremental: only new / invalidated inputs
+    make FULL=1 -B               # ignore all caches (same as `make rebuild`)
+    python pipeline_state.py stamp Exported_Paros_Data/.psd_settings
+    python pipeline_state.py status
+
+`stamp` rewrites the stamp file only when psd_settings() changed, so the
+Makefile can depend on it; `status` summarizes the manifests.
+
+Dependencies:
+-------------
+- NumPy
+- paros_quake.preprocessing (through the Preprocessing_fun shim)
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+
+DATA_DIR = "Exported_Paros_Data"
+SENSOR = "parost2_141929"
+MIN_WINDOWS = 11
+
+
+def settings_hash(settings):
+    text = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def psd_settings(fs_in, fs_out, delta_t, overlap):
+    """Everything a cached PSD entry depends on besides its waveform."""
+    import Preprocessing_fun as pf
+    code = "".join(inspect.getsource(fn) for fn in
+                   (pf.as_waveform, pf.dc_block, pf.preprocess, pf.welch_psd, pf.safe_resample))
+    return {
+        'fs_in': fs_in, 'fs_out': fs_out, 'delta_t': delta_t, 'overlap': overlap,
+        'min_windows': MIN_WINDOWS, 'pad_to': 6000, 'pad_from': 5700,
+        'filters': pf.FILTER_SETTINGS,
+        'precision': str(pf.PRECISION),
+        'code': hashlib.sha256(code.encode()).hexdigest()[:16],
+    }
+
+
+def waveform_hash(entry, sensor=SENSOR):
+    """Hash of one raw entry: its sensor samples plus its metadata, if any."""
+    samples = np.ascontiguousarray(entry['waveform'][sensor])
+    h = hashlib.sha256()
+    h.update(f"{samples.dtype.str}{samples.shape}".encode())
+    h.update(samples.tobytes())
+    if 'metadata' in entry:
+        h.update(json.dumps(entry['metadata'], sort_keys=True, default=str).encode())
+    return h.hexdigest()[:24]
+
+
+def manifest_path(output_path):
+    return f"{output_path}.manifest.json"
+
+
+def load_manifest(output_path, expected_hash=None):
+    """The manifest of an output, or None if missing, stale or the output is gone."""
+    path = manifest_path(output_path)
+    if not (os.path.exists(path) and os.path.exists(output_path)):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if expected_hash is not None and manifest.get('settings_hash') != expected_hash:
+        return None
+    return manifest
+
+
+def _replace(path, write, mode):
+    # Write next to the target and rename, so an interrupted run never leaves a
+    # truncated pickle behind a manifest that claims it is complete
+    tmp = f"{path}.tmp"
+    with open(tmp, mode) as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def save_pickle(obj, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _replace(path, lambda f: pickle.dump(obj, f), 'wb')
+
+
+def save_manifest(output_path, settings, records):
+    manifest = {'settings_hash': settings_hash(settings), 'settings': settings, 'records': records}
+    _replace(manifest_path(output_path), lambda f: json.dump(manifest, f, indent=1, default=str), 'w')
+
+
+def save_output(output_path, data, settings, records, previous_records, changed):
+    """
+    Write an output pickle and its manifest; returns False (and only refreshes
+    the modification time, which tells make the stage is up to date) when no
+    input was redone and every record maps to the same output key as before,
+    so the rewrite would produce the same file and invalidate the next stage.
+    """
+    outputs = lambda recs: {k: r['output'] for k, r in recs.items()}
+    if not changed and outputs(records) == outputs(previous_records):
+        os.utime(output_path, None)
+        save_manifest(output_path, settings, records)
+        return False
+    save_pickle(data, output_path)
+    save_manifest(output_path, settings, records)
+    return True
+
+
+class PSDCache:
+    """
+    Previous PSD results of one processor, keyed by waveform hash.
+
+    lookup(hash) returns (True, entry) for a cached result (entry is None for
+    inputs that were skipped as too short) and (False, None) otherwise. add()
+    appends results in input order; save() numbers them `<prefix>_001`, ...
+    and writes the output and manifest, or only touches the output when it
+    would come out identical.
+    """
+
+    def __init__(self, output_path, settings, prefix="event", full=False):
+        self.output_path = output_path
+        self.settings = settings
+        self.prefix = prefix
+        self.cached = {}
+        self.previous_records = {}
+        manifest = None if full else load_manifest(output_path, settings_hash(settings))
+        if manifest is not None:
+            with open(output_path, 'rb') as f:
+                previous = pickle.load(f)
+            self.previous_records = manifest['records']
+            for key, record in manifest['records'].items():
+                if record['output'] is None:
+                    self.cached[key] = None
+                elif record['output'] in previous:
+                    self.cached[key] = previous[record['output']]
+        self.results = {}
+        self.records = {}
+        self.reused = self.computed = 0
+
+    def lookup(self, key):
+        if key in self.cached:
+            return True, self.cached[key]
+        return False, None
+
+    def add(self, key, source, entry, note=None, reused=False):
+        name = None
+        if entry is not None:
+            name = f"{self.prefix}_{len(self.results) + 1:03d}"
+            self.results[name] = entry
+        self.records[key] = {'source': source, 'output': name, 'note': note}
+        if reused:
+            self.reused += 1
+        else:
+            self.computed += 1
+
+    def save(self):
+        return save_output(self.output_path, self.results, self.settings, self.records,
+                           self.previous_records, changed=self.computed > 0)
+
+    def summary(self):
+        return (f"{self.computed} processed, {self.reused} reused from cache, "
+                f"{len(self.results)} in output")
+
+
+def parse_args(description, fetch=False):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the manifest and redo every input")
+    if fetch:
+        parser.add_argument("--retry-missing", action="store_true",
+                            help="Query again the inputs that previously returned no data")
+    return parser.parse_args()
+
+
+def _status(folder):
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".manifest.json"):
+            continue
+        with open(os.path.join(folder, name)) as f:
+            manifest = json.load(f)
+        records = manifest['records'].values()
+        counts = {}
+        for record in records:
+            state = record.get('status') or ("ok" if record.get('output') else "skipped")
+            counts[state] = counts.get(state, 0) + 1
+        detail = ", ".join(f"{n} {state}" for state, n in sorted(counts.items()))
+        print(f"{name[:-len('.manifest.json')]:<40} settings {manifest['settings_hash']}  {detail}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline settings stamp and manifest status.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stamp = sub.add_parser("stamp", help="Write the PSD settings to a stamp file if they changed")
+    stamp.add_argument("path")
+    stamp.add_argument("--fs-in", type=int, default=20)
+    stamp.add_argument("--fs-out", type=int, default=100)
+    stamp.add_argument("--delta-t", type=int, default=10)
+    stamp.add_argument("--overlap", type=float, default=0.5)
+    status = sub.add_parser("status", help="Summarize the manifests of the data folder")
+    status.add_argument("--dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        _status(args.dir)
+        sys.exit(0)
+    text = json.dumps(psd_settings(args.fs_in, args.fs_out, args.delta_t, args.overlap),
+                      sort_keys=True, indent=1, default=str) + "\n"
+    if os.path.exists(args.path):
+        with open(args.path) as f:
+            if f.read() == text:
+                sys.exit(0)
+    os.makedirs(os.path.dirname(args.path) or ".", exist_ok=True)
+    with open(args.path, 'w') as f:
+        f.write(text)
+    print(f"PSD settings changed: wrote {args.path}")
@@ -33,11 +33,20 @@ Key Parameters:
 - `box_id`, `sensor_id`, `password`: Required for data access
 
 Dependencies:
-- geopy, pandas, tqdm, pickle, datetime, pathlib
+- geopy, pandas, tqdm, pickle, datetime, pathlib, pipeline_state
 - Requires access to a valid InfluxDB and `paros_data_grabber` module
 
 Note: Events with no waveform data are skipped and a warning is logged via `tqdm.write`.
 
+Incremental runs:
+- `EarthQuakeEvents.pkl.manifest.json` records, per catalog id, a hash of the
+  catalog row and the query result. Later runs only query rows that are new or
+  whose time / location / depth / magnitude changed; the other events are
+  copied from the previous pickle, and events with no data are not queried
+  again (`--retry-missing` does). Changing the station, query window or
+  InfluxDB box/sensor refetches everything, as does `--full`. See
+  pipeline_state.py.
+
 Ethan Gelfand, 08/06/2025
 """
 
@@ -49,14 +58,16 @@ import pandas as pd
 import pickle
 from paros_data_grabber import query_influx_data
 from tqdm import tqdm
+from pipeline_state import load_manifest, parse_args, save_output, settings_hash
 
 
 class InfrasoundUtils:
     @staticmethod
     def surface_wave_delay(event_lat, event_lon, station_lat, station_lon):
         dist_km = geodesic((event_lat, event_lon), (station_lat, station_lon)).km
-        vsurface = 3.4  # km/s typical Rayleigh wave group velocity 
-        return dist_km / vsurface
+        return dist_km / InfrasoundUtils.vsurface
+
+    vsurface = 3.4  # km/s typical Rayleigh wave group velocity
 
 
 class EarthquakeCatalog:
@@ -81,7 +92,8 @@ class EarthquakeCatalog:
 
 class EarthquakeDataExporter:
     def __init__(self, station_lat, station_lon, box_id, sensor_id, password, output_path,
-                 time_before=timedelta(seconds=15), time_after=timedelta(seconds=45)):
+                 time_before=timedelta(seconds=15), time_after=timedelta(seconds=45),
+                 full=False, retry_missing=False):
         self.station_lat = station_lat
         self.station_lon = station_lon
         self.box_id = box_id
@@ -95,7 +107,56 @@ class EarthquakeDataExporter:
         self.data_dict = {}
         self.counter = 1
 
+        # Everything a fetched waveform depends on besides its catalog row
+        self.settings = {
+            'station': [station_lat, station_lon], 'vsurface': InfrasoundUtils.vsurface,
+            'box_id': box_id, 'sensor_id': sensor_id,
+            'time_before_s': time_before.total_seconds(), 'time_after_s': time_after.total_seconds(),
+        }
+        self.retry_missing = retry_missing
+        self.records = {}
+        self.previous_records, self.previous_data = {}, {}
+        self.fetched = self.reused = self.added = 0
+        manifest = None if full else load_manifest(str(self.output_file), settings_hash(self.settings))
+        if manifest is not None:
+            self.previous_records = manifest['records']
+            with open(self.output_file, 'rb') as f:
+                self.previous_data = pickle.load(f)
+
+    @staticmethod
+    def row_id(row):
+        # USGS event id; the event time for catalogs without one
+        return str(row['id']) if 'id' in row and pd.notna(row['id']) else str(row['time'])
+
+    @staticmethod
+    def row_hash(row):
+        return settings_hash({name: str(row[name]) for name in
+                              ('time', 'latitude', 'longitude', 'depth', 'mag', 'magtype')})
+
+    def _store(self, event_id, row_hash, entry):
+        key = f"event_{self.counter:03d}"
+        self.data_dict[key] = entry
+        self.records[event_id] = {'row_hash': row_hash, 'status': "ok", 'output': key}
+        self.counter += 1
+
+    def _cached(self, event_id, row_hash):
+        """Reuse the previous result of an unchanged catalog row; True if reused."""
+        previous = self.previous_records.get(event_id)
+        if previous is None or previous['row_hash'] != row_hash:
+            return False
+        if previous['status'] == "ok" and previous['output'] in self.previous_data:
+            self._store(event_id, row_hash, self.previous_data[previous['output']])
+        elif previous['status'] == "no data" and not self.retry_missing:
+            self.records[event_id] = previous
+        else:
+            return False
+        self.reused += 1
+        return True
+
     def process_event(self, idx, row):
+        event_id, row_hash = self.row_id(row), self.row_hash(row)
+        if self._cached(event_id, row_hash):
+            return
         try:
             event_time = row['time']
             event_lat = row['latitude']
@@ -116,8 +177,10 @@ class EarthquakeDataExporter:
                 password=self.password
             )
 
+            self.fetched += 1
             if not data:
                 tqdm.write(f"[Warning] No data for event {idx+1} at {event_time}")
+                self.records[event_id] = {'row_hash': row_hash, 'status': "no data", 'output': None}
                 return
 
             data_arrays = {key: df_.values for key, df_ in data.items()}
@@ -131,23 +194,26 @@ class EarthquakeDataExporter:
                 'arrival_time': arrival_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
             }
 
-            key = f"event_{self.counter:03d}"
-            self.data_dict[key] = {
+            self._store(event_id, row_hash, {
                 'waveform': data_arrays,
                 'metadata': metadata
-            }
-            self.counter += 1
+            })
+            self.added += 1
 
         except Exception as e:
             tqdm.write(f"[Error] Event {idx+1} failed: {e}")
 
     def export(self):
-        with open(self.output_file, 'wb') as f:
-            pickle.dump(self.data_dict, f)
-        print(f"[Done] Data saved to {self.output_file.resolve()}")
+        summary = f"{self.fetched} queried, {self.reused} reused, {len(self.data_dict)} events"
+        if save_output(str(self.output_file), self.data_dict, self.settings, self.records,
+                       self.previous_records, changed=self.added > 0):
+            print(f"[Done] Data saved to {self.output_file.resolve()} ({summary})")
+        else:
+            print(f"[Done] {self.output_file.resolve()} is up to date ({summary})")
 
 
 if __name__ == "__main__":
+    args = parse_args("Query catalog event waveforms into EarthQuakeEvents.pkl.", fetch=True)
     catalog_path = "EarthQuakeData.csv"
     output_dir = "Exported_Paros_Data"
 
@@ -163,7 +229,9 @@ if __name__ == "__main__":
         box_id=box_id,
         sensor_id=sensor_id,
         password=password,
-        output_path=output_dir
+        output_path=output_dir,
+        full=args.full,
+        retry_missing=args.retry_missing
     )
 
     # Clean event loop with tqdm
@@ -0,0 +1,19 @@
+"""
+Compatibility shim for `import catalog`
+---------------------------------------
+
+The catalog reading and arrival-time helpers live in paros_quake.catalog (see
+the README, "Package and CLI").
+Importing catalog returns that module itself, so its state is shared.
+"""
+
+import os
+import sys
+
+try:
+    import paros_quake.catalog as _module
+except ImportError:  # not installed: use the checkout this folder belongs to
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import paros_quake.catalog as _module
+
+sys.modules[__name__] = _module
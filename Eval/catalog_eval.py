@@ -0,0 +1,229 @@
+"""
+Catalog-Matched Evaluation of Long Prediction Histories
+-------------------------------------------------------
+
+Scores a range scan (prediction store or CSV log) against the USGS catalog in
+`EarthQuakeData.csv`. Every catalog event is turned into an expected arrival
+window at the station using the same surface-wave delay as
+`InfrasoundUtils.surface_wave_delay` (geodesic distance / 3.4 km/s), padded by the
+same 15 s before / 45 s after used when the training events were exported.
+
+Matching is done with sorted interval joins (np.searchsorted over sorted window
+and arrival arrays) instead of nested loops, and all threshold-dependent metrics
+are computed for every threshold at once from sorted scores, so millions of
+prediction windows evaluate in seconds.
+
+Metrics:
+--------
+- Window level: a prediction window is positive if it overlaps any arrival
+  window. Precision, recall, F1 and false alarms per day at a threshold, the ROC
+  curve and its AUC.
+- Event level: an event is detected at threshold t if the highest earthquake
+  probability among the windows overlapping its arrival window is >= t. Events
+  with no prediction window (data gaps) are reported separately.
+- Threshold sweep: the metrics above for a grid of thresholds, as a DataFrame.
+
+Usage:
+------
+    python catalog_eval.py --store LoggedData/prediction_store \\
+        --catalog ../DataCollection_Preprocessing/EarthQuakeData.csv --sweep-out sweep.csv
+    python catalog_eval.py --csv LoggedData/Earthquake_Predictions_5_05_2025.csv
+
+Dependencies:
+-------------
+- NumPy, pandas
+- geopy (arrival windows only, imported on first use)
+- Custom utilities: catalog (station position, surface-wave delay), prediction_store
+  (store input only)
+"""
+
+import argparse
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from catalog import STATION_LAT, STATION_LON, surface_wave_delay
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_catalog(csv_path, min_mag=None):
+    """USGS catalog cleaned the same way as EarthquakeCatalog in usgsEarthquakeDataGrabber.py."""
+    df = pd.read_csv(csv_path)
+    df.columns = df.columns.str.strip().str.lower()
+    df['time'] = pd.to_datetime(df['time'], errors='coerce', utc=True).dt.tz_convert(None)
+    for col in ('latitude', 'longitude', 'depth', 'mag'):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df.dropna(subset=['time', 'latitude', 'longitude'], inplace=True)
+    if min_mag is not None:
+        df = df[df['mag'] >= min_mag]
+    return df.sort_values('time').reset_index(drop=True)
+
+
+def arrival_windows(catalog, station_lat=STATION_LAT, station_lon=STATION_LON,
+                    time_before=15.0, time_after=45.0):
+    """Catalog with arrival_time and the [window_start, window_end) expected at the station."""
+    delays = np.array([surface_wave_delay(lat, lon, station_lat, station_lon)
+                       for lat, lon in zip(catalog['latitude'], catalog['longitude'])])
+    out = catalog.copy()
+    out['arrival_time'] = out['time'] + pd.to_timedelta(delays, unit='s')
+    out['arrival_start'] = out['arrival_time'] - pd.Timedelta(seconds=time_before)
+    out['arrival_end'] = out['arrival_time'] + pd.Timedelta(seconds=time_after)
+    return out.sort_values('arrival_start').reset_index(drop=True)
+
+
+def _ns(series):
+    return pd.to_datetime(series).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+def _union(starts, ends):
+    """Disjoint sorted union of intervals given sorted starts."""
+    if len(starts) == 0:
+        return starts, ends
+    run_end = np.maximum.accumulate(ends)
+    new_group = np.r_[True, starts[1:] > run_end[:-1]]
+    group = np.cumsum(new_group) - 1
+    u_starts = starts[new_group]
+    u_ends = np.zeros(len(u_starts), dtype=ends.dtype)
+    np.maximum.at(u_ends, group, run_end)
+    return u_starts, u_ends
+
+def label_windows(win_start, win_end, arr_start, arr_end):
+    """True for prediction windows overlapping any arrival window (all int64 ns)."""
+    u_start, u_end = _union(arr_start, arr_end)
+    idx = np.searchsorted(u_start, win_end, side='left') - 1
+    valid = idx >= 0
+    labels = np.zeros(len(win_start), dtype=bool)
+    labels[valid] = u_end[idx[valid]] > win_start[valid]
+    return labels
+
+def event_max_prob(win_start, win_end, probs, arr_start, arr_end):
+    """Max probability over the windows overlapping each arrival window (NaN if none)."""
+    lo = np.searchsorted(win_end, arr_start, side='right')
+    hi = np.searchsorted(win_start, arr_end, side='left')
+    covered = hi > lo
+    out = np.full(len(arr_start), np.nan)
+    if covered.any():
+        # reduceat over interleaved (lo, hi) offsets: even slots hold max(probs[lo:hi]).
+        # The sentinel keeps hi == len(probs) a valid offset.
+        bounds = np.stack([lo[covered], hi[covered]], axis=1).ravel()
+        out[covered] = np.maximum.reduceat(np.r_[probs, -np.inf], bounds)[::2]
+    return out
+
+
+def roc_curve(labels, scores):
+    order = np.argsort(-scores, kind='stable')
+    s, y = scores[order], labels[order]
+    distinct = np.r_[np.nonzero(np.diff(s))[0], len(s) - 1]
+    tps = np.cumsum(y)[distinct]
+    fps = (distinct + 1) - tps
+    n_pos, n_neg = y.sum(), len(y) - y.sum()
+    tpr = np.r_[0.0, tps / n_pos] if n_pos else np.full(len(tps) + 1, np.nan)
+    fpr = np.r_[0.0, fps / n_neg] if n_neg else np.full(len(fps) + 1, np.nan)
+    return fpr, tpr, np.r_[np.inf, s[distinct]]
+
+def _trapezoid(y, x):
+    return float(np.sum((x[1:] - x[:-1]) * (y[1:] + y[:-1]) / 2))
+
+
+def threshold_sweep(labels, scores, event_scores, thresholds, days):
+    """Window- and event-level metrics for every threshold, vectorized."""
+    thresholds = np.asarray(thresholds, dtype=float)
+    pos = np.sort(scores[labels])
+    neg = np.sort(scores[~labels])
+    tp = len(pos) - np.searchsorted(pos, thresholds, side='left')
+    fp = len(neg) - np.searchsorted(neg, thresholds, side='left')
+    fn = len(pos) - tp
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), np.nan)
+        recall = tp / len(pos) if len(pos) else np.full(len(thresholds), np.nan)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    covered = np.sort(event_scores[~np.isnan(event_scores)])
+    detected = len(covered) - np.searchsorted(covered, thresholds, side='left')
+
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'tp': tp, 'fp': fp, 'fn': fn,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'false_alarms_per_day': fp / days if days > 0 else np.nan,
+        'events_detected': detected,
+        'event_recall': detected / len(covered) if len(covered) else np.nan,
+    })
+
+
+def evaluate(predictions, catalog, threshold=0.5, thresholds=None, time_before=15.0,
+             time_after=45.0, station_lat=STATION_LAT, station_lon=STATION_LON):
+    """
+    Score a prediction history against catalog arrivals.
+
+    predictions: DataFrame with window_start, window_end, prob_earthquake (e.g. from
+    PredictionStore.query or a CSV log). Returns (summary dict, sweep DataFrame).
+    """
+    preds = predictions.sort_values('window_start', kind='stable')
+    win_start, win_end = _ns(preds['window_start']), _ns(preds['window_end'])
+    probs = preds['prob_earthquake'].to_numpy(dtype=float)
+
+    arrivals = arrival_windows(catalog, station_lat, station_lon, time_before, time_after)
+    arr_start, arr_end = _ns(arrivals['arrival_start']), _ns(arrivals['arrival_end'])
+    if len(win_start):
+        in_span = (arr_end > win_start[0]) & (arr_start < win_end[-1])
+        arr_start, arr_end = arr_start[in_span], arr_end[in_span]
+
+    labels = label_windows(win_start, win_end, arr_start, arr_end)
+    event_scores = event_max_prob(win_start, win_end, probs, arr_start, arr_end)
+    days = (win_end[-1] - win_start[0]) / 86_400e9 if len(win_start) else 0.0
+
+    fpr, tpr, _ = roc_curve(labels, probs)
+    if thresholds is None:
+        thresholds = np.round(np.linspace(0.05, 0.95, 19), 2)
+    thresholds = np.union1d(thresholds, [threshold])
+    sweep = threshold_sweep(labels, probs, event_scores, thresholds, days)
+    at = sweep[sweep['threshold'] == threshold].iloc[0]
+
+    summary = {
+        'windows': int(len(probs)),
+        'positive_windows': int(labels.sum()),
+        'days': float(days),
+        'catalog_events_in_span': int(len(arr_start)),
+        'events_with_coverage': int((~np.isnan(event_scores)).sum()),
+        'roc_auc': _trapezoid(tpr, fpr) if labels.any() and (~labels).any() else None,
+        'threshold': float(threshold),
+        **{k: (float(at[k]) if pd.notna(at[k]) else None)
+           for k in ('precision', 'recall', 'f1', 'false_alarms_per_day', 'event_recall')},
+    }
+    return summary, sweep
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate predictions against the earthquake catalog.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--store", help="PredictionStore directory")
+    source.add_argument("--csv", help="CSV prediction log")
+    parser.add_argument("--catalog", default=os.path.join(REPO_ROOT, "DataCollection_Preprocessing/EarthQuakeData.csv"))
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--min-mag", type=float)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--sweep-out", help="Write the threshold sweep as CSV")
+    args = parser.parse_args()
+
+    if args.store:
+        from prediction_store import PredictionStore
+        predictions = PredictionStore(args.store).query(args.start, args.end)
+    else:
+        predictions = pd.read_csv(args.csv, parse_dates=['window_start', 'window_end'])
+        if args.start:
+            predictions = predictions[predictions['window_start'] >= pd.Timestamp(args.start)]
+        if args.end:
+            predictions = predictions[predictions['window_start'] < pd.Timestamp(args.end)]
+
+    summary, sweep = evaluate(predictions, load_catalog(args.catalog, args.min_mag),
+                              threshold=args.threshold)
+    print(json.dumps(summary, indent=2))
+    print(sweep.to_string(index=False))
+    if args.sweep_out:
+        sweep.to_csv(args.sweep_out, index=False)
@@ -0,0 +1,192 @@
+"""
+Local Stand-In for the Paros InfluxDB Query
+-------------------------------------------
+
+Every data path in Eval goes through `paros_data_grabber.query_influx_data`, which
+needs a live server. FakeInflux answers the same call offline from recorded or
+synthetic 20 Hz Paros waveforms, with configurable query latency and data gaps,
+so the query and monitoring code can be benchmarked and regression-tested
+without network access.
+
+The returned structure mirrors the real query: a dict keyed by
+"{box_id}_{sensor_id}" holding a pandas DataFrame with a 'value' column and the
+sample timestamps as a DatetimeIndex.
+
+Key Components:
+---------------
+- SyntheticSource: deterministic Gaussian background noise with injected
+  earthquake-like bursts at known onset times. The same timestamp always yields
+  the same sample, so overlapping queries agree.
+- RecordedSource: lays the waveforms of `EarthQuakeEvents.pkl` and
+  `background_data.pkl` back to back on a timeline (several background minutes
+  between events). Event onsets sit 15 s into each event segment, matching the
+  time_before used when the events were exported.
+- FakeInflux: wraps a source and exposes `query_influx_data(...)` (also callable
+  directly), adding per-query latency/jitter, fixed gap intervals and random
+  per-minute dropouts.
+
+Usage:
+------
+    from fake_influx import FakeInflux, SyntheticSource
+    fake = FakeInflux(SyntheticSource(start, events=[onset]), latency=0.2, gap_prob=0.05)
+    psd = live_stream_query_for_model(query_fn=fake, end_time=t, mean=mean, std=std)
+
+Dependencies:
+-------------
+- NumPy, pandas
+"""
+
+import pickle
+import time
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+
+SAMPLES_PER_BLOCK = 1200  # one minute at 20 Hz
+
+
+def _to_timestamp(t):
+    ts = pd.Timestamp(t)
+    return ts.tz_convert(None) if ts.tzinfo is not None else ts
+
+
+class SyntheticSource:
+    def __init__(self, start, events=(), fs=20, noise_std=3e-4, event_amplitude=1e-2,
+                 event_duration=30.0, seed=0):
+        self.start = _to_timestamp(start)
+        self.events = sorted(_to_timestamp(e) for e in events)
+        self.fs = fs
+        self.noise_std = noise_std
+        self.event_amplitude = event_amplitude
+        self.event_duration = event_duration
+        self.seed = seed
+
+    def _block(self, b):
+        rng = np.random.default_rng((self.seed, b))
+        return self.noise_std * rng.standard_normal(SAMPLES_PER_BLOCK)
+
+    def samples(self, k0, n):
+        """Samples with global indices k0 .. k0+n-1 (index 0 is self.start)."""
+        k = np.arange(k0, k0 + n)
+        out = np.empty(n)
+        for b in np.unique(k // SAMPLES_PER_BLOCK):
+            sel = (k // SAMPLES_PER_BLOCK) == b
+            out[sel] = self._block(b)[k[sel] % SAMPLES_PER_BLOCK]
+
+        t = k / self.fs
+        for onset in self.events:
+            t0 = (onset - self.start).total_seconds()
+            rel = t - t0
+            active = (rel >= 0) & (rel < self.event_duration)
+            if active.any():
+                r = rel[active]
+                envelope = np.exp(-r / (self.event_duration / 4)) * (1 - np.exp(-r / 0.5))
+                out[active] += self.event_amplitude * envelope * np.sin(2 * np.pi * (1.0 + 0.05 * r) * r)
+        return out
+
+
+class RecordedSource:
+    def __init__(self, start, segments, onsets, fs=20):
+        self.start = _to_timestamp(start)
+        self.fs = fs
+        self.data = np.concatenate(segments) if segments else np.array([])
+        self.events = [self.start + timedelta(seconds=o) for o in onsets]
+
+    @classmethod
+    def from_pickles(cls, eq_path, bg_path, start, background_per_event=10,
+                     sensor_key="parost2_141929", fs=20, time_before=15):
+        with open(eq_path, 'rb') as f:
+            eq_data = pickle.load(f)
+        with open(bg_path, 'rb') as f:
+            bg_data = pickle.load(f)
+
+        def waveform(entry):
+            x = np.array(entry['waveform'][sensor_key][:, -1], dtype=float)
+            x = x[:SAMPLES_PER_BLOCK]
+            return np.pad(x, (0, SAMPLES_PER_BLOCK - len(x)), constant_values=np.nan)
+
+        eq_waves = [waveform(e) for e in eq_data.values()]
+        bg_waves = [waveform(e) for e in bg_data.values()]
+
+        segments, onsets = [], []
+        bg_iter = iter(bg_waves)
+        for eq_wave in eq_waves:
+            for _ in range(background_per_event):
+                bg_wave = next(bg_iter, None)
+                if bg_wave is None:
+                    break
+                segments.append(bg_wave)
+            onsets.append(len(segments) * SAMPLES_PER_BLOCK / fs + time_before)
+            segments.append(eq_wave)
+        segments.extend(bg_iter)
+
+        return cls(start, segments, onsets, fs=fs)
+
+    @property
+    def end(self):
+        return self.start + timedelta(seconds=len(self.data) / self.fs)
+
+    def samples(self, k0, n):
+        out = np.full(n, np.nan)
+        lo, hi = max(k0, 0), min(k0 + n, len(self.data))
+        if hi > lo:
+            out[lo - k0:hi - k0] = self.data[lo:hi]
+        return out
+
+
+class FakeInflux:
+    def __init__(self, source, latency=0.0, jitter=0.0, gaps=(), gap_prob=0.0,
+                 gap_duration=5.0, seed=0):
+        self.source = source
+        self.latency = latency
+        self.jitter = jitter
+        self.gaps = [(_to_timestamp(a), _to_timestamp(b)) for a, b in gaps]
+        self.gap_prob = gap_prob
+        self.gap_duration = gap_duration
+        self.seed = seed
+        self.queries = 0
+        self._rng = np.random.default_rng(seed)
+
+    def _gap_mask(self, times, k):
+        missing = np.zeros(len(times), dtype=bool)
+        for a, b in self.gaps:
+            missing |= (times >= a) & (times < b)
+
+        if self.gap_prob > 0:
+            fs = self.source.fs
+            gap_len = int(self.gap_duration * fs)
+            minutes = k // SAMPLES_PER_BLOCK
+            for m in np.unique(minutes):
+                rng = np.random.default_rng((self.seed, 1, m))
+                if rng.random() < self.gap_prob:
+                    offset = rng.integers(0, SAMPLES_PER_BLOCK - gap_len)
+                    first = m * SAMPLES_PER_BLOCK + offset
+                    missing |= (k >= first) & (k < first + gap_len)
+        return missing
+
+    def query_influx_data(self, start_time, end_time, box_id, sensor_id, password=None):
+        self.queries += 1
+        delay = self.latency + (self.jitter * self._rng.random() if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        fs = self.source.fs
+        start = _to_timestamp(start_time)
+        end = _to_timestamp(end_time)
+        k0 = int(np.ceil((start - self.source.start).total_seconds() * fs))
+        k1 = int(np.ceil((end - self.source.start).total_seconds() * fs))
+        if k1 <= k0:
+            return {}
+
+        k = np.arange(k0, k1)
+        values = self.source.samples(k0, k1 - k0)
+        times = self.source.start + pd.to_timedelta(k / fs, unit='s')
+        keep = ~np.isnan(values) & ~self._gap_mask(times, k)
+        if not keep.any():
+            return {}
+
+        index = pd.DatetimeIndex(times[keep], name='time')
+        return {f"{box_id}_{sensor_id}": pd.DataFrame({'value': values[keep]}, index=index)}
+
+    __call__ = query_influx_data
@@ -0,0 +1,19 @@
+"""
+Compatibility shim for `import gridding`
+----------------------------------------
+
+The timestamp gridding helpers live in paros_quake.gridding (see the README,
+"Package and CLI").
+Importing gridding returns that module itself, so its state is shared.
+"""
+
+import os
+import sys
+
+try:
+    import paros_quake.gridding as _module
+except ImportError:  # not installed: use the checkout this folder belongs to
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import paros_quake.gridding as _module
+
+sys.modules[__name__] = _module
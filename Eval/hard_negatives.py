@@ -0,0 +1,309 @@
+"""
+Hard-Negative Mining over Unlabeled History
+-------------------------------------------
+
+The background class in training is 1,000 random hours from
+generateBackgroundData.py, while the operational cost of the monitor is its false
+positives. This script scans long historical ranges with the trained
+EarthquakeCNN2d, keeps the windows it scores highest that are nowhere near a
+catalog event, and writes them in the PSD pickle format used for training
+(`PSD_Windows_Background_100Hz.pkl`), so they can be added to the background
+class directly.
+
+How it works:
+-------------
+- The range is queried in chunks (one InfluxDB query per `chunk_minutes`, default
+  one hour) and each chunk is cut into 60 s segments on the sample timestamps.
+- Segments whose minute lies within `exclusion` seconds (default 1 h, like the
+  buffer in generateBackgroundData.py) of a catalog arrival window are dropped
+  before feature extraction; arrivals use catalog_eval.arrival_windows.
+- Remaining segments go through psd_windows_from_samples (raw Welch PSDs, as in
+  the PSD processors) and are scored in batches of `batch_size`.
+- Only the `top_n` highest-scoring windows with prob_earthquake >= `min_prob` are
+  kept, in a min-heap, so memory stays bounded by top_n + one chunk regardless
+  of how many months are scanned.
+- Every `checkpoint_every` chunks the current top-N is written to the output
+  pickle, and the scan position and counters to `<output>.progress.json`;
+  `--resume` picks up from there with the counters restored. The run's original
+  `--start` is recorded too: a resume must pass the same one (with `--fake` the
+  synthetic source is built from it, so the resumed run mines the same data).
+
+Output format:
+--------------
+    {event_001: {window_001: {'power', 'frequency'}, ..., window_011: {...},
+                 'metadata': {'window_start', 'window_end', 'prob_earthquake', 'source'}},
+     ...}
+Events are ordered by time. psd_pickle_utils.extract_psd_array only reads the
+window_* keys, so the file loads like any other background pickle, e.g.
+    python train_folds.py --bg PSD_Windows_Background_100Hz.pkl PSD_Windows_HardNegatives_100Hz.pkl
+
+Usage:
+------
+    python hard_negatives.py --start 2025-01-01 --end 2025-04-01 --top-n 2000
+    python hard_negatives.py --start 2025-01-01 --end 2025-04-01 --resume
+
+Dependencies:
+-------------
+- NumPy, pandas, PyTorch
+- Custom utilities: DataQueryUtils, catalog_eval, cnn_model, paros_data_grabber
+  (or a fake_influx.FakeInflux as `query_fn`)
+"""
+
+import argparse
+import contextlib
+import heapq
+import io
+import json
+import os
+import pickle
+from datetime import datetime, timedelta
+import numpy as np
+
+# pandas, torch and the feature path load inside the functions below (and after
+# argument parsing), so `--help` is fast
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class HardNegativeHeap:
+    """Bounded min-heap of the top_n highest-probability windows."""
+
+    def __init__(self, top_n=1000, min_prob=0.5):
+        self.top_n = top_n
+        self.min_prob = min_prob
+        self._heap = []  # (prob, window_start_ns, window_end_ns, power)
+        self.offered = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def offer(self, prob, start_ns, end_ns, power):
+        self.offered += 1
+        if prob < self.min_prob:
+            return
+        item = (float(prob), int(start_ns), int(end_ns), power)
+        if len(self._heap) < self.top_n:
+            heapq.heappush(self._heap, item)
+        elif item[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, item)
+
+    @property
+    def threshold(self):
+        """Probability a new window must beat once the heap is full."""
+        if len(self._heap) < self.top_n:
+            return self.min_prob
+        return self._heap[0][0]
+
+    def items(self):
+        return sorted(self._heap, key=lambda item: item[1])
+
+
+def write_psd_pickle(heap, path, frequency):
+    import pandas as pd
+    psd_struct = {}
+    for i, (prob, start_ns, end_ns, power) in enumerate(heap.items()):
+        event = {f'window_{w+1:03d}': {'power': power[w], 'frequency': frequency}
+                 for w in range(len(power))}
+        event['metadata'] = {
+            'window_start': pd.Timestamp(start_ns).isoformat(),
+            'window_end': pd.Timestamp(end_ns).isoformat(),
+            'prob_earthquake': prob,
+            'source': 'hard_negative',
+        }
+        psd_struct[f'event_{i+1:03d}'] = event
+
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(psd_struct, f)
+    os.replace(tmp, path)
+
+def load_psd_pickle(path, heap):
+    """Refill a heap from a previously written hard-negative pickle; returns the frequency axis."""
+    import pandas as pd
+    with open(path, 'rb') as f:
+        psd_struct = pickle.load(f)
+    frequency = None
+    for event in psd_struct.values():
+        keys = sorted(k for k in event if k.startswith('window_'))
+        power = np.stack([event[k]['power'] for k in keys])
+        frequency = event[keys[0]]['frequency']
+        meta = event['metadata']
+        heap.offer(meta['prob_earthquake'], pd.Timestamp(meta['window_start']).value,
+                   pd.Timestamp(meta['window_end']).value, power)
+    return frequency
+
+
+def write_progress(output, start, next_start, end, stats):
+    with open(output + ".progress.json", 'w') as f:
+        json.dump({'start': start.isoformat(), 'next_start': next_start.isoformat(), 'end': end.isoformat(),
+                   **stats}, f)
+
+
+def split_minutes(df, chunk_start, minutes):
+    """Yield (minute_start, samples) for each 60 s segment of one chunk query."""
+    import pandas as pd
+    index = df.index
+    if getattr(index, 'tz', None) is not None:
+        index = index.tz_convert(None)
+    times = index.values.astype('datetime64[ns]').astype(np.int64)
+    values = df['value'].values
+    bounds = pd.Timestamp(chunk_start).value + np.arange(minutes + 1) * 60 * 10**9
+    cuts = np.searchsorted(times, bounds, side='left')
+    for m in range(minutes):
+        if cuts[m + 1] > cuts[m]:
+            yield int(bounds[m]), values[cuts[m]:cuts[m + 1]]
+
+
+def score_batches(model, features, batch_size=256, device="cpu"):
+    import torch
+    probs = []
+    with torch.no_grad():
+        for i in range(0, len(features), batch_size):
+            batch = torch.from_numpy(features[i:i + batch_size]).unsqueeze(1).to(device)
+            probs.append(torch.softmax(model(batch), dim=1)[:, 1].cpu().numpy())
+    return np.concatenate(probs) if probs else np.array([])
+
+
+def mine_range(query_fn, model, mean, std, start, end, heap, catalog=None, exclusion=3600,
+               chunk_minutes=60, batch_size=256, device="cpu", box_id="parost2",
+               sensor_id="141929", password="*****", output=None, checkpoint_every=24, stats=None,
+               scan_start=None):
+    """
+    Scan [start, end) and offer every non-excluded 60 s window to `heap`.
+
+    Returns (frequency axis, stats dict). With `output` set, the heap, the scan
+    position and the stats are checkpointed every `checkpoint_every` chunks.
+    A resumed scan passes the saved `stats` to continue the counters and the
+    original `scan_start` (default: start) to keep it in the progress file.
+    """
+    import pandas as pd
+    from DataQueryUtils import psd_windows_from_samples, normalize_psd
+    from catalog_eval import arrival_windows, label_windows, _ns
+
+    excl_start = excl_end = np.array([], dtype=np.int64)
+    if catalog is not None and len(catalog):
+        arrivals = arrival_windows(catalog)
+        pad = pd.Timedelta(seconds=exclusion)
+        excl_start = _ns(arrivals['arrival_start'] - pad)
+        excl_end = _ns(arrivals['arrival_end'] + pad)
+
+    key = f"{box_id}_{sensor_id}"
+    frequency = None
+    stats = {'chunks': 0, 'segments': 0, 'excluded': 0, 'scored': 0, 'empty_chunks': 0, **(stats or {})}
+    scan_start = scan_start or start
+    chunk_start = start
+
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(minutes=chunk_minutes), end)
+        minutes = int((chunk_end - chunk_start).total_seconds() // 60)
+        stats['chunks'] += 1
+
+        try:
+            data = query_fn(start_time=chunk_start.isoformat(timespec="seconds"),
+                            end_time=chunk_end.isoformat(timespec="seconds"),
+                            box_id=box_id, sensor_id=sensor_id, password=password)
+        except Exception as e:
+            print(f"Query failed for {chunk_start} to {chunk_end}: {e}")
+            data = {}
+        df = data.get(key) if data else None
+
+        if df is None or df.empty or minutes == 0:
+            stats['empty_chunks'] += 1
+        else:
+            segments = list(split_minutes(df, chunk_start, minutes))
+            stats['segments'] += len(segments)
+            seg_start = np.array([s for s, _ in segments], dtype=np.int64)
+            excluded = label_windows(seg_start, seg_start + 60 * 10**9, excl_start, excl_end)
+            stats['excluded'] += int(excluded.sum())
+
+            kept_start, powers = [], []
+            # The feature path reports short segments on stdout; months of that drown the log
+            with contextlib.redirect_stdout(io.StringIO()):
+                for (s, samples), skip in zip(segments, excluded):
+                    if skip:
+                        continue
+                    windows = psd_windows_from_samples(samples)
+                    if windows is None:
+                        continue
+                    kept_start.append(s)
+                    powers.append(windows[0])
+                    frequency = windows[1]
+
+            if powers:
+                features = np.stack([normalize_psd(p, mean, std) for p in powers])
+                probs = score_batches(model, features, batch_size, device)
+                stats['scored'] += len(probs)
+                for s, p, power in zip(kept_start, probs, powers):
+                    heap.offer(p, s, s + 60 * 10**9, power)
+
+        chunk_start = chunk_end
+        if output and frequency is not None and stats['chunks'] % checkpoint_every == 0:
+            write_psd_pickle(heap, output, frequency)
+            write_progress(output, scan_start, chunk_start, end, stats)
+            print(f"[{chunk_start}] scored {stats['scored']}, kept {len(heap)}, "
+                  f"threshold {heap.threshold:.3f}")
+
+    if output and frequency is not None:
+        write_psd_pickle(heap, output, frequency)
+        write_progress(output, scan_start, chunk_start, end, stats)
+    return frequency, stats
+
+
+if __name__ == "__main__":
+    data_dir = os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data")
+    parser = argparse.ArgumentParser(description="Mine high-probability non-earthquake windows as hard negatives.")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--output", default=os.path.join(data_dir, "PSD_Windows_HardNegatives_100Hz.pkl"))
+    parser.add_argument("--top-n", type=int, default=1000)
+    parser.add_argument("--min-prob", type=float, default=0.5)
+    parser.add_argument("--exclusion", type=float, default=3600,
+                        help="Seconds around each catalog arrival window that are never mined")
+    parser.add_argument("--catalog", default=os.path.join(REPO_ROOT, "DataCollection_Preprocessing/EarthQuakeData.csv"))
+    parser.add_argument("--chunk-minutes", type=int, default=60)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--checkpoint-every", type=int, default=24, help="Chunks between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="Continue from <output>.progress.json")
+    parser.add_argument("--model", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs/fold_5/CNNmodel.pth"))
+    parser.add_argument("--stats-dir", default=data_dir)
+    parser.add_argument("--fake", action="store_true", help="Scan synthetic fake_influx data instead of InfluxDB")
+    args = parser.parse_args()
+
+    import torch
+    from cnn_model import EarthquakeCNN2d
+    from catalog_eval import load_catalog
+
+    scan_start, end = datetime.fromisoformat(args.start), datetime.fromisoformat(args.end)
+    start, stats = scan_start, None
+    heap = HardNegativeHeap(args.top_n, args.min_prob)
+    if args.resume and os.path.exists(args.output + ".progress.json"):
+        with open(args.output + ".progress.json") as f:
+            progress = json.load(f)
+        if 'start' in progress and datetime.fromisoformat(progress['start']) != scan_start:
+            raise SystemExit(f"{args.output}.progress.json belongs to a scan from {progress['start']}; "
+                             f"resume with --start {progress['start']}")
+        start = datetime.fromisoformat(progress['next_start'])
+        stats = {k: v for k, v in progress.items() if k not in ('start', 'next_start', 'end')}
+        load_psd_pickle(args.output, heap)
+        print(f"Resuming at {start} with {len(heap)} hard negatives")
+
+    if args.fake:
+        from fake_influx import FakeInflux, SyntheticSource
+        # The synthetic timeline is anchored at the original start, resumed or not
+        query_fn = FakeInflux(SyntheticSource(scan_start))
+    else:
+        from paros_data_grabber import query_influx_data as query_fn
+
+    mean = np.load(f"{args.stats_dir}/mean.npy")
+    std = np.load(f"{args.stats_dir}/std.npy")
+    model = EarthquakeCNN2d(input_shape=(11, 52))
+    model.load_state_dict(torch.load(args.model, map_location="cpu"))
+    model.eval()
+
+    _, stats = mine_range(query_fn, model, mean, std, start, end, heap,
+                          catalog=load_catalog(args.catalog), exclusion=args.exclusion,
+                          chunk_minutes=args.chunk_minutes, batch_size=args.batch_size,
+                          output=args.output, checkpoint_every=args.checkpoint_every, stats=stats,
+                          scan_start=scan_start)
+    print(json.dumps(stats, indent=2))
+    print(f"Wrote {len(heap)} hard negatives to {args.output}")
@@ -0,0 +1,458 @@
+"""
+Live Monitor with Continuous Ingestion and Hot Model Reload
+-----------------------------------------------------------
+
+Long-running version of the LiveTestModel.ipynb loop. Ingestion and inference
+run independently, and the model comes from a ModelRegistry (model_registry.py)
+instead of a hard-coded checkpoint path, so a new model can be deployed
+without restarting the monitor or losing buffered samples.
+
+Threads:
+--------
+- Ingestion: every `poll_interval` seconds, queries from `max_delay` seconds before
+  the newest buffered sample up to now and merges the result into a bounded
+  in-memory SampleBuffer (`buffer_seconds` of data). Because each query re-reads
+  that trailing span, samples that reach the database after their span was first
+  queried (even behind newer ones) are picked up by the next poll; the buffer
+  inserts them in time order and drops the timestamps it already holds.
+- Registry watcher: every `reload_interval` seconds, checks registry.json. When the
+  active version changes, the new bundle (checkpoint + mean/std + preprocessing
+  config) is loaded and checksum-verified in this thread, then handed over as a
+  pending swap. A bundle that fails to load is reported and the current model stays.
+- Inference (caller's thread, run()): on every minute boundary of the data clock,
+  waits until the buffer covers the minute (or `max_delay` seconds have passed),
+  swaps in a pending model if there is one, then builds the (11, 52) features from
+  the buffered samples, runs the CNN and appends the prediction to the store.
+  With `gridded` (--gridded), the minute's samples are placed on the 20 Hz grid
+  by their timestamps (see gridding.py), so gaps are masked instead of shifting
+  the windows, and minutes with fewer than `min_windows` usable windows are skipped.
+- Snapshot writer (optional, `snapshot_dir`): on class 1 the raw samples from
+  `pre_trigger` s before to `post_trigger` s after the detection window are copied
+  out of the buffer and written as an EarthQuakeEvents.pkl-style entry by a
+  background thread (see waveform_snapshots.py).
+- Metrics endpoint (optional, `metrics_port`): query latency, samples received,
+  preprocessing / inference time, lag behind the clock, skipped minutes and
+  detections in Prometheus text format at http://127.0.0.1:<port>/metrics
+  (see monitor_metrics.py). The metrics are always collected; the port only
+  decides whether they are served.
+
+A swap only replaces one reference between two ticks. Ingestion keeps running
+while a new model loads, so no samples are dropped and no tick is skipped.
+
+Usage:
+------
+    python live_monitor.py --registry model_registry --store LoggedData/live_prediction_store
+    python live_monitor.py --registry model_registry --fake --speed 30 --minutes 10
+    python live_monitor.py --registry model_registry --snapshot-dir LoggedData/snapshots
+    python live_monitor.py --registry model_registry --metrics-port 9108
+    python live_monitor.py --registry model_registry --gridded
+    (in another shell) python model_registry.py --root model_registry activate v2
+
+Dependencies:
+-------------
+- NumPy, pandas, PyTorch
+- Custom utilities: model_registry, DataQueryUtils, gridding, prediction_store,
+  waveform_snapshots, monitor_metrics,
+  paros_data_grabber (or fake_influx.FakeInflux as `query_fn`)
+"""
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+from model_registry import ModelRegistry
+from monitor_metrics import MetricsServer, MonitorMetrics
+from prediction_store import PredictionStore
+
+# pandas, torch and the feature path (DataQueryUtils, gridding, waveform_snapshots)
+# are imported where they are used, so `--help` does not wait for them
+
+
+NS = 10**9
+
+
+class RealClock:
+    def now(self):
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """Clock starting at `start` that runs `speed` times faster than wall time."""
+
+    def __init__(self, start, speed=1.0):
+        self.start = start
+        self.speed = speed
+        self._t0 = time.perf_counter()
+
+    def now(self):
+        return self.start + timedelta(seconds=(time.perf_counter() - self._t0) * self.speed)
+
+    def sleep(self, seconds):
+        time.sleep(seconds / self.speed)
+
+
+class SampleBuffer:
+    """
+    Thread-safe circular buffer of (timestamp ns, value) samples in time order.
+
+    Late (back-filled) samples are merged into place; a timestamp that is already
+    buffered keeps its first value, so overlapping re-queries add nothing.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def latest_ns(self):
+        with self._lock:
+            return int(self._times[(self._next - 1) % self.capacity]) if self._size else None
+
+    def extend(self, times_ns, values):
+        """Add samples (any order); returns how many timestamps were not buffered yet."""
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        with self._lock:
+            rewound = 0
+            latest = self._times[(self._next - 1) % self.capacity]
+            if self._size and len(times_ns) and times_ns.min() <= latest:
+                # Late samples: take back the buffered tail they fall into and rewrite it merged
+                order = (self._next - self._size + np.arange(self._size)) % self.capacity
+                tail = order[np.searchsorted(self._times[order], times_ns.min(), side='left'):]
+                rewound = len(tail)
+                times_ns = np.concatenate([self._times[tail], times_ns])
+                values = np.concatenate([self._values[tail], values])
+                self._next = (self._next - rewound) % self.capacity
+                self._size -= rewound
+            # Sorted and unique; on repeats the first occurrence (the buffered value) wins
+            times_ns, first = np.unique(times_ns, return_index=True)
+            values = values[first]
+            added = len(times_ns) - rewound
+            n = len(times_ns)
+            if n > self.capacity:
+                times_ns, values = times_ns[-self.capacity:], values[-self.capacity:]
+                n = self.capacity
+            idx = (self._next + np.arange(n)) % self.capacity
+            self._times[idx] = times_ns
+            self._values[idx] = values
+            self._next = (self._next + n) % self.capacity
+            self._size = min(self._size + n, self.capacity)
+        return added
+
+    def window(self, start_ns, end_ns):
+        """Samples with start_ns <= t < end_ns, in time order."""
+        with self._lock:
+            order = (self._next - self._size + np.arange(self._size)) % self.capacity
+            times, values = self._times[order], self._values[order]
+        lo, hi = np.searchsorted(times, [start_ns, end_ns], side='left')
+        return times[lo:hi], values[lo:hi]
+
+
+class LiveMonitor:
+    def __init__(self, registry, store, query_fn=None, clock=None, buffer_seconds=600, fs_in=20,
+                 poll_interval=5.0, reload_interval=10.0, max_delay=30.0, box_id="parost2",
+                 sensor_id="141929", password="******",  # Replace with actual password
+                 snapshot_dir=None, pre_trigger=60.0, post_trigger=60.0, metrics_port=None,
+                 metrics_host="127.0.0.1", gridded=False, min_quality=0.9, min_windows=6):
+        self.registry = registry
+        self.store = store
+        if query_fn is None:
+            from DataQueryUtils import query_influx_data as query_fn
+        self.query_fn = query_fn
+        self.clock = clock or RealClock()
+        # The buffer must still hold the pre-trigger samples once the post-trigger ones arrive
+        buffer_seconds = max(buffer_seconds, pre_trigger + 60 + post_trigger + 2 * max_delay)
+        self.buffer = SampleBuffer(int(buffer_seconds * fs_in * 1.2))
+        self.buffer_seconds = buffer_seconds
+        self.snapshots = None
+        if snapshot_dir:
+            from waveform_snapshots import SnapshotWriter
+            self.snapshots = SnapshotWriter(self.buffer, snapshot_dir, clock=self.clock,
+                                            pre_trigger=pre_trigger, post_trigger=post_trigger,
+                                            max_wait=2 * max_delay, key=f"{box_id}_{sensor_id}")
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.max_delay = max_delay
+        self.box_id = box_id
+        self.sensor_id = sensor_id
+        self.password = password
+        self.gridded = gridded
+        self.min_quality = min_quality
+        self.min_windows = min_windows
+
+        self.bundle = None
+        self._pending = None
+        self._swap_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self.stats = {'ticks': 0, 'predictions': 0, 'detections': 0, 'skipped': 0,
+                      'swaps': 0, 'reload_errors': 0, 'query_errors': 0, 'samples': 0}
+        self.swaps = []
+
+        self.metrics = MonitorMetrics()
+        self._add_metric_callbacks()
+        self.metrics_server = MetricsServer(self.metrics, metrics_host, metrics_port) \
+            if metrics_port is not None else None
+
+    def _add_metric_callbacks(self):
+        # Evaluated only when the endpoint is scraped
+        m = self.metrics
+        m.gauge("buffer_samples", "Samples held in the ring buffer", lambda: len(self.buffer))
+        m.gauge("ingest_lag_seconds", "Monitor clock seconds since the newest buffered sample",
+                self._ingest_lag)
+        m.gauge("model_info", "Active model version",
+                lambda: [({'version': self.bundle.version}, 1)] if self.bundle else None)
+        if self.snapshots:
+            m.counter("snapshots_written_total", "Waveform snapshots written",
+                      lambda: len(self.snapshots.written))
+            m.counter("snapshots_dropped_total", "Snapshot requests dropped on a full queue",
+                      lambda: self.snapshots.dropped)
+
+    def _ingest_lag(self):
+        latest = self.buffer.latest_ns
+        if latest is None:
+            return None
+        import pandas as pd
+        return (pd.Timestamp(self.clock.now()).value - latest) / NS
+
+    # --- Ingestion ---
+    def _poll(self, since):
+        import pandas as pd
+        until = self.clock.now().replace(microsecond=0)
+        if until <= since:
+            return since
+        t0 = time.perf_counter()
+        try:
+            data = self.query_fn(start_time=since.isoformat(timespec="seconds"),
+                                 end_time=until.isoformat(timespec="seconds"),
+                                 box_id=self.box_id, sensor_id=self.sensor_id, password=self.password)
+        except Exception as e:
+            self.stats['query_errors'] += 1
+            self.metrics.query_errors.inc()
+            print("Error during ingestion query:", e)
+            return since  # retry the same span on the next poll
+        self.metrics.query_seconds.observe(time.perf_counter() - t0)
+
+        df = data.get(f"{self.box_id}_{self.sensor_id}") if data else None
+        if df is not None and not df.empty:
+            index = pd.DatetimeIndex(df.index)
+            if index.tz is not None:
+                index = index.tz_convert(None)
+            times = index.values.astype('datetime64[ns]').astype(np.int64)
+            n = self.buffer.extend(times, df['value'].values.astype(float))
+            self.stats['samples'] += n
+            self.metrics.samples.inc(n)
+        # Next query re-reads max_delay seconds behind the newest sample (or stays at
+        # `since` while nothing arrived), so late samples are merged in; never further
+        # back than the buffer can hold
+        latest = self.buffer.latest_ns
+        if latest is not None:
+            since = (pd.Timestamp(latest) - pd.Timedelta(seconds=self.max_delay)).to_pydatetime()
+            since = since.replace(microsecond=0)
+        return max(since, until - timedelta(seconds=self.buffer_seconds))
+
+    def _ingest_loop(self, since):
+        while not self._stop.is_set():
+            since = self._poll(since)
+            self.clock.sleep(self.poll_interval)
+
+    # --- Hot reload ---
+    def _check_registry(self):
+        active = self.registry.active_version()
+        current = self._pending or self.bundle
+        if active is None or (current is not None and current.version == active):
+            return
+        try:
+            bundle = self.registry.load(active)
+        except Exception as e:
+            self.stats['reload_errors'] += 1
+            self.metrics.reload_errors.inc()
+            print(f"Failed to load model {active}, keeping {self.bundle.version}: {e}")
+            return
+        with self._swap_lock:
+            self._pending = bundle
+
+    def _watch_loop(self):
+        revision = self.registry.revision()
+        while not self._stop.is_set():
+            self.clock.sleep(self.reload_interval)
+            new_revision = self.registry.revision()
+            if new_revision != revision:
+                revision = new_revision
+                self._check_registry()
+
+    def _swap_if_pending(self, tick):
+        with self._swap_lock:
+            pending, self._pending = self._pending, None
+        if pending is not None and (self.bundle is None or pending.version != self.bundle.version):
+            old = self.bundle.version if self.bundle else None
+            self.bundle = pending
+            self.stats['swaps'] += 1
+            self.metrics.swaps.inc()
+            self.swaps.append({'tick': tick.isoformat(), 'from': old, 'to': pending.version})
+            print(f"[{tick}] Swapped model {old} -> {pending.version}")
+
+    # --- Inference ---
+    def predict(self, window_start, window_end):
+        import pandas as pd
+        import torch
+        from DataQueryUtils import psd_features_from_grid, psd_features_from_samples
+        from gridding import grid_samples
+        bundle = self.bundle
+        start_ns, end_ns = pd.Timestamp(window_start).value, pd.Timestamp(window_end).value
+        times, samples = self.buffer.window(start_ns, end_ns)
+        if len(samples) == 0:
+            return None
+        config = bundle.config
+        t0 = time.perf_counter()
+        if self.gridded:
+            grid, valid, _ = grid_samples(times, samples, start_ns, fs=config['fs_in'],
+                                          n_samples=int((end_ns - start_ns) / NS * config['fs_in']))
+            features, _ = psd_features_from_grid(grid, valid, fs_in=config['fs_in'], fs_out=config['fs_out'],
+                                                 window_duration=config['window_duration'],
+                                                 overlap=config['overlap'], mean=bundle.mean, std=bundle.std,
+                                                 min_quality=self.min_quality, min_windows=self.min_windows)
+        else:
+            features = psd_features_from_samples(samples, fs_in=config['fs_in'], fs_out=config['fs_out'],
+                                                 window_duration=config['window_duration'],
+                                                 overlap=config['overlap'], mean=bundle.mean, std=bundle.std)
+        t1 = time.perf_counter()
+        self.metrics.preprocessing_seconds.observe(t1 - t0)
+        if features is None:
+            return None
+        with torch.no_grad():
+            probs = torch.softmax(bundle.model(torch.from_numpy(features)[None, None]), dim=1).numpy()[0]
+        self.metrics.inference_seconds.observe(time.perf_counter() - t1)
+        return int(np.argmax(probs)), probs
+
+    def start(self, backfill=120):
+        self.bundle = self.registry.load()
+        print(f"Loaded model {self.bundle.version}")
+        if self.metrics_server:
+            self.metrics_server.start()
+            print(f"Serving metrics at http://{self.metrics_server.host}:{self.metrics_server.port}/metrics")
+        # Backfill so the first tick already has a full minute buffered
+        since = self._poll((self.clock.now() - timedelta(seconds=backfill)).replace(microsecond=0))
+        self._threads = [threading.Thread(target=self._ingest_loop, args=(since,), daemon=True, name="ingest"),
+                         threading.Thread(target=self._watch_loop, daemon=True, name="registry-watch")]
+        for t in self._threads:
+            t.start()
+        if self.snapshots:
+            self.snapshots.start()
+
+    def run(self, minutes=None):
+        """Run inference ticks on minute boundaries; forever unless `minutes` is given."""
+        import pandas as pd
+        now = self.clock.now()
+        tick = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        done = 0
+        while minutes is None or done < minutes:
+            tick_ns = pd.Timestamp(tick).value
+            while not self._stop.is_set():
+                latest = self.buffer.latest_ns
+                if latest is not None and latest >= tick_ns - NS // 20:
+                    break
+                if self.clock.now() >= tick + timedelta(seconds=self.max_delay):
+                    break
+                self.clock.sleep(0.5)
+            if self._stop.is_set():
+                break
+
+            self._swap_if_pending(tick)
+            window_start = tick - timedelta(seconds=60)
+            result = self.predict(window_start, tick)
+            self.stats['ticks'] += 1
+            self.metrics.ticks.inc()
+            if result is None:
+                self.stats['skipped'] += 1
+                self.metrics.skipped.inc()
+                print(f"[{tick}] No complete minute of data, skipping")
+            else:
+                pred, probs = result
+                self.stats['predictions'] += 1
+                self.stats['detections'] += pred == 1
+                self.metrics.predictions.inc()
+                self.metrics.detections.inc(int(pred == 1))
+                self.metrics.prob_earthquake.observe(float(probs[1]))
+                print(f"[{tick}] model {self.bundle.version} | Predicted class: {pred} | Probabilities: {probs}")
+                stored = self.clock.now()
+                self.store.append(window_start, tick, pred, probs[1], prob_background=probs[0],
+                                  query_time=stored)
+                self.metrics.last_prediction.set(stored.replace(tzinfo=timezone.utc).timestamp())
+                if pred == 1 and self.snapshots:
+                    self.snapshots.trigger(window_start, tick, {'prob_earthquake': float(probs[1]),
+                                                                'model_version': self.bundle.version})
+            # Observed on skipped ticks too, so a stalled feed shows up as growing lag
+            lag = (self.clock.now() - tick).total_seconds()
+            self.metrics.tick_lag.observe(lag)
+            self.metrics.last_tick_lag.set(lag)
+            tick += timedelta(minutes=1)
+            done += 1
+
+    def stop(self):
+        self._stop.set()
+        if self.snapshots:
+            self.snapshots.stop(timeout=10)
+        for t in self._threads:
+            t.join(timeout=5)
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live monitor with registry-driven hot model reload.")
+    parser.add_argument("--registry", default="model_registry")
+    parser.add_argument("--store", default="LoggedData/live_prediction_store")
+    parser.add_argument("--minutes", type=int, help="Stop after this many ticks (default: run forever)")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--reload-interval", type=float, default=10.0)
+    parser.add_argument("--snapshot-dir", help="Write raw waveform snapshots of detections here")
+    parser.add_argument("--pre-trigger", type=float, default=60.0)
+    parser.add_argument("--post-trigger", type=float, default=60.0)
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Interface of the metrics endpoint")
+    parser.add_argument("--gridded", action="store_true",
+                        help="Grid samples by timestamp and mask gappy windows (see gridding.py)")
+    parser.add_argument("--fake", action="store_true", help="Ingest synthetic fake_influx data")
+    parser.add_argument("--speed", type=float, default=1.0, help="Simulated clock speed (with --fake)")
+    args = parser.parse_args()
+
+    clock = query_fn = None
+    if args.fake:
+        from fake_influx import FakeInflux, SyntheticSource
+        start = RealClock().now().replace(second=0, microsecond=0)
+        clock = SimulatedClock(start, args.speed)
+        query_fn = FakeInflux(SyntheticSource(start - timedelta(hours=1)))
+
+    monitor = LiveMonitor(ModelRegistry(args.registry), PredictionStore(args.store, batch_size=10),
+                          query_fn=query_fn, clock=clock, poll_interval=args.poll_interval,
+                          reload_interval=args.reload_interval, snapshot_dir=args.snapshot_dir,
+                          pre_trigger=args.pre_trigger, post_trigger=args.post_trigger,
+                          metrics_port=args.metrics_port, metrics_host=args.metrics_host,
+                          gridded=args.gridded)
+    monitor.start()
+    try:
+        monitor.run(args.minutes)
+    except KeyboardInterrupt:
+        print("Program terminated by user. Exiting gracefully.")
+    finally:
+        monitor.stop()
+        report = {**monitor.stats, 'swaps': monitor.swaps}
+        if monitor.snapshots:
+            report['snapshots'] = monitor.snapshots.written
+            report['snapshots_dropped'] = monitor.snapshots.dropped
+        print(json.dumps(report, indent=2, default=int))
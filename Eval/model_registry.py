@@ -0,0 +1,231 @@
+"""
+Model Registry for the Live Monitor
+-----------------------------------
+
+Keeps every deployable model as a versioned bundle: the checkpoint, the mean/std
+it was trained with, the preprocessing configuration, and SHA-256 checksums of
+all three files. One version is marked active; the live monitor (live_monitor.py)
+watches the registry and swaps to a newly activated version between inference
+ticks.
+
+Layout:
+-------
+    <root>/registry.json          {"active": version, "versions": {version: entry}}
+    <root>/<version>/CNNmodel.pth
+    <root>/<version>/mean.npy
+    <root>/<version>/std.npy
+
+Each entry holds the file names, their checksums, the preprocessing config
+(fs_in, fs_out, window_duration, overlap, input_shape, plus the model
+architecture and its keyword arguments, default EarthquakeCNN2d), the source
+paths and the registration time. registry.json is replaced atomically, so a reader never sees
+a half-written file.
+
+Usage:
+------
+    python model_registry.py --root model_registry register \\
+        --checkpoint ../ModelTraining/fold_outputs/fold_5/CNNmodel.pth \\
+        --stats-dir ../DataCollection_Preprocessing/Exported_Paros_Data --activate
+    python model_registry.py --root model_registry activate v2
+    python model_registry.py --root model_registry list
+    python model_registry.py --root model_registry verify
+
+    registry = ModelRegistry("model_registry")
+    bundle = registry.load()          # active version, checksums verified
+
+Dependencies:
+-------------
+- NumPy, PyTorch (loading bundles only; list, activate and verify do not import it)
+- Custom utilities: cnn_model
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+import numpy as np
+
+
+DEFAULT_PREPROCESSING = {
+    'fs_in': 20,
+    'fs_out': 100,
+    'window_duration': 10,
+    'overlap': 0.5,
+    'input_shape': [11, 52],
+    'architecture': "EarthquakeCNN2d",
+    'model_kwargs': {},
+}
+BUNDLE_FILES = {'checkpoint': "CNNmodel.pth", 'mean': "mean.npy", 'std': "std.npy"}
+
+
+def sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelBundle:
+    """A loaded, verified registry version ready for inference."""
+
+    def __init__(self, version, model, mean, std, config, checksum):
+        self.version = version
+        self.model = model
+        self.mean = mean
+        self.std = std
+        self.config = config
+        self.checksum = checksum
+
+    def __repr__(self):
+        return f"ModelBundle(version={self.version!r}, checksum={self.checksum[:12]})"
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, "registry.json")
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {'active': None, 'versions': {}}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _write(self, data):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def versions(self):
+        return self._read()['versions']
+
+    def active_version(self):
+        return self._read()['active']
+
+    def revision(self):
+        """Changes whenever registry.json is rewritten; cheap to poll."""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def register(self, checkpoint, mean_path, std_path, config=None, version=None,
+                 activate=False, notes=None):
+        data = self._read()
+        if version is None:
+            version = f"v{len(data['versions']) + 1}"
+        if version in data['versions']:
+            raise ValueError(f"Version {version} is already registered")
+
+        folder = os.path.join(self.root, version)
+        os.makedirs(folder, exist_ok=True)
+        sources = {'checkpoint': checkpoint, 'mean': mean_path, 'std': std_path}
+        for key, src in sources.items():
+            shutil.copyfile(src, os.path.join(folder, BUNDLE_FILES[key]))
+
+        entry = {
+            'files': dict(BUNDLE_FILES),
+            'sha256': {key: sha256(os.path.join(folder, name)) for key, name in BUNDLE_FILES.items()},
+            'config': {**DEFAULT_PREPROCESSING, **(config or {})},
+            'source': {key: os.path.abspath(src) for key, src in sources.items()},
+            'registered': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'notes': notes,
+        }
+        self._load_files(version, entry)  # refuse bundles the monitor could not load
+
+        data['versions'][version] = entry
+        if activate or data['active'] is None:
+            data['active'] = version
+        self._write(data)
+        return version
+
+    def activate(self, version):
+        data = self._read()
+        if version not in data['versions']:
+            raise KeyError(f"Unknown version {version}")
+        data['active'] = version
+        self._write(data)
+
+    def verify(self, version):
+        """Names of bundle files whose checksum no longer matches the registry."""
+        entry = self.versions()[version]
+        folder = os.path.join(self.root, version)
+        return [key for key, name in entry['files'].items()
+                if not os.path.exists(os.path.join(folder, name))
+                or sha256(os.path.join(folder, name)) != entry['sha256'][key]]
+
+    def _load_files(self, version, entry):
+        # torch is only needed to load a bundle, not to list / activate / verify
+        import torch
+        from cnn_model import build_model
+        folder = os.path.join(self.root, version)
+        config = entry['config']
+        # Entries registered before architectures were configurable have neither key
+        model = build_model(config['input_shape'], config.get('architecture', "EarthquakeCNN2d"),
+                            **config.get('model_kwargs', {}))
+        model.load_state_dict(torch.load(os.path.join(folder, entry['files']['checkpoint']),
+                                         map_location="cpu"))
+        model.eval()
+        mean = np.load(os.path.join(folder, entry['files']['mean']))
+        std = np.load(os.path.join(folder, entry['files']['std']))
+        if mean.shape != tuple(config['input_shape']) or std.shape != mean.shape:
+            raise ValueError(f"mean/std shape {mean.shape} does not match input_shape {config['input_shape']}")
+        return ModelBundle(version, model, mean, std, config, entry['sha256']['checkpoint'])
+
+    def load(self, version=None):
+        """Load a version (default: the active one) after verifying its checksums."""
+        data = self._read()
+        version = version or data['active']
+        if version is None:
+            raise LookupError(f"No active model in {self.root}")
+        bad = self.verify(version)
+        if bad:
+            raise ValueError(f"Checksum mismatch for {version}: {', '.join(bad)}")
+        return self._load_files(version, data['versions'][version])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the live monitor's model registry.")
+    parser.add_argument("--root", default="model_registry")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_reg = sub.add_parser("register")
+    p_reg.add_argument("--checkpoint", required=True)
+    p_reg.add_argument("--stats-dir", required=True, help="Folder with the matching mean.npy / std.npy")
+    p_reg.add_argument("--version")
+    p_reg.add_argument("--config", help="JSON with preprocessing overrides")
+    p_reg.add_argument("--notes")
+    p_reg.add_argument("--activate", action="store_true")
+
+    p_act = sub.add_parser("activate")
+    p_act.add_argument("version")
+
+    sub.add_parser("list")
+    sub.add_parser("verify")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "register":
+        version = registry.register(args.checkpoint, os.path.join(args.stats_dir, "mean.npy"),
+                                    os.path.join(args.stats_dir, "std.npy"),
+                                    config=json.loads(args.config) if args.config else None,
+                                    version=args.version, activate=args.activate, notes=args.notes)
+        print(f"Registered {version} (active: {registry.active_version()})")
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"Active version: {args.version}")
+    elif args.command == "list":
+        active = registry.active_version()
+        for version, entry in registry.versions().items():
+            mark = "*" if version == active else " "
+            print(f"{mark} {version:<8} {entry['registered']}  {entry['sha256']['checkpoint'][:12]}  "
+                  f"{entry['source']['checkpoint']}")
+    else:
+        for version in registry.versions():
+            bad = registry.verify(version)
+            print(f"{version}: {'OK' if not bad else 'MISMATCH ' + ', '.join(bad)}")
@@ -0,0 +1,261 @@
+"""
+Prometheus Metrics Endpoint for the Live Monitor
+------------------------------------------------
+
+Counters, gauges and histograms for live_monitor.py, served over HTTP in the
+Prometheus text exposition format (version 0.0.4), so stalled queries, growing
+lag, skipped minutes and drift in the predicted probabilities can be graphed
+and alerted on instead of read from print statements.
+
+Design:
+-------
+- Standard library only (no prometheus_client): a few metric types that keep
+  plain numbers behind a lock. Updating one (inc / observe) is a lock plus an
+  addition or a bisect over the bucket bounds, about a microsecond, against
+  tens of milliseconds per inference tick.
+- Histograms keep one count per bucket and are made cumulative only when the
+  endpoint is scraped; gauges can instead take a callback evaluated at scrape
+  time (buffer fill, age of the newest sample), so the hot loop does nothing
+  for them.
+- MetricsServer serves GET /metrics from a daemon thread (ThreadingHTTPServer),
+  by default on 127.0.0.1 only.
+
+Metrics (prefix paros_monitor_):
+--------------------------------
+- query_duration_seconds (histogram), query_errors_total, samples_received_total
+- preprocessing_seconds, inference_seconds (histograms, per tick)
+- tick_lag_seconds (histogram): monitor clock time when a tick finished
+  (prediction stored, or minute skipped) minus the end of its minute, observed
+  on every tick; last_tick_lag_seconds (gauge)
+- last_prediction_timestamp_seconds (gauge): Unix time (monitor clock) of the
+  latest stored prediction, 0 before the first; alert on
+  time() - paros_monitor_last_prediction_timestamp_seconds when minutes keep
+  being skipped
+- ingest_lag_seconds (gauge): monitor clock time minus the newest buffered sample
+- ticks_total, skipped_minutes_total, predictions_total, detections_total
+  (detection rate: rate(detections_total[1h]) / rate(predictions_total[1h]))
+- prob_earthquake (histogram): distribution of the class 1 probability
+- buffer_samples, model_swaps_total, reload_errors_total,
+  model_info{version="..."}, snapshots_written_total, snapshots_dropped_total
+
+Usage:
+------
+    python live_monitor.py --registry model_registry --metrics-port 9108
+    curl -s localhost:9108/metrics
+
+    metrics = MonitorMetrics()
+    server = MetricsServer(metrics, port=9108).start()
+    metrics.inference_seconds.observe(0.012)
+    server.stop()
+
+Dependencies:
+-------------
+- Standard library
+"""
+
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.5, 1, 2, 5, 10, 15, 20, 30, 45, 60, 120, 300, 600)
+PROB_BUCKETS = (0.01, 0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99)
+
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self.fn() if self.fn is not None else self._value
+
+    def samples(self):
+        return [(self.name, None, self.value)]
+
+
+class Gauge:
+    """
+    Gauge set by the caller, or computed by fn() at scrape time. fn may return a
+    number, None (no sample) or a list of (labels dict, value) pairs.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = value  # a single assignment, no lock needed
+
+    def samples(self):
+        value = self.fn() if self.fn is not None else self._value
+        if value is None:
+            return []
+        if isinstance(value, list):
+            return [(self.name, labels, v) for labels, v in value]
+        return [(self.name, None, value)]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.bounds = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.bounds) + 1)  # last one: above every bound
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        out, cumulative = [], 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            out.append((f"{self.name}_bucket", {'le': _format_value(float(bound))}, cumulative))
+        out.append((f"{self.name}_sum", None, total))
+        out.append((f"{self.name}_count", None, cumulative))
+        return out
+
+
+class MetricsRegistry:
+    """Ordered collection of metrics rendered together as one exposition."""
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, fn=None):
+        return self._add(Counter(self.prefix + name, help_text, fn))
+
+    def gauge(self, name, help_text, fn=None):
+        return self._add(Gauge(self.prefix + name, help_text, fn))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help_text, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:  # a failing callback must not take down the endpoint
+                lines.append(f"# {metric.name} unavailable: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+class MonitorMetrics(MetricsRegistry):
+    """The metrics LiveMonitor updates; the callback gauges are added by the monitor."""
+
+    def __init__(self, prefix="paros_monitor_"):
+        super().__init__(prefix)
+        self.query_seconds = self.histogram("query_duration_seconds", "Wall seconds per ingestion query")
+        self.query_errors = self.counter("query_errors_total", "Ingestion queries that raised")
+        self.samples = self.counter("samples_received_total", "New samples added to the buffer")
+        self.preprocessing_seconds = self.histogram("preprocessing_seconds",
+                                                    "Wall seconds to build the features of one minute")
+        self.inference_seconds = self.histogram("inference_seconds", "Wall seconds per CNN forward")
+        self.tick_lag = self.histogram("tick_lag_seconds",
+                                       "Monitor clock seconds from the end of a minute until its tick finished "
+                                       "(stored or skipped)", LAG_BUCKETS)
+        self.last_tick_lag = self.gauge("last_tick_lag_seconds", "tick_lag_seconds of the latest tick")
+        self.last_prediction = self.gauge("last_prediction_timestamp_seconds",
+                                          "Unix time of the latest stored prediction (0 before the first)")
+        self.ticks = self.counter("ticks_total", "Minute ticks processed")
+        self.skipped = self.counter("skipped_minutes_total", "Ticks without enough data for a prediction")
+        self.predictions = self.counter("predictions_total", "Predictions stored")
+        self.detections = self.counter("detections_total", "Predictions of class 1 (earthquake)")
+        self.prob_earthquake = self.histogram("prob_earthquake", "Predicted earthquake probability", PROB_BUCKETS)
+        self.swaps = self.counter("model_swaps_total", "Hot model swaps")
+        self.reload_errors = self.counter("reload_errors_total", "Registry versions that failed to load")
+
+
+class MetricsServer:
+    """Serves registry.render() at GET /metrics from a daemon thread."""
+
+    def __init__(self, registry, host="127.0.0.1", port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # one line per scrape would drown the monitor's output
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # the actual port when started with port=0
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout=5)
+            self._server = None
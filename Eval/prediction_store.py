@@ -0,0 +1,19 @@
+"""
+Compatibility shim for `import prediction_store`
+------------------------------------------------
+
+The prediction store lives in paros_quake.prediction_store (see the README,
+"Package and CLI").
+Importing prediction_store returns that module itself, so its state is shared.
+"""
+
+import os
+import sys
+
+try:
+    import paros_quake.prediction_store as _module
+except ImportError:  # not installed: use the checkout this folder belongs to
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import paros_quake.prediction_store as _module
+
+sys.modules[__name__] = _module
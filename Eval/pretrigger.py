@@ -0,0 +1,295 @@
+"""
+Cheap Pre-Trigger Cascade for Skipping CNN Inference on Quiet Segments
+----------------------------------------------------------------------
+
+In long range scans almost every 60-second segment is background, yet each one
+pays for resampling, filtering, eleven Welch PSDs and a CNN forward pass. This
+module provides a first-stage detector that runs directly on the raw 20 Hz
+samples and decides which segments are worth sending to the full pipeline.
+
+Detector:
+---------
+- The raw segment is mean-removed and band-pass filtered (default 0.5-5 Hz).
+- Two scores are available on the band-limited energy envelope:
+    - "sta_lta": maximum short-term / long-term average ratio (default 2 s / 20 s),
+      which reacts to onsets regardless of the absolute noise level.
+    - "energy": log10 of the mean band energy over the whole segment.
+- A segment is passed on when its score is >= the threshold. With no threshold
+  set every segment is passed on, so an uncalibrated trigger is a no-op.
+
+Calibration and Evaluation:
+---------------------------
+- calibrate(): picks the largest threshold that still keeps the requested
+  fraction of earthquake scores (the recall target).
+- evaluate_on_events(): scores the raw training events (`EarthQuakeEvents.pkl`
+  and `background_data.pkl`, the sources of the training folds) and reports
+  earthquake recall and background skip rate. With a recall target the scores
+  are split into stratified folds: each fold's threshold is calibrated on the
+  other folds and recall / skip rate are measured on the held-out fold, so the
+  reported numbers are out-of-sample (recall on the calibration scores equals
+  the target by construction). The saved threshold is then calibrated on all
+  earthquake scores.
+- evaluate_on_range(): re-queries the minutes of a logged range scan (e.g.
+  `LoggedData/Earthquake_Predictions_5_05_2025.csv`) and reports the skip rate
+  and how many CNN detections the trigger would have suppressed.
+
+Usage:
+------
+    python pretrigger.py --calibrate ../DataCollection_Preprocessing/Exported_Paros_Data \\
+        --target-recall 0.99 --out pretrigger.json
+    python pretrigger.py --load pretrigger.json \\
+        --range-log LoggedData/Earthquake_Predictions_5_05_2025.csv --password *****
+
+The saved trigger is passed to the query functions in DataQueryUtils with
+`pretrigger=PreTrigger.load("pretrigger.json")`.
+
+Dependencies:
+-------------
+- NumPy, SciPy (signal module), pandas
+- paros_data_grabber.query_influx_data (range evaluation only)
+"""
+
+import argparse
+import json
+import os
+import pickle
+import numpy as np
+
+
+SENSOR_KEY = "parost2_141929"
+
+
+## --- Scores on the raw 20 Hz samples --- ##
+def band_energy_envelope(x, fs, band=(0.5, 5.0), order=2):
+    # scipy loads on first use (a cached lookup afterwards), not when `--help` runs
+    from scipy.signal import butter, sosfiltfilt
+    x = np.asarray(x, dtype=float)
+    x = x - x.mean()
+    nyq = fs / 2
+    sos = butter(order, [band[0] / nyq, band[1] / nyq], btype='band', output='sos')
+    y = sosfiltfilt(sos, x)
+    return y * y
+
+def sta_lta(energy, fs, sta=2.0, lta=20.0):
+    """STA/LTA ratio with the LTA window ending where the STA window starts."""
+    n_sta = int(sta * fs)
+    n_lta = int(lta * fs)
+    n = len(energy) - n_sta - n_lta + 1
+    if n <= 0:
+        return np.array([])
+
+    csum = np.concatenate(([0.0], np.cumsum(energy)))
+    sta_vals = (csum[n_sta:] - csum[:-n_sta]) / n_sta
+    lta_vals = (csum[n_lta:] - csum[:-n_lta]) / n_lta
+    return sta_vals[n_lta:n_lta + n] / (lta_vals[:n] + 1e-20)
+
+
+class PreTrigger:
+    def __init__(self, method="sta_lta", threshold=None, fs=20, band=(0.5, 5.0), sta=2.0, lta=20.0):
+        if method not in ("sta_lta", "energy"):
+            raise ValueError(f"Unknown pre-trigger method: {method}")
+        self.method = method
+        self.threshold = threshold
+        self.fs = fs
+        self.band = tuple(band)
+        self.sta = sta
+        self.lta = lta
+
+    def score(self, samples):
+        energy = band_energy_envelope(samples, self.fs, self.band)
+        if self.method == "energy":
+            return float(np.log10(energy.mean() + 1e-20))
+
+        ratio = sta_lta(energy, self.fs, self.sta, self.lta)
+        # Too short to judge: let the full pipeline decide
+        return float(ratio.max()) if ratio.size else np.inf
+
+    def __call__(self, samples):
+        """True if the segment should go on to the full PSD + CNN pipeline."""
+        if self.threshold is None:
+            return True
+        return self.score(samples) >= self.threshold
+
+    def calibrate(self, positive_scores, target_recall=0.99):
+        scores = np.asarray(positive_scores, dtype=float)
+        scores = scores[np.isfinite(scores)]
+        if scores.size == 0:
+            raise ValueError("No finite positive scores to calibrate on")
+        self.threshold = float(np.quantile(scores, 1 - target_recall, method='lower'))
+        return self.threshold
+
+    def to_dict(self):
+        return {
+            'method': self.method,
+            'threshold': self.threshold,
+            'fs': self.fs,
+            'band': list(self.band),
+            'sta': self.sta,
+            'lta': self.lta,
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls(**json.load(f))
+
+
+## --- Evaluation --- ##
+def score_events(trigger, data, sensor_key=SENSOR_KEY):
+    """Scores for every entry of a raw waveform pickle (EarthQuakeEvents / background_data)."""
+    scores = []
+    for eventName, eventStruct in data.items():
+        try:
+            waveform = np.array(eventStruct['waveform'][sensor_key][:, -1], dtype=float)
+            scores.append(trigger.score(waveform))
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"Skipping {eventName}: {e}")
+    return np.array(scores)
+
+def _pass_rates(threshold, eq_scores, bg_scores):
+    eq_pass = np.ones(len(eq_scores), dtype=bool) if threshold is None else eq_scores >= threshold
+    bg_pass = np.ones(len(bg_scores), dtype=bool) if threshold is None else bg_scores >= threshold
+    n_total = len(eq_scores) + len(bg_scores)
+    return {
+        'n_earthquake': int(len(eq_scores)),
+        'n_background': int(len(bg_scores)),
+        'earthquake_recall': float(eq_pass.mean()) if eq_pass.size else float('nan'),
+        'background_skip_rate': float(1 - bg_pass.mean()) if bg_pass.size else float('nan'),
+        'overall_skip_rate': float((n_total - eq_pass.sum() - bg_pass.sum()) / n_total) if n_total else float('nan'),
+    }
+
+def _fold_ids(n, K, rng):
+    """Fold number of each of n items, as equal as possible, in random order."""
+    return rng.permutation(np.arange(n) % K)
+
+def evaluate_on_events(trigger, eq_data, bg_data, target_recall=None, folds=5, seed=42):
+    """
+    Report recall on earthquake events and skip rate on background hours.
+
+    If target_recall is given, the recall and skip rate come from stratified
+    K-fold cross-validation (threshold calibrated on the training folds,
+    measured on the held-out fold, pooled over the folds), and the trigger is
+    then calibrated on all earthquake scores. Without it the current threshold
+    is evaluated on all events.
+    """
+    eq_scores = score_events(trigger, eq_data)
+    bg_scores = score_events(trigger, bg_data)
+
+    if target_recall is None:
+        return {'threshold': trigger.threshold, **_pass_rates(trigger.threshold, eq_scores, bg_scores)}
+
+    rng = np.random.default_rng(seed)
+    eq_fold, bg_fold = _fold_ids(len(eq_scores), folds, rng), _fold_ids(len(bg_scores), folds, rng)
+    eq_pass = np.zeros(len(eq_scores), dtype=bool)
+    bg_pass = np.zeros(len(bg_scores), dtype=bool)
+    per_fold = []
+    for k in range(folds):
+        threshold = trigger.calibrate(eq_scores[eq_fold != k], target_recall)
+        held_eq, held_bg = eq_scores[eq_fold == k], bg_scores[bg_fold == k]
+        eq_pass[eq_fold == k] = held_eq >= threshold
+        bg_pass[bg_fold == k] = held_bg >= threshold
+        per_fold.append({'fold': k + 1, 'threshold': threshold, **_pass_rates(threshold, held_eq, held_bg)})
+
+    n_total = len(eq_scores) + len(bg_scores)
+    trigger.calibrate(eq_scores, target_recall)
+    return {
+        'threshold': trigger.threshold,
+        'target_recall': target_recall,
+        'n_earthquake': int(len(eq_scores)),
+        'n_background': int(len(bg_scores)),
+        'earthquake_recall': float(eq_pass.mean()) if eq_pass.size else float('nan'),
+        'background_skip_rate': float(1 - bg_pass.mean()) if bg_pass.size else float('nan'),
+        'overall_skip_rate': float((n_total - eq_pass.sum() - bg_pass.sum()) / n_total) if n_total else float('nan'),
+        'folds': per_fold,
+    }
+
+def evaluate_on_range(
+    trigger,
+    prediction_log,
+    sensor_id="141929",
+    box_id="parost2",
+    password="*****", # Replace with actual password
+    strong_threshold=0.90
+):
+    """
+    Replay a logged range scan through the trigger.
+
+    Each logged minute is re-queried, scored, and compared with the CNN decision in
+    the log, so the report shows the skip rate and the detections that would be lost.
+    """
+    import pandas as pd
+    from paros_data_grabber import query_influx_data
+
+    log = pd.read_csv(prediction_log, parse_dates=['window_start', 'window_end'])
+    key = f"{box_id}_{sensor_id}"
+    passed = np.zeros(len(log), dtype=bool)
+    missing = np.zeros(len(log), dtype=bool)
+
+    for i, (seg_start, seg_end) in enumerate(zip(log['window_start'], log['window_end'])):
+        try:
+            data = query_influx_data(
+                start_time=seg_start.isoformat(timespec="seconds"),
+                end_time=seg_end.isoformat(timespec="seconds"),
+                box_id=box_id,
+                sensor_id=sensor_id,
+                password=password
+            )
+            waveform = data.get(key)
+            if waveform is None or waveform.empty:
+                missing[i] = True
+                continue
+            passed[i] = trigger(waveform['value'].values)
+        except Exception as e:
+            print(f"Failed to score window {seg_start} to {seg_end}: {e}")
+            missing[i] = True
+
+    scored = ~missing
+    detections = scored & (log['predicted_class'].values == 1)
+    strong = detections & (log['prob_earthquake'].values >= strong_threshold)
+
+    return {
+        'threshold': trigger.threshold,
+        'n_minutes': int(scored.sum()),
+        'skip_rate': float(1 - passed[scored].mean()) if scored.any() else float('nan'),
+        'n_detections': int(detections.sum()),
+        'detections_lost': int((detections & ~passed).sum()),
+        'n_strong_detections': int(strong.sum()),
+        'strong_detections_lost': int((strong & ~passed).sum()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate and evaluate the CNN pre-trigger.")
+    parser.add_argument("--calibrate", metavar="DATA_DIR",
+                        help="Folder with EarthQuakeEvents.pkl and background_data.pkl")
+    parser.add_argument("--target-recall", type=float, default=0.99)
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds for --calibrate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--method", choices=["sta_lta", "energy"], default="sta_lta")
+    parser.add_argument("--load", help="Existing pre-trigger JSON to evaluate")
+    parser.add_argument("--out", default="pretrigger.json")
+    parser.add_argument("--range-log", help="Logged range-scan CSV to replay")
+    parser.add_argument("--password", default="*****")
+    args = parser.parse_args()
+
+    trigger = PreTrigger.load(args.load) if args.load else PreTrigger(method=args.method)
+
+    if args.calibrate:
+        with open(os.path.join(args.calibrate, "EarthQuakeEvents.pkl"), 'rb') as f:
+            eq_data = pickle.load(f)
+        with open(os.path.join(args.calibrate, "background_data.pkl"), 'rb') as f:
+            bg_data = pickle.load(f)
+
+        report = evaluate_on_events(trigger, eq_data, bg_data, target_recall=args.target_recall,
+                                    folds=args.folds, seed=args.seed)
+        print(f"Training events ({args.folds}-fold cross-validated):", json.dumps(report, indent=2))
+        trigger.save(args.out)
+        print(f"Saved pre-trigger to {args.out}")
+
+    if args.range_log:
+        report = evaluate_on_range(trigger, args.range_log, password=args.password)
+        print("Range scan:", json.dumps(report, indent=2))
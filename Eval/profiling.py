@@ -0,0 +1,19 @@
+"""
+Compatibility shim for `import profiling`
+-----------------------------------------
+
+The stage profiler lives in paros_quake.profiling (see the README, "Package and
+CLI").
+Importing profiling returns that module itself, so its state is shared.
+"""
+
+import os
+import sys
+
+try:
+    import paros_quake.profiling as _module
+except ImportError:  # not installed: use the checkout this folder belongs to
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import paros_quake.profiling as _module
+
+sys.modules[__name__] = _module
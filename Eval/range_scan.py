@@ -0,0 +1,395 @@
+"""
+Sharded Range Scanning with Manifest, Resume and Merge
+------------------------------------------------------
+
+Retrospective scans with `psd_vectors_from_range` run one 60 s segment after
+another in a single process. This runner splits a date range into shards listed
+in a manifest, scans the shards in parallel worker processes, and merges the
+per-shard predictions back in time order.
+
+Scan directory layout:
+----------------------
+    <scan_dir>/manifest.json              range, shard list and scan settings
+    <scan_dir>/shards/shard_NNNNN.lock    claim: host, pid, claim time, owner token
+    <scan_dir>/shards/shard_NNNNN.npz     predictions of a finished shard
+                                          (window_start/window_end int64 ns,
+                                          predicted_class, prob_earthquake, prob_background,
+                                          usable_windows of the 11)
+
+How it works:
+-------------
+- `init` writes the manifest: the range cut into shards of `shard_minutes`
+  (default one day) plus the model, stats and query settings every worker uses.
+  With `--gridded`, segments are placed on the 20 Hz grid by their timestamps
+  (see gridding.py): gaps are masked instead of shifting the windows, and
+  minutes with too few usable windows are not scored.
+- `run` starts `workers` processes. Each worker loads the model once, then
+  repeatedly claims the next unfinished shard by creating its .lock file with
+  O_CREAT | O_EXCL (atomic on local and NFS-style shared filesystems), scans it
+  with psd_vectors_from_range, scores all its windows in batches and writes the
+  .npz atomically. A finished .npz marks the shard done.
+- Several hosts can run `run` on the same scan directory at the same time; they
+  share the work through the lock files. While scanning, the owner refreshes the
+  lock's modification time between segments (heartbeat, at most every lease / 10
+  seconds), so a long shard keeps its claim. A lock without a heartbeat for
+  `lease` seconds (crashed worker or host) is taken over by renaming it to a name
+  unique to the new worker, which only one worker can do, before claiming the
+  shard again through O_EXCL. A worker only removes a lock carrying its own
+  token, and one that finds its lock taken over drops the shard without writing.
+- Re-running `run` after an interruption only scans the missing shards.
+- `merge` concatenates all shard results, sorts them by window start and writes
+  them into a PredictionStore (and optionally the CSV log layout).
+
+Usage:
+------
+    python range_scan.py init --dir scans/2024 --start 2024-01-01 --end 2025-01-01
+    python range_scan.py run --dir scans/2024 --workers 8          # on every host
+    python range_scan.py status --dir scans/2024
+    python range_scan.py merge --dir scans/2024 --store LoggedData/scan_2024 --csv scan_2024.csv
+
+    Local test with synthetic data and several processes:
+    python range_scan.py init --dir /tmp/scan --start 2025-05-05 --end 2025-05-06 --shard-minutes 120 --fake
+    python range_scan.py run --dir /tmp/scan --workers 4
+
+Dependencies:
+-------------
+- NumPy, pandas, PyTorch (workers only; init, status and merge do not import it)
+- Custom utilities: DataQueryUtils, cnn_model, prediction_store, fake_influx (--fake only)
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import time
+import uuid
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+
+from prediction_store import PredictionStore
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _shard_path(scan_dir, shard_id, ext):
+    return os.path.join(scan_dir, "shards", f"shard_{shard_id:05d}.{ext}")
+
+def load_manifest(scan_dir):
+    with open(os.path.join(scan_dir, "manifest.json")) as f:
+        return json.load(f)
+
+
+def init_scan(scan_dir, start, end, shard_minutes=1440, model_path=None, stats_dir=None,
+              batch_size=256, fake=False, gridded=False):
+    """Write the manifest for scanning [start, end) in shards of shard_minutes."""
+    shards = []
+    shard_start = start
+    while shard_start < end:
+        shard_end = min(shard_start + timedelta(minutes=shard_minutes), end)
+        shards.append({'id': len(shards), 'start': shard_start.isoformat(), 'end': shard_end.isoformat()})
+        shard_start = shard_end
+
+    manifest = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'shard_minutes': shard_minutes,
+        'model': os.path.abspath(model_path) if model_path else None,
+        'stats_dir': os.path.abspath(stats_dir) if stats_dir else None,
+        'batch_size': batch_size,
+        'fake': fake,
+        'gridded': gridded,
+        'shards': shards,
+    }
+    os.makedirs(os.path.join(scan_dir, "shards"), exist_ok=True)
+    path = os.path.join(scan_dir, "manifest.json")
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists; use a new scan directory")
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def shard_status(scan_dir, manifest, lease=3600):
+    """'done', 'running' (fresh lock) or 'pending' for every shard id."""
+    status = {}
+    now = time.time()
+    for shard in manifest['shards']:
+        sid = shard['id']
+        if os.path.exists(_shard_path(scan_dir, sid, "npz")):
+            status[sid] = 'done'
+        elif os.path.exists(_shard_path(scan_dir, sid, "lock")) and \
+                now - os.path.getmtime(_shard_path(scan_dir, sid, "lock")) < lease:
+            status[sid] = 'running'
+        else:
+            status[sid] = 'pending'
+    return status
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class ShardLease:
+    """A claimed shard lock: heartbeat() keeps it fresh, release() removes it only if still ours."""
+
+    def __init__(self, path, token, lease):
+        self.path = path
+        self.token = token
+        self.interval = max(1.0, lease / 10)
+        self.lost = False
+        self._last = time.monotonic()
+
+    def owned(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('token') == self.token
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def heartbeat(self):
+        if self.lost:
+            raise LeaseLost(self.path)
+        if time.monotonic() - self._last < self.interval:
+            return
+        if not self.owned():
+            self.lost = True
+            raise LeaseLost(self.path)
+        os.utime(self.path, None)
+        self._last = time.monotonic()
+
+    def release(self):
+        if self.owned():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path)
+
+
+def _take_over_stale(lock, lease, token):
+    """Remove a lock without heartbeat for `lease` s; of several workers only one succeeds."""
+    try:
+        if time.time() - os.path.getmtime(lock) < lease:
+            return
+        moved = f"{lock}.stale-{token}"
+        os.rename(lock, moved)  # atomic: the other workers get FileNotFoundError
+    except FileNotFoundError:
+        return
+    if time.time() - os.path.getmtime(moved) < lease:
+        # The owner's heartbeat landed between the check and the rename: put the lock
+        # back, unless a new one was created meanwhile (link never overwrites)
+        with contextlib.suppress(FileExistsError):
+            os.link(moved, lock)
+    os.remove(moved)
+
+
+def claim_shard(scan_dir, manifest, lease=3600):
+    """
+    Atomically claim the next unfinished shard; returns (shard, ShardLease), or
+    None when nothing is left to claim.
+    """
+    token = uuid.uuid4().hex
+    for shard in manifest['shards']:
+        sid = shard['id']
+        if os.path.exists(_shard_path(scan_dir, sid, "npz")):
+            continue
+        lock = _shard_path(scan_dir, sid, "lock")
+        _take_over_stale(lock, lease, token)
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'host': platform.node(), 'pid': os.getpid(), 'claimed': time.time(),
+                       'token': token}, f)
+        return shard, ShardLease(lock, token, lease)
+    return None
+
+
+def score_windows(model, psd_list, batch_size=256):
+    """Batched softmax over the (11, 52) feature arrays; returns an (n, 2) array."""
+    import torch
+    probs = []
+    with torch.no_grad():
+        for i in range(0, len(psd_list), batch_size):
+            batch = torch.from_numpy(np.stack(psd_list[i:i + batch_size])).unsqueeze(1)
+            probs.append(torch.softmax(model(batch), dim=1).numpy())
+    return np.concatenate(probs) if probs else np.zeros((0, 2), dtype=np.float32)
+
+
+def scan_shard(shard, model, mean, std, query_fn=None, batch_size=256, lease=None, gridded=False):
+    from DataQueryUtils import psd_vectors_from_range, query_influx_data
+    start = datetime.fromisoformat(shard['start'])
+    end = datetime.fromisoformat(shard['end'])
+    inner = query_fn or query_influx_data
+
+    def heartbeat_query(**kwargs):
+        # psd_vectors_from_range logs and skips failed segments, so once the lease is
+        # lost every remaining segment fails fast here and the shard is dropped below
+        lease.heartbeat()
+        return inner(**kwargs)
+
+    # Per-segment progress lines from the range query would interleave across workers
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, masks = psd_vectors_from_range(start, end, mean=mean, std=std,
+                                                query_fn=inner if lease is None else heartbeat_query,
+                                                gridded=gridded, return_masks=True)
+    if lease is not None and lease.lost:
+        raise LeaseLost(lease.path)
+
+    probs = score_windows(model, [r[2] for r in results], batch_size)
+    return {
+        'window_start': np.array([np.datetime64(r[0], 'ns').astype(np.int64) for r in results], dtype=np.int64),
+        'window_end': np.array([np.datetime64(r[1], 'ns').astype(np.int64) for r in results], dtype=np.int64),
+        'predicted_class': np.argmax(probs, axis=1).astype(np.int8),
+        'prob_earthquake': probs[:, 1].astype(np.float32),
+        'prob_background': probs[:, 0].astype(np.float32),
+        'usable_windows': np.array([m.sum() for m in masks], dtype=np.int8),
+    }
+
+
+def _load_worker_state(manifest):
+    # torch and the feature path load only in workers; init/status/merge stay light
+    import torch
+    from cnn_model import EarthquakeCNN2d
+    model = EarthquakeCNN2d(input_shape=(11, 52))
+    model.load_state_dict(torch.load(manifest['model'], map_location="cpu"))
+    model.eval()
+    mean = np.load(os.path.join(manifest['stats_dir'], "mean.npy"))
+    std = np.load(os.path.join(manifest['stats_dir'], "std.npy"))
+
+    query_fn = None
+    if manifest.get('fake'):
+        from fake_influx import FakeInflux, SyntheticSource
+        # SyntheticSource is deterministic, so every worker sees the same timeline
+        query_fn = FakeInflux(SyntheticSource(datetime.fromisoformat(manifest['start'])))
+    return model, mean, std, query_fn
+
+
+def worker_loop(scan_dir, lease=3600, threads=1):
+    """Claim and scan shards until none are left; returns the ids this worker finished."""
+    import torch
+    torch.set_num_threads(threads)
+    manifest = load_manifest(scan_dir)
+    model, mean, std, query_fn = _load_worker_state(manifest)
+
+    finished = []
+    while True:
+        claimed = claim_shard(scan_dir, manifest, lease)
+        if claimed is None:
+            return finished
+        shard, shard_lease = claimed
+        t0 = time.perf_counter()
+        try:
+            columns = scan_shard(shard, model, mean, std, query_fn, manifest['batch_size'], shard_lease,
+                                 manifest.get('gridded', False))
+        except LeaseLost:
+            print(f"[{platform.node()}:{os.getpid()}] shard {shard['id']}: lease taken over, "
+                  f"leaving it to the new owner", flush=True)
+            continue
+        out = _shard_path(scan_dir, shard['id'], "npz")
+        tmp = f"{out}.{shard_lease.token}.tmp.npz"  # per owner, so two writers never share it
+        np.savez(tmp, **columns)
+        os.replace(tmp, out)
+        shard_lease.release()
+        finished.append(shard['id'])
+        print(f"[{platform.node()}:{os.getpid()}] shard {shard['id']} ({shard['start']} - {shard['end']}): "
+              f"{len(columns['window_start'])} windows in {time.perf_counter() - t0:.1f} s", flush=True)
+
+
+def run_scan(scan_dir, workers=1, lease=3600, threads_per_worker=1):
+    if workers <= 1:
+        return worker_loop(scan_dir, lease, threads_per_worker)
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [pool.submit(worker_loop, scan_dir, lease, threads_per_worker) for _ in range(workers)]
+        return sorted(sid for f in futures for sid in f.result())
+
+
+def merge_scan(scan_dir, store_root=None, csv_path=None, allow_partial=False):
+    """Merge shard results in time order into a PredictionStore and/or CSV log."""
+    manifest = load_manifest(scan_dir)
+    missing = [s['id'] for s in manifest['shards'] if not os.path.exists(_shard_path(scan_dir, s['id'], "npz"))]
+    if missing and not allow_partial:
+        raise RuntimeError(f"{len(missing)} shard(s) not finished, e.g. {missing[:5]}")
+
+    parts = sorted(glob.glob(os.path.join(scan_dir, "shards", "shard_*.npz")))
+    loaded = []
+    for p in parts:
+        # Copy the columns out so no shard file stays open
+        with np.load(p) as d:
+            loaded.append({name: d[name] for name in d.files})
+    if not loaded:
+        return 0
+    columns = {name: np.concatenate([d[name] for d in loaded]) for name in loaded[0]}
+    order = np.argsort(columns['window_start'], kind='stable')
+    columns = {name: values[order] for name, values in columns.items()}
+
+    n = len(columns['window_start'])
+    store_root = store_root or os.path.join(scan_dir, "prediction_store")
+    if os.path.isdir(os.path.join(store_root, "predictions")):
+        # Appending the same scan twice would duplicate every row
+        raise FileExistsError(f"{store_root} already holds predictions; merge into a new store")
+    store = PredictionStore(store_root, batch_size=max(n, 1))
+    for i in range(n):
+        store.append(int(columns['window_start'][i]), int(columns['window_end'][i]),
+                     columns['predicted_class'][i], columns['prob_earthquake'][i],
+                     prob_background=columns['prob_background'][i],
+                     query_time=int(columns['window_end'][i]))
+    store.close()
+    if csv_path:
+        store.export_csv(csv_path)
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded multi-process / multi-host range scan.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_init = sub.add_parser("init", help="Write the shard manifest")
+    p_init.add_argument("--dir", required=True)
+    p_init.add_argument("--start", required=True)
+    p_init.add_argument("--end", required=True)
+    p_init.add_argument("--shard-minutes", type=int, default=1440)
+    p_init.add_argument("--model", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs/fold_5/CNNmodel.pth"))
+    p_init.add_argument("--stats-dir", default=os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data"))
+    p_init.add_argument("--batch-size", type=int, default=256)
+    p_init.add_argument("--fake", action="store_true", help="Scan synthetic fake_influx data")
+    p_init.add_argument("--gridded", action="store_true",
+                        help="Grid samples by timestamp and mask gappy windows (see gridding.py)")
+
+    p_run = sub.add_parser("run", help="Scan unfinished shards (run on every participating host)")
+    p_run.add_argument("--dir", required=True)
+    p_run.add_argument("--workers", type=int, default=os.cpu_count())
+    p_run.add_argument("--threads-per-worker", type=int, default=1)
+    p_run.add_argument("--lease", type=float, default=3600, help="Seconds before a claim is considered stale")
+
+    p_status = sub.add_parser("status", help="Show shard progress")
+    p_status.add_argument("--dir", required=True)
+    p_status.add_argument("--lease", type=float, default=3600)
+
+    p_merge = sub.add_parser("merge", help="Merge shard outputs in time order")
+    p_merge.add_argument("--dir", required=True)
+    p_merge.add_argument("--store", help="PredictionStore root (default: <dir>/prediction_store)")
+    p_merge.add_argument("--csv", help="Also export the merged predictions as a CSV log")
+    p_merge.add_argument("--allow-partial", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        manifest = init_scan(args.dir, datetime.fromisoformat(args.start), datetime.fromisoformat(args.end),
+                             args.shard_minutes, args.model, args.stats_dir, args.batch_size, args.fake,
+                             args.gridded)
+        print(f"Wrote {len(manifest['shards'])} shards to {args.dir}/manifest.json")
+    elif args.command == "run":
+        t0 = time.perf_counter()
+        done = run_scan(args.dir, args.workers, args.lease, args.threads_per_worker)
+        print(f"Finished {len(done)} shard(s) in {time.perf_counter() - t0:.1f} s")
+    elif args.command == "status":
+        status = shard_status(args.dir, load_manifest(args.dir), args.lease)
+        counts = {s: sum(v == s for v in status.values()) for s in ('done', 'running', 'pending')}
+        print(json.dumps(counts))
+    else:
+        n = merge_scan(args.dir, args.store, args.csv, args.allow_partial)
+        print(f"Merged {n} predictions")
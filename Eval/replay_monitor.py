@@ -0,0 +1,180 @@
+"""
+Replay Driver for End-to-End Monitoring Benchmarks
+--------------------------------------------------
+
+Runs the live monitoring loop of LiveTestModel.ipynb (query the last 60 s, build
+PSD features, CNN inference, log class-1 detections) against a FakeInflux
+stand-in on a simulated clock, so a day of monitoring can be replayed offline at
+N x real time.
+
+How it works:
+-------------
+- A simulated clock starts at `start` and advances `speed` simulated seconds per
+  wall-clock second. Every 60 simulated seconds a tick queries the preceding
+  minute through live_stream_query_for_model(query_fn=fake, end_time=tick).
+- With speed=None the loop never sleeps and ticks back to back, which measures
+  the sustained throughput ceiling of the pipeline. There is no simulated clock
+  to fall behind then, so lag is not reported (None).
+- If a tick takes longer than its simulated budget, the loop falls behind; the
+  lag behind the simulated clock is recorded for every tick.
+
+Report:
+-------
+- ticks, detections, minutes processed per wall second and the real-time factor.
+- per-tick processing time (p50 / p95 / max) and maximum lag behind the clock.
+- detection latency for each known event onset of the source: simulated seconds
+  from the onset until the first class-1 decision covering it was available,
+  or None if the event was missed. With speed=None this is the window end minus
+  the onset only; detection_compute_s gives the wall seconds the detecting tick
+  took, which are never added to the simulated latency.
+
+Usage:
+------
+    python replay_monitor.py --minutes 120 --speed 60 --events 4
+    python replay_monitor.py --pickles ../DataCollection_Preprocessing/Exported_Paros_Data --speed 0
+    (speed 0 = as fast as possible)
+
+Dependencies:
+-------------
+- NumPy, pandas, PyTorch
+- Custom utilities: fake_influx, DataQueryUtils, cnn_model
+"""
+
+import argparse
+import os
+import json
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def replay(fake, model, mean, std, start, minutes, speed=60.0, pretrigger=None,
+           box_id="parost2", sensor_id="141929", detection_horizon=120):
+    """Replay `minutes` of monitoring ticks starting at `start` and return a report."""
+    import torch
+    from DataQueryUtils import live_stream_query_for_model
+
+    ticks = []
+    wall_start = time.perf_counter()
+
+    for i in range(minutes):
+        tick_time = start + timedelta(seconds=60 * (i + 1))
+
+        if speed:
+            # Wait until the simulated clock reaches this tick
+            sim_elapsed = (time.perf_counter() - wall_start) * speed
+            wait = (60 * (i + 1) - sim_elapsed) / speed
+            if wait > 0:
+                time.sleep(wait)
+
+        t0 = time.perf_counter()
+        psd_vector = live_stream_query_for_model(
+            sensor_id=sensor_id,
+            box_id=box_id,
+            mean=mean,
+            std=std,
+            pretrigger=pretrigger,
+            query_fn=fake,
+            end_time=tick_time
+        )
+        pred, prob = 0, None
+        if psd_vector is not None:
+            input_tensor = torch.tensor(psd_vector, dtype=torch.float32).unsqueeze(0).unsqueeze(0)
+            with torch.no_grad():
+                probs = torch.softmax(model(input_tensor), dim=1).numpy()[0]
+            pred, prob = int(np.argmax(probs)), float(probs[1])
+        t1 = time.perf_counter()
+
+        sim_done = (t1 - wall_start) * speed if speed else None
+        ticks.append({
+            'window_end': tick_time,
+            'pred': pred,
+            'prob_earthquake': prob,
+            'processing_s': t1 - t0,
+            # Simulated seconds between the tick being due and its decision
+            'lag_s': (sim_done - 60 * (i + 1)) if speed else None,
+        })
+
+    wall = time.perf_counter() - wall_start
+    processing = np.array([t['processing_s'] for t in ticks])
+    lags = np.array([t['lag_s'] for t in ticks if t['lag_s'] is not None])
+
+    latencies, compute = {}, {}
+    end = start + timedelta(seconds=60 * minutes)
+    for onset in getattr(fake.source, 'events', []):
+        if not (start <= onset < end):
+            continue
+        latency = seconds = None
+        for t in ticks:
+            window_start = t['window_end'] - timedelta(seconds=60)
+            if t['pred'] == 1 and t['window_end'] > onset and \
+                    window_start <= onset + timedelta(seconds=detection_horizon):
+                latency = (t['window_end'] - onset).total_seconds() + max(t['lag_s'] or 0.0, 0.0)
+                seconds = t['processing_s']
+                break
+        latencies[onset.isoformat()] = latency
+        compute[onset.isoformat()] = seconds
+
+    found = [v for v in latencies.values() if v is not None]
+    return {
+        'ticks': len(ticks),
+        'detections': int(sum(t['pred'] for t in ticks)),
+        'wall_s': wall,
+        'minutes_per_wall_s': len(ticks) / wall if wall > 0 else float('inf'),
+        'realtime_factor': 60 * len(ticks) / wall if wall > 0 else float('inf'),
+        'processing_p50_s': float(np.percentile(processing, 50)) if len(ticks) else None,
+        'processing_p95_s': float(np.percentile(processing, 95)) if len(ticks) else None,
+        'processing_max_s': float(processing.max()) if len(ticks) else None,
+        'max_lag_s': float(lags.max()) if len(lags) else None,
+        'events': len(latencies),
+        'events_detected': len(found),
+        'detection_latency_s': latencies,
+        'mean_detection_latency_s': float(np.mean(found)) if found else None,
+        'detection_compute_s': compute,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the live monitoring loop against a fake InfluxDB.")
+    parser.add_argument("--pickles", help="Folder with EarthQuakeEvents.pkl / background_data.pkl "
+                                          "(default: synthetic waveforms)")
+    parser.add_argument("--start", default="2025-05-05T00:00:00")
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--events", type=int, default=3, help="Synthetic events to inject")
+    parser.add_argument("--speed", type=float, default=60.0, help="Simulated seconds per wall second (0 = max)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake query latency (s)")
+    parser.add_argument("--gap-prob", type=float, default=0.0, help="Chance a minute contains a data gap")
+    parser.add_argument("--model", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs/fold_5/CNNmodel.pth"))
+    parser.add_argument("--stats-dir", default=os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data"))
+    parser.add_argument("--report", help="Write the report as JSON here")
+    args = parser.parse_args()
+
+    # torch, pandas and scipy load only once the arguments are known
+    import torch
+    from cnn_model import EarthquakeCNN2d
+    from fake_influx import FakeInflux, SyntheticSource, RecordedSource
+
+    start = datetime.fromisoformat(args.start)
+    if args.pickles:
+        source = RecordedSource.from_pickles(f"{args.pickles}/EarthQuakeEvents.pkl",
+                                             f"{args.pickles}/background_data.pkl", start)
+        args.minutes = min(args.minutes, int((source.end - start).total_seconds() // 60))
+    else:
+        onsets = [start + timedelta(minutes=(j + 1) * args.minutes / (args.events + 1), seconds=20)
+                  for j in range(args.events)]
+        source = SyntheticSource(start, events=onsets)
+    fake = FakeInflux(source, latency=args.latency, gap_prob=args.gap_prob)
+
+    mean = np.load(f"{args.stats_dir}/mean.npy")
+    std = np.load(f"{args.stats_dir}/std.npy")
+    model = EarthquakeCNN2d(input_shape=(11, 52))
+    model.load_state_dict(torch.load(args.model, map_location="cpu"))
+    model.eval()
+
+    report = replay(fake, model, mean, std, start, args.minutes, speed=args.speed or None)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
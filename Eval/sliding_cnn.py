@@ -0,0 +1,309 @@
+"""
+Sliding-Window Evaluation of EarthquakeCNN2d over Long Spans
+------------------------------------------------------------
+
+EarthquakeCNN2d only accepts one (11, 52) stack of PSD windows, because fc1 is
+sized for it. Scoring an hour at a 5 s hop the usual way means 709 separate
+60 s feature extractions (each resampling, filtering and taking the Welch PSD of
+eleven windows, ten of which the previous hop already computed) followed by
+709 single-sample forwards. This module scores a whole span at once:
+
+- psd_spectrogram() resamples and filters the span once and takes the Welch PSD
+  of every 10 s window (5 s step) in one vectorized call, giving a
+  (n_windows, 52) spectrogram in which every PSD window exists exactly once.
+- SlidingEarthquakeCNN wraps a trained checkpoint. Its forward takes the
+  (n_windows, 52) log-PSD spectrogram, builds all 11-window stacks as a strided
+  view (no copies), z-scores them with the training mean/std and evaluates
+  every hop in one batched pass, returning one logit pair per hop.
+
+Exactness:
+----------
+The stacks fed to the network are bit-identical to normalize_psd() applied to
+the same eleven rows, so the output equals per-window evaluation up to float32
+summation order in batched convolutions (~1e-7). `--check` measures it and
+exits with status 1 unless the largest probability difference is below
+PROB_TOLERANCE (1e-6) and no hop changes class (exactness_failures()), so it
+can gate CI or a deployment script.
+
+Conv activations are not shared between overlapping stacks, because for this
+network they differ between stacks even where the inputs overlap:
+- mean/std are per (window position, frequency), so the same PSD row is
+  normalized differently in each of the eleven stacks that contain it. With the
+  shipped stats std varies up to 50x across positions for the same frequency.
+- conv1/conv2 zero-pad at the stack edges, so edge rows see different context.
+- the stride-2 max pools over the window axis change phase with every 1-window hop.
+Computing conv1 once per (row, stack position) costs as many multiply-adds as
+computing it per stack, so an exact shared-activation form brings no savings.
+The shared work is the feature path, which dominates the cost.
+
+Spectrogram vs per-segment features:
+------------------------------------
+The filters run once over the whole span instead of over each 60 s segment, so
+windows near segment edges are no longer affected by the filtfilt edge transients
+of the per-segment path. Probabilities differ slightly from the per-segment path
+(psd_windows_from_samples) for that reason; `--check` reports the difference.
+
+Usage:
+------
+    python sliding_cnn.py --fake --start 2025-05-05T00:00:00 --minutes 60 --check    # exit 1 on failure
+    python sliding_cnn.py --start 2025-05-05T00:00:00 --minutes 60 --out hop_probs.csv
+
+    evaluator = SlidingEarthquakeCNN.from_checkpoint(model_path, stats_dir)
+    power, f = psd_spectrogram(samples)
+    probs = evaluator.predict_proba(np.log10(power + 1e-10))    # (n_windows - 10, 2)
+
+Dependencies:
+-------------
+- NumPy, pandas, PyTorch
+- Custom utilities: Preprocessing_fun, DataQueryUtils, cnn_model, gridding,
+  fake_influx (--fake only)
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+# torch, pandas, scipy and the feature path are imported in the functions that use
+# them, so `--help` returns without loading them
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROB_TOLERANCE = 1e-6
+
+
+def psd_spectrogram(samples, fs_in=20, fs_out=100, window_duration=10, overlap=0.5, dtype=None):
+    """
+    Raw Welch PSD of every window of a long span.
+
+    Returns (power (n_windows, freq_bins), frequency), or None if the span is
+    shorter than one window. Window i starts at i * window_duration * (1 - overlap) s.
+    """
+    from Preprocessing_fun import as_waveform, safe_resample, preprocess, welch_psd
+    x = as_waveform(samples, dtype)
+    x = safe_resample(x, fs_in, fs_out, dtype)
+    x = preprocess(x, fs_out, dtype)
+
+    win_length = int(window_duration * fs_out)
+    step = int(win_length * (1 - overlap))
+    if len(x) < win_length:
+        return None
+    frames = np.lib.stride_tricks.sliding_window_view(x, win_length)[::step]
+    return welch_psd(frames, fs_out, dtype)
+
+
+class SlidingEarthquakeCNN:
+    # A plain wrapper rather than an nn.Module: it has no parameters of its own,
+    # and defining it does not need torch
+    def __init__(self, model, mean, std, batch_size=512):
+        import torch
+        self.model = model.eval()
+        self.stack = mean.shape[0]
+        self.batch_size = batch_size
+        # float64 like normalize_psd, so the stacks match it bit for bit
+        self.mean = torch.as_tensor(np.asarray(mean, dtype=np.float64))
+        self.scale = torch.as_tensor(np.asarray(std, dtype=np.float64) + 1e-6)
+
+    @classmethod
+    def from_checkpoint(cls, model_path, stats_dir, input_shape=(11, 52), **kwargs):
+        import torch
+        from cnn_model import EarthquakeCNN2d
+        model = EarthquakeCNN2d(input_shape=input_shape)
+        model.load_state_dict(torch.load(model_path, map_location="cpu"))
+        mean = np.load(os.path.join(stats_dir, "mean.npy"))
+        std = np.load(os.path.join(stats_dir, "std.npy"))
+        return cls(model, mean, std, **kwargs)
+
+    @classmethod
+    def from_bundle(cls, bundle, **kwargs):
+        """From a model_registry.ModelBundle."""
+        return cls(bundle.model, bundle.mean, bundle.std, **kwargs)
+
+    def stacks(self, log_psd, hop=1):
+        """All z-scored (stack, freq_bins) inputs of a (n_windows, freq_bins) log-PSD, as float32."""
+        import torch
+        log_psd = torch.as_tensor(np.asarray(log_psd, dtype=np.float64))
+        # unfold gives (n_hops, freq_bins, stack) views into log_psd
+        windows = log_psd.unfold(0, self.stack, hop).transpose(1, 2)
+        return ((windows - self.mean) / self.scale).float()
+
+    def forward(self, log_psd, hop=1):
+        """Logits (n_hops, 2) for every `hop`-window step of the spectrogram."""
+        import torch
+        z = self.stacks(log_psd, hop)
+        logits = [self.model(z[i:i + self.batch_size].unsqueeze(1))
+                  for i in range(0, len(z), self.batch_size)]
+        return torch.cat(logits) if logits else torch.zeros((0, 2))
+
+    __call__ = forward
+
+    def predict_proba(self, log_psd, hop=1):
+        import torch
+        with torch.no_grad():
+            return torch.softmax(self(log_psd, hop), dim=1).numpy()
+
+
+def score_span(evaluator, query_fn, start, end, box_id="parost2", sensor_id="141929", password=None,
+               fs_in=20, fs_out=100, window_duration=10, overlap=0.5, hop=1, dtype=None):
+    """
+    Query [start, end) once and score every hop. Returns a DataFrame with
+    window_start/window_end of each 60 s stack, predicted_class, the class
+    probabilities and `quality`, the worst valid-sample fraction of its windows.
+    """
+    import pandas as pd
+    from gridding import grid_samples, window_quality, df_times_ns
+    n_samples = int(round((end - start).total_seconds() * fs_in))
+    data = query_fn(start_time=start.isoformat(timespec="seconds"), end_time=end.isoformat(timespec="seconds"),
+                    box_id=box_id, sensor_id=sensor_id, password=password)
+    df = data.get(f"{box_id}_{sensor_id}")
+    if df is None or df.empty:
+        return pd.DataFrame()
+    grid, valid, _ = grid_samples(df_times_ns(df), df['value'].values,
+                                  pd.Timestamp(start).value, n_samples, fs_in)
+
+    out = psd_spectrogram(grid, fs_in, fs_out, window_duration, overlap, dtype)
+    if out is None or len(out[0]) < evaluator.stack:
+        return pd.DataFrame()
+    power = out[0]
+    probs = evaluator.predict_proba(np.log10(power + 1e-10), hop)
+
+    quality = window_quality(valid, fs_in, window_duration, overlap)[:len(power)]
+    stack_quality = np.lib.stride_tricks.sliding_window_view(quality, evaluator.stack)[::hop].min(axis=1)
+    step = window_duration * (1 - overlap)
+    starts = pd.Timestamp(start) + pd.to_timedelta(np.arange(len(probs)) * hop * step, unit='s')
+    span = window_duration + (evaluator.stack - 1) * step
+    return pd.DataFrame({
+        'window_start': starts,
+        'window_end': starts + pd.Timedelta(seconds=span),
+        'predicted_class': probs.argmax(axis=1),
+        'prob_earthquake': probs[:, 1],
+        'prob_background': probs[:, 0],
+        'quality': stack_quality[:len(probs)],
+    })
+
+
+def exactness_check(evaluator, samples, fs_in=20, fs_out=100, window_duration=10, overlap=0.5,
+                    segment_hops=60):
+    """
+    Compare the sliding evaluator with per-window evaluation of the same stacks,
+    and with the per-segment feature path, and time both paths.
+    """
+    import torch
+    from DataQueryUtils import psd_windows_from_samples, normalize_psd
+    mean, std = evaluator.mean.numpy(), evaluator.scale.numpy() - 1e-6
+    model = evaluator.model
+
+    t0 = time.perf_counter()
+    power, _ = psd_spectrogram(samples, fs_in, fs_out, window_duration, overlap)
+    t_spec = time.perf_counter() - t0
+    log_psd = np.log10(power + 1e-10)
+    t0 = time.perf_counter()
+    probs = evaluator.predict_proba(log_psd)
+    t_sliding = time.perf_counter() - t0
+    n_hops = len(probs)
+
+    # Per-window: normalize_psd + one forward per stack, as the range scan does per segment
+    ref = np.empty_like(probs)
+    z_max = 0.0
+    stacks = evaluator.stacks(log_psd).numpy()
+    t0 = time.perf_counter()
+    with torch.no_grad():
+        for t in range(n_hops):
+            z = normalize_psd(power[t:t + evaluator.stack], mean, std)
+            z_max = max(z_max, float(np.abs(z - stacks[t]).max()))
+            ref[t] = torch.softmax(model(torch.from_numpy(z)[None, None]), dim=1).numpy()[0]
+    t_per_window = time.perf_counter() - t0
+
+    # Per-segment feature path on the first `segment_hops` hops (extrapolated for timing)
+    seg = int(window_duration * (1 + (evaluator.stack - 1) * (1 - overlap)) * fs_in)
+    hop_samples = int(window_duration * (1 - overlap) * fs_in)
+    n_seg = min(segment_hops, n_hops)
+    seg_probs = []
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), torch.no_grad():
+        for t in range(n_seg):
+            windows = psd_windows_from_samples(samples[t * hop_samples:t * hop_samples + seg],
+                                               fs_in, fs_out, window_duration, overlap)
+            z = normalize_psd(windows[0], mean, std)
+            seg_probs.append(torch.softmax(model(torch.from_numpy(z)[None, None]), dim=1).numpy()[0])
+    t_segment = (time.perf_counter() - t0) / max(n_seg, 1) * n_hops
+    seg_probs = np.array(seg_probs)
+
+    return {
+        'hops': n_hops,
+        'stack_max_abs': z_max,
+        'prob_max_abs': float(np.abs(probs[:, 1] - ref[:, 1]).max()),
+        'class_flips': int((probs.argmax(1) != ref.argmax(1)).sum()),
+        'segment_path_prob_max_abs': float(np.abs(probs[:n_seg, 1] - seg_probs[:, 1]).max()),
+        'seconds': {
+            'spectrogram': t_spec,
+            'sliding_forward': t_sliding,
+            'per_window_forwards': t_per_window,
+            'segment_path_estimated': t_segment,
+        },
+    }
+
+
+def exactness_failures(report, prob_tolerance=PROB_TOLERANCE):
+    """Failed conditions of an exactness_check() report; empty if the sliding path is exact."""
+    failures = []
+    if not report['prob_max_abs'] < prob_tolerance:
+        failures.append(f"prob_max_abs {report['prob_max_abs']:.3g} >= {prob_tolerance:g}")
+    if report['class_flips']:
+        failures.append(f"{report['class_flips']} class flip(s)")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a long span at a 5 s hop in one pass.")
+    parser.add_argument("--start", required=True, help="Span start, ISO format (UTC)")
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--hop", type=int, default=1, help="Hop in PSD windows (1 window = 5 s)")
+    parser.add_argument("--model", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs/fold_5/CNNmodel.pth"))
+    parser.add_argument("--stats-dir", default=os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data"))
+    parser.add_argument("--password")
+    parser.add_argument("--fake", action="store_true", help="Use synthetic data instead of InfluxDB")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare against per-window evaluation and report timings")
+    parser.add_argument("--out", help="Write the per-hop predictions as CSV")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from gridding import grid_samples, df_times_ns
+
+    start = datetime.fromisoformat(args.start)
+    end = start + timedelta(minutes=args.minutes)
+    if args.fake:
+        from fake_influx import FakeInflux, SyntheticSource
+        query_fn = FakeInflux(SyntheticSource(start, events=[start + timedelta(minutes=args.minutes / 2)]))
+    else:
+        from paros_data_grabber import query_influx_data as query_fn
+
+    evaluator = SlidingEarthquakeCNN.from_checkpoint(args.model, args.stats_dir)
+    t0 = time.perf_counter()
+    results = score_span(evaluator, query_fn, start, end, password=args.password, hop=args.hop)
+    print(f"Scored {len(results)} hops in {time.perf_counter() - t0:.2f} s "
+          f"({int(results['predicted_class'].sum()) if len(results) else 0} predicted earthquake)")
+    if args.out:
+        results.to_csv(args.out, index=False)
+
+    if args.check:
+        data = query_fn(start_time=start.isoformat(timespec="seconds"), end_time=end.isoformat(timespec="seconds"),
+                        box_id="parost2", sensor_id="141929", password=args.password)
+        df = data["parost2_141929"]
+        grid, _, _ = grid_samples(df_times_ns(df), df['value'].values, pd.Timestamp(start).value,
+                                  int(round(args.minutes * 60 * 20)))
+        report = exactness_check(evaluator, grid)
+        for key, value in report.items():
+            if key != 'seconds':
+                print(f"{key:<38}{value}")
+        for key, value in report['seconds'].items():
+            print(f"{key + ' (s)':<38}{value:.3f}")
+        failures = exactness_failures(report)
+        if failures:
+            print("Exactness check FAILED: " + "; ".join(failures))
+            sys.exit(1)
+        print("Exactness check passed")
@@ -0,0 +1,184 @@
+"""
+Event-Triggered Raw Waveform Snapshots
+--------------------------------------
+
+When the live monitor predicts class 1, the raw samples around the detection are
+still in its in-memory SampleBuffer. SnapshotWriter copies a pre/post-trigger
+span out of that buffer and writes it to disk from a background thread, so
+detections can be reviewed or added to the training data without re-querying
+InfluxDB, and the inference loop never waits on disk I/O.
+
+Behaviour:
+----------
+- trigger() only enqueues a request and returns immediately. If the queue is full,
+  the request is dropped and counted in `dropped`; inference is never blocked.
+- The writer thread waits until the buffer holds data up to `post_trigger` seconds
+  after the detection window (or `max_wait` seconds of monitor time have passed),
+  then copies the span [window_start - pre_trigger, window_end + post_trigger).
+- Consecutive detections whose spans overlap a snapshot that has not been written
+  yet are merged into it: its end and its deadline move to those of the latest
+  detection. A detection after the snapshot was written gets its own full span
+  including the pre-trigger, so it may overlap the previous file.
+- On stop(), pending snapshots are written with the samples buffered so far
+  ('complete': False); one without any buffered sample is not written.
+- Each snapshot is one pickle in the EarthQuakeEvents.pkl entry structure:
+      {'detection_YYYYmmddTHHMMSS': {
+          'waveform': {'parost2_141929': array (n, 2) [epoch seconds, value]},
+          'metadata': {'time', 'arrival_time', 'window_start', 'window_end',
+                       'prob_earthquake', 'model_version', 'pre_trigger',
+                       'post_trigger', 'n_samples', 'complete'}}}
+  The value is the last column, as in the exported event pickles, so
+  load_snapshots() output can go straight into PSD_Earthquake_processor.py.
+
+Usage:
+------
+    writer = SnapshotWriter(monitor.buffer, "LoggedData/snapshots", clock=monitor.clock)
+    writer.start()
+    writer.trigger(window_start, window_end, {'prob_earthquake': p})
+    writer.stop()
+    events = load_snapshots("LoggedData/snapshots")    # {event_001: {...}, ...}
+
+Dependencies:
+-------------
+- NumPy, pandas
+"""
+
+import glob
+import os
+import pickle
+import queue
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+
+class SnapshotWriter:
+    def __init__(self, buffer, out_dir, clock=None, pre_trigger=60.0, post_trigger=60.0,
+                 max_wait=120.0, key="parost2_141929", max_queue=64):
+        self.buffer = buffer
+        self.out_dir = out_dir
+        self.clock = clock
+        self.pre_trigger = pre_trigger
+        self.post_trigger = post_trigger
+        self.max_wait = max_wait
+        self.key = key
+        self.written = []
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._open = None  # latest request not yet copied out of the buffer
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _now(self):
+        return self.clock.now() if self.clock else pd.Timestamp.now(tz="UTC").tz_convert(None).to_pydatetime()
+
+    def _sleep(self, seconds):
+        if self.clock:
+            self.clock.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="snapshot-writer")
+        self._thread.start()
+
+    def trigger(self, window_start, window_end, metadata=None):
+        """Schedule a snapshot around one detection window; never blocks."""
+        start = window_start - timedelta(seconds=self.pre_trigger)
+        end = window_end + timedelta(seconds=self.post_trigger)
+        with self._lock:
+            if self._open is not None and start <= self._open['end']:
+                if end > self._open['end']:
+                    self._open['end'] = end
+                    self._open['window_end'] = window_end
+                    self._open['deadline'] = window_end + timedelta(seconds=self.post_trigger + self.max_wait)
+                prob = (metadata or {}).get('prob_earthquake')
+                if prob is not None:
+                    self._open['metadata']['prob_earthquake'] = max(
+                        self._open['metadata'].get('prob_earthquake') or 0.0, prob)
+                return
+            request = {'start': start, 'end': end, 'window_start': window_start,
+                       'window_end': window_end, 'metadata': dict(metadata or {}),
+                       'deadline': window_end + timedelta(seconds=self.post_trigger + self.max_wait)}
+            try:
+                self._queue.put_nowait(request)
+            except queue.Full:
+                self.dropped += 1
+                return
+            self._open = request
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                request = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # Wait for the post-trigger samples to arrive
+            while not self._stop.is_set():
+                with self._lock:
+                    end_ns = pd.Timestamp(request['end']).value
+                    deadline = request['deadline']
+                latest = self.buffer.latest_ns
+                if (latest is not None and latest >= end_ns - 10**8) or self._now() >= deadline:
+                    break
+                self._sleep(0.5)
+
+            with self._lock:
+                if self._open is request:
+                    self._open = None
+                start_ns, end_ns = pd.Timestamp(request['start']).value, pd.Timestamp(request['end']).value
+            times, values = self.buffer.window(start_ns, end_ns)
+            if not len(times):
+                print(f"No buffered samples for the detection at {request['window_start']}, snapshot not written")
+                continue
+            try:
+                self.written.append(self._write(request, times, values))
+            except OSError as e:
+                print(f"Failed to write snapshot for {request['window_start']}: {e}")
+
+    def _write(self, request, times, values):
+        name = f"detection_{request['window_start']:%Y%m%dT%H%M%S}"
+        expected = (pd.Timestamp(request['end']) - pd.Timestamp(request['start'])).total_seconds()
+        metadata = {
+            'time': request['window_start'].strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            'arrival_time': request['window_start'].strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            'window_start': request['window_start'].isoformat(),
+            'window_end': request['window_end'].isoformat(),
+            'pre_trigger': self.pre_trigger,
+            'post_trigger': self.post_trigger,
+            'n_samples': int(len(values)),
+            # Allow one missing sample at each edge
+            'complete': bool(len(times) and (times[-1] - times[0]) / 1e9 >= expected - 0.1),
+            **request['metadata'],
+        }
+        entry = {name: {
+            'waveform': {self.key: np.column_stack([times / 1e9, values])},
+            'metadata': metadata,
+        }}
+        path = os.path.join(self.out_dir, name + ".pkl")
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry, f)
+        os.replace(tmp, path)
+        return path
+
+    def stop(self, timeout=None):
+        """Write pending snapshots with the samples buffered so far and stop the thread."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+def load_snapshots(folder):
+    """All snapshots of a folder as one EarthQuakeEvents.pkl-style dict (event_001, ...)."""
+    events = {}
+    for path in sorted(glob.glob(os.path.join(folder, "detection_*.pkl"))):
+        with open(path, 'rb') as f:
+            for entry in pickle.load(f).values():
+                events[f"event_{len(events) + 1:03d}"] = entry
+    return events
@@ -0,0 +1,311 @@
+"""
+Distilling the Fold Ensemble into a Compact Student Model
+---------------------------------------------------------
+
+The five fold checkpoints in fold_outputs together give better calibrated
+probabilities than any single one, but running all five on the sensor host
+costs five forward passes per minute. This script trains one
+CompactEarthquakeCNN2d (depthwise-separable, about a tenth of the parameters
+of EarthquakeCNN2d) to reproduce the ensemble.
+
+Training:
+---------
+- Features: the cached PSD pickles, log10 scaled and z-scored with the
+  mean.npy / std.npy the fold models were trained with (as at inference).
+- Soft labels: the average over the fold models of softmax(logits / T).
+- Loss: alpha * T^2 * KL(student_T || ensemble_T) + (1 - alpha) * class
+  weighted cross entropy on the hard labels (balanced weights times the bias
+  factor, as in train_folds.py); RAdam, EarlyStopping on the validation loss.
+- Split: the rows of `--val-fold` (norm_stats.fold_splits, the split of
+  train_folds.py) are held out, and the student never trains on them. They are
+  split in two stratified halves: early stopping watches one, and every model
+  is measured on the other, so the student's stopping epoch is not chosen on
+  the rows it is scored on. The teacher of that fold never saw them only if
+  train_folds.py trained it on the same data with the same `--folds` /
+  `--seed`; this is checked against its split.json (train_folds.verify_split)
+  and the script stops otherwise. The checkpoints from CNN2D.ipynb use an
+  unseeded shuffle and cannot be verified: retrain them with train_folds.py,
+  or pass `--allow-unverified-split`, which marks the single_cnn numbers as
+  possibly in-sample. The other four teachers did see the held-out rows: the
+  ensemble's numbers are optimistic and reported for reference only.
+
+Report:
+-------
+Accuracy, precision, recall, F1 and ROC-AUC on the measured half of the
+held-out fold (sizes of both halves in n_early_stopping / n_holdout), parameter
+count, and CPU latency (median ms per call for one stack, and per stack in a
+batch of 256) with `--threads` torch threads, for the student, the single
+EarthquakeCNN2d and the five-model ensemble. Written to
+`<out>/distill_report.json` next to the student's `CNNmodel.pth` and
+`student.json` (architecture and kwargs). The student can be registered for
+the live monitor:
+
+    python ../Eval/model_registry.py --root model_registry register \\
+        --checkpoint fold_outputs/student/CNNmodel.pth \\
+        --stats-dir ../DataCollection_Preprocessing/Exported_Paros_Data \\
+        --config "$(python -c 'import json; print(json.dumps(json.load(open("fold_outputs/student/student.json"))["registry_config"]))')"
+
+Usage:
+------
+    python distill.py
+    python distill.py --temperature 3 --alpha 0.8 --channels 8 16 --hidden 32
+    python distill.py --synthetic 2000 --epochs 5      # smoke test without pickles
+
+Dependencies:
+-------------
+- PyTorch, torch_optimizer (RAdam), NumPy, scikit-learn
+- Custom utilities: cnn_model, train_folds, norm_stats, tensor_batches
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+import numpy as np
+
+from norm_stats import fold_splits, log_psd
+from train_folds import EarlyStopping, load_dataset, verify_split
+
+# torch, torch_optimizer and scikit-learn load in the functions that use them
+# (and after argument parsing), so `--help` does not pay for them
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_teachers(fold_dir, input_shape, K=5):
+    import torch
+    from cnn_model import EarthquakeCNN2d
+    teachers = []
+    for k in range(1, K + 1):
+        model = EarthquakeCNN2d(input_shape=input_shape)
+        model.load_state_dict(torch.load(os.path.join(fold_dir, f"fold_{k}", "CNNmodel.pth"),
+                                         map_location="cpu"))
+        teachers.append(model.eval())
+    return teachers
+
+
+def predict_logits(model, X, batch_size=1024):
+    import torch
+    model.eval()
+    X = torch.as_tensor(X, dtype=torch.float32).unsqueeze(1)
+    with torch.no_grad():
+        return torch.cat([model(X[i:i + batch_size]) for i in range(0, len(X), batch_size)])
+
+
+def ensemble_probs(teachers, X, temperature=1.0):
+    """Mean over the teachers of softmax(logits / T), shape (events, 2)."""
+    import torch
+    return torch.stack([torch.softmax(predict_logits(t, X) / temperature, dim=1)
+                        for t in teachers]).mean(0)
+
+
+def distill(X_train, y_train, soft_train, X_val, y_val, soft_val, student, temperature=2.0,
+            alpha=0.7, lr=1e-3, batch_size=64, bias_factor=3.0, epochs=60, patience=8, seed=42):
+    """Train the student in place on soft (ensemble, at temperature T) and hard labels."""
+    import torch
+    from torch import nn
+    import torch_optimizer as optim
+    from sklearn.utils.class_weight import compute_class_weight
+    from tensor_batches import TensorBatchIterator
+
+    torch.manual_seed(seed)
+    class_weights = compute_class_weight('balanced', classes=np.unique(y_train), y=y_train)
+    class_weights[1] *= bias_factor
+    hard_loss = nn.CrossEntropyLoss(weight=torch.tensor(class_weights, dtype=torch.float32))
+    optimizer = optim.RAdam(student.parameters(), lr=lr)
+
+    def loss_fn(logits, hard, soft):
+        kd = nn.functional.kl_div(torch.log_softmax(logits / temperature, dim=1), soft,
+                                  reduction='batchmean') * temperature ** 2
+        return alpha * kd + (1 - alpha) * hard_loss(logits, hard)
+
+    # The iterators yield row indices as "targets"; hard and soft labels are looked up by row
+    y_train_t, soft_train_t = torch.as_tensor(y_train, dtype=torch.long), torch.as_tensor(soft_train)
+    train_loader = TensorBatchIterator(X_train, np.arange(len(X_train)), batch_size=batch_size,
+                                       shuffle=True, seed=seed)
+    X_val_t = torch.as_tensor(X_val, dtype=torch.float32).unsqueeze(1)
+    y_val_t, soft_val_t = torch.as_tensor(y_val, dtype=torch.long), torch.as_tensor(soft_val)
+
+    early_stopping = EarlyStopping(patience=patience, min_delta=1e-4)
+    history = []
+    for epoch in range(epochs):
+        student.train()
+        train_loss = 0
+        for data, rows in train_loader:
+            optimizer.zero_grad()
+            loss = loss_fn(student(data), y_train_t[rows], soft_train_t[rows])
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item()
+        train_loss /= len(train_loader)
+
+        student.eval()
+        with torch.no_grad():
+            val_loss = loss_fn(student(X_val_t), y_val_t, soft_val_t).item()
+        history.append({'epoch': epoch + 1, 'train_loss': train_loss, 'val_loss': val_loss})
+        if (epoch + 1) % 10 == 0 or epoch == 0:
+            print(f"Epoch [{epoch+1}/{epochs}] Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}",
+                  flush=True)
+
+        early_stopping(val_loss)
+        if early_stopping.early_stop:
+            print(f"Early stopping after {epoch+1} epochs.", flush=True)
+            break
+    return history
+
+
+def classification_metrics(probs, y, threshold=0.5):
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
+    preds = (probs >= threshold).astype(int)
+    return {
+        'accuracy': accuracy_score(y, preds),
+        'precision': precision_score(y, preds, zero_division=0),
+        'recall': recall_score(y, preds, zero_division=0),
+        'f1': f1_score(y, preds, zero_division=0),
+        'roc_auc': roc_auc_score(y, probs) if len(np.unique(y)) == 2 else float('nan'),
+    }
+
+
+def cpu_latency(models, input_shape, batch=256, repeats=50):
+    """Median ms for one (1, 1, *input_shape) call and per stack in a batch of `batch`."""
+    import torch
+    one = torch.randn(1, 1, *input_shape)
+    many = torch.randn(batch, 1, *input_shape)
+
+    def median_ms(x):
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            for model in models:
+                model(x)
+            times.append((time.perf_counter() - t0) * 1e3)
+        return statistics.median(times)
+
+    with torch.inference_mode():
+        for model in models:
+            model.eval()
+            model(one)  # warm-up
+        return {'ms_per_call': median_ms(one), 'ms_per_stack_batched': median_ms(many) / batch}
+
+
+def n_parameters(models):
+    return sum(p.numel() for model in models for p in model.parameters())
+
+
+if __name__ == "__main__":
+    data_dir = os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data")
+    parser = argparse.ArgumentParser(description="Distill the fold ensemble into CompactEarthquakeCNN2d.")
+    parser.add_argument("--eq", default=os.path.join(data_dir, "PSD_Windows_Earthquake_100Hz.pkl"))
+    parser.add_argument("--bg", nargs="+", default=[os.path.join(data_dir, "PSD_Windows_Background_100Hz.pkl")])
+    parser.add_argument("--stats-dir", default=data_dir, help="mean.npy / std.npy of the fold models")
+    parser.add_argument("--fold-dir", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs"))
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs/student"))
+    parser.add_argument("--synthetic", type=int, help="Use N synthetic (already normalized) stacks")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--val-fold", type=int, default=1, help="Held-out fold (1-based)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--allow-unverified-split", action="store_true",
+                        help="Run even if the held-out fold's teacher has no matching split.json")
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.7, help="Weight of the soft-label loss")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--bias-factor", type=float, default=3.0)
+    parser.add_argument("--epochs", type=int, default=60)
+    parser.add_argument("--patience", type=int, default=8)
+    parser.add_argument("--channels", type=int, nargs=2, default=[8, 16])
+    parser.add_argument("--hidden", type=int, default=32)
+    parser.add_argument("--dropout", type=float, default=0.1)
+    parser.add_argument("--threads", type=int, default=1, help="torch threads for the latency test")
+    args = parser.parse_args()
+
+    import torch
+    from sklearn.model_selection import train_test_split
+    from cnn_model import CompactEarthquakeCNN2d
+
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        y = (rng.random(args.synthetic) < 0.1).astype(int)
+        X = rng.standard_normal((args.synthetic, 11, 52)).astype(np.float32)
+        X[y == 1, :, :10] += 1.0
+    else:
+        X_raw, y = load_dataset(args.eq, args.bg)
+        mean, std = np.load(os.path.join(args.stats_dir, "mean.npy")), np.load(os.path.join(args.stats_dir, "std.npy"))
+        X = ((log_psd(X_raw) - mean) / (std + 1e-6)).astype(np.float32)
+    input_shape = X.shape[1:]
+
+    split_problem = "synthetic data" if args.synthetic else \
+        verify_split(os.path.join(args.fold_dir, f"fold_{args.val_fold}"), X_raw, y, args.folds, args.seed,
+                     args.val_fold)
+    if split_problem and not args.synthetic and not args.allow_unverified_split:
+        raise SystemExit(f"Cannot verify that the fold {args.val_fold} teacher never saw its held-out rows: "
+                         f"{split_problem}. Retrain the folds with train_folds.py (same --folds / --seed), "
+                         f"or pass --allow-unverified-split.")
+
+    teachers = load_teachers(args.fold_dir, input_shape, args.folds)
+    soft = ensemble_probs(teachers, X, args.temperature).numpy()
+    train_idx, val_idx = fold_splits(y, args.folds, args.seed)[args.val_fold - 1]
+    # One half decides when to stop, the other is only measured
+    stop_idx, holdout_idx = train_test_split(val_idx, test_size=0.5, stratify=y[val_idx],
+                                             random_state=args.seed)
+    print(f"{len(train_idx)} training / {len(val_idx)} held-out stacks (fold {args.val_fold}: "
+          f"{len(stop_idx)} early stopping, {len(holdout_idx)} measured), "
+          f"{len(teachers)} teachers at T={args.temperature}")
+
+    model_kwargs = {'channels': args.channels, 'hidden': args.hidden, 'dropout': args.dropout}
+    student = CompactEarthquakeCNN2d(input_shape, **model_kwargs)
+    t0 = time.perf_counter()
+    history = distill(X[train_idx], y[train_idx], soft[train_idx], X[stop_idx], y[stop_idx], soft[stop_idx],
+                      student, temperature=args.temperature, alpha=args.alpha, lr=args.lr,
+                      batch_size=args.batch_size, bias_factor=args.bias_factor, epochs=args.epochs,
+                      patience=args.patience, seed=args.seed)
+    train_seconds = time.perf_counter() - t0
+
+    X_val, y_val = X[holdout_idx], y[holdout_idx]
+    single = teachers[args.val_fold - 1]
+    probs = {
+        'student': torch.softmax(predict_logits(student, X_val), dim=1)[:, 1].numpy(),
+        'single_cnn': torch.softmax(predict_logits(single, X_val), dim=1)[:, 1].numpy(),
+        'ensemble': ensemble_probs(teachers, X_val)[:, 1].numpy(),
+    }
+    members = {'student': [student], 'single_cnn': [single], 'ensemble': teachers}
+
+    torch.set_num_threads(args.threads)
+    report = {'val_fold': args.val_fold, 'n_val': int(len(val_idx)), 'n_early_stopping': int(len(stop_idx)),
+              'n_holdout': int(len(holdout_idx)), 'threads': args.threads,
+              'train_seconds': train_seconds, 'epochs': len(history),
+              'split_verified': split_problem is None, 'models': {}}
+    for name, p in probs.items():
+        report['models'][name] = {**classification_metrics(p, y_val),
+                                  'parameters': n_parameters(members[name]),
+                                  **cpu_latency(members[name], input_shape)}
+    report['models']['ensemble']['note'] = "4 of 5 teachers trained on the held-out rows: optimistic"
+    if split_problem:
+        report['models']['single_cnn']['note'] = f"split not verified ({split_problem}): may be in-sample"
+    # Agreement with the (temperature 1) ensemble, the quantity the student imitates
+    report['student_vs_ensemble_mean_abs_prob'] = float(np.abs(probs['student'] - probs['ensemble']).mean())
+
+    os.makedirs(args.out, exist_ok=True)
+    torch.save(student.state_dict(), os.path.join(args.out, "CNNmodel.pth"))
+    student_config = {
+        'architecture': "CompactEarthquakeCNN2d", 'model_kwargs': model_kwargs,
+        'input_shape': list(input_shape), 'temperature': args.temperature, 'alpha': args.alpha,
+        'val_fold': args.val_fold, 'history': history,
+        'registry_config': {'architecture': "CompactEarthquakeCNN2d", 'model_kwargs': model_kwargs,
+                            'input_shape': list(input_shape)},
+    }
+    with open(os.path.join(args.out, "student.json"), 'w') as f:
+        json.dump(student_config, f, indent=2)
+    with open(os.path.join(args.out, "distill_report.json"), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'model':<12}{'acc':>8}{'f1':>8}{'auc':>8}{'params':>10}{'ms/call':>10}{'ms/stack':>10}")
+    for name, r in report['models'].items():
+        print(f"{name:<12}{r['accuracy']:>8.4f}{r['f1']:>8.4f}{r['roc_auc']:>8.4f}{r['parameters']:>10d}"
+              f"{r['ms_per_call']:>10.3f}{r['ms_per_stack_batched']:>10.4f}")
+    print(f"(ensemble on the held-out fold is optimistic; student vs ensemble mean |dp| = "
+          f"{report['student_vs_ensemble_mean_abs_prob']:.4f})")
+    if split_problem:
+        print(f"WARNING: single_cnn may have trained on the held-out rows ({split_problem})")
+    print(f"Saved the student and report to {args.out}")
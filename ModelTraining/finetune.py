@@ -0,0 +1,369 @@
+"""
+Incremental Fine-Tuning from Newly Confirmed Events
+---------------------------------------------------
+
+Adds newly labeled PSD windows to the training features and fine-tunes an
+existing checkpoint on them, instead of regenerating every pickle and training
+all folds again for each new confirmed earthquake.
+
+Workflow:
+---------
+1. Feature set: `feature_set.npz` next to the PSD pickles holds the raw PSD
+   stacks (events, 11, 52), their labels, the update batch each row came from
+   and a content hash per row. It is created from the training pickles on the
+   first run (batch 0, rows in load_dataset order, so norm_stats.fold_splits
+   gives the same folds as train_folds.py).
+2. Append: `--new-eq` / `--new-bg` PSD pickles (e.g. PSD_Earthquake_processor.py
+   run on load_snapshots() output, or mined hard negatives) are added as the
+   next batch with label 1 / 0. Rows already in the feature set are skipped.
+3. Warm start: the `--checkpoint` weights are loaded and inputs are normalized
+   with the mean.npy / std.npy it was trained with (kept fixed: new statistics
+   would shift every input the model has learned).
+4. Replay: every epoch trains on all new rows plus a fresh random sample of the
+   prior rows (`--replay` times the new rows, at least `--min-replay`), so the
+   model does not forget the old data. Class weights (balanced, bias factor)
+   are computed over all training rows as in train_folds.py; RAdam at a lower
+   learning rate, EarlyStopping on the validation loss.
+5. Validation: the rows of `--val-fold` of batch 0 are never trained on. They
+   are unseen by the checkpoint only if train_folds.py trained it on the same
+   data with the same `--folds` / `--seed`, which is checked against the
+   split.json next to it (train_folds.verify_split); the script stops
+   otherwise. The CNN2D.ipynb checkpoints use an unseeded shuffle and cannot
+   be verified: retrain them with train_folds.py, or pass
+   `--allow-unverified-split`, which logs the held-out numbers as unverified.
+   The fold is split in two stratified halves: early stopping watches one, and
+   accuracy, precision, recall, F1, ROC-AUC and cross entropy are logged before
+   and after fine-tuning on the other (forgetting check), so the "after"
+   numbers are not biased by the stopping decision. They are also logged on the
+   new rows (the "before" numbers show how the old model did on the new
+   events; "after" is in-sample).
+
+The fine-tuned weights go to `<out>/CNNmodel.pth` (the fold checkpoints are
+left alone) with a copy of the verified split.json, and each run appends one
+JSON line to `<out>/finetune_log.jsonl`.
+The next update can warm-start from `<out>/CNNmodel.pth` (keep the same
+`--val-fold`); register it with model_registry.py to deploy it to the live
+monitor.
+
+Usage:
+------
+    python finetune.py --new-eq ../DataCollection_Preprocessing/Exported_Paros_Data/PSD_Windows_Confirmed_100Hz.pkl
+    python finetune.py --new-bg PSD_Windows_HardNegatives_100Hz.pkl --checkpoint fold_outputs/finetuned/CNNmodel.pth
+    python finetune.py --new-eq new.pkl --no-train        # only append
+    python finetune.py --batch 3                          # fine-tune on an appended batch
+    python finetune.py --status
+
+Dependencies:
+-------------
+- PyTorch, torch_optimizer (RAdam), NumPy, scikit-learn
+- Custom utilities: cnn_model, train_folds, norm_stats, tensor_batches, psd_pickle_utils
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+from norm_stats import fold_splits, log_psd
+from psd_pickle_utils import load_pickle_data, extract_psd_array
+from train_folds import EarlyStopping, load_dataset, verify_split
+
+# torch, torch_optimizer, scikit-learn and cnn_model load in the functions that use
+# them (and after argument parsing), so `--help` and `--status` stay fast
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FeatureSet:
+    """
+    Appendable raw PSD feature dataset in one .npz file.
+
+    X (events, windows, freq_bins), y, batch (0 = the training pickles, then one
+    per append) and key (hash of the row's values, used to skip duplicates).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.X, self.y, self.batch, self.key = data['X'], data['y'], data['batch'], data['key']
+        else:
+            self.X = self.y = self.batch = self.key = None
+
+    def __len__(self):
+        return 0 if self.y is None else len(self.y)
+
+    @staticmethod
+    def row_keys(X):
+        rows = np.ascontiguousarray(X, dtype=np.float64).reshape(len(X), -1)
+        return np.array([hashlib.sha1(row.tobytes()).hexdigest()[:16] for row in rows])
+
+    def append(self, X, y, dedupe=True):
+        """Add rows as the next batch; returns the indices of the rows added."""
+        keys = self.row_keys(X)
+        if dedupe:
+            _, first = np.unique(keys, return_index=True)
+            keep = np.sort(first)
+            if self.key is not None:
+                keep = keep[~np.isin(keys[keep], self.key)]
+            X, y, keys = X[keep], y[keep], keys[keep]
+        start = len(self)
+        if len(y) == 0:
+            return np.arange(start, start)
+        batch = np.full(len(y), 0 if self.y is None else self.batch.max() + 1)
+        if self.y is None:
+            self.X, self.y, self.batch, self.key = X, y, batch, keys
+        else:
+            self.X = np.concatenate([self.X, X.astype(self.X.dtype)])
+            self.y = np.concatenate([self.y, y])
+            self.batch = np.concatenate([self.batch, batch])
+            self.key = np.concatenate([self.key, keys])
+        return np.arange(start, len(self))
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, X=self.X, y=self.y, batch=self.batch, key=self.key)
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        lines = []
+        for b in np.unique(self.batch):
+            labels = self.y[self.batch == b]
+            lines.append(f"batch {b}: {len(labels)} rows ({int(labels.sum())} earthquake, "
+                         f"{int((labels == 0).sum())} background)")
+        return "\n".join(lines)
+
+
+def load_new_rows(eq_paths, bg_paths):
+    X, y = [], []
+    for paths, label in ((eq_paths, 1), (bg_paths, 0)):
+        for path in paths or []:
+            rows = extract_psd_array(load_pickle_data(path))
+            if len(rows):
+                X.append(rows)
+                y.append(np.full(len(rows), label))
+            print(f"{path}: {len(rows)} stacks (label {label})")
+    if not X:
+        return None, None
+    return np.concatenate(X), np.concatenate(y)
+
+
+def evaluate(model, X, y, batch_size=1024):
+    """Classification metrics and mean cross entropy of model on normalized X."""
+    import torch
+    from torch import nn
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
+    model.eval()
+    X = torch.as_tensor(X, dtype=torch.float32).unsqueeze(1)
+    with torch.no_grad():
+        logits = torch.cat([model(X[i:i + batch_size]) for i in range(0, len(X), batch_size)])
+    probs = torch.softmax(logits, dim=1)[:, 1].numpy()
+    preds = logits.argmax(1).numpy()
+    return {
+        'n': int(len(y)),
+        'accuracy': accuracy_score(y, preds),
+        'precision': precision_score(y, preds, zero_division=0),
+        'recall': recall_score(y, preds, zero_division=0),
+        'f1': f1_score(y, preds, zero_division=0),
+        'roc_auc': roc_auc_score(y, probs) if len(np.unique(y)) == 2 else None,
+        'nll': nn.functional.cross_entropy(logits, torch.as_tensor(y, dtype=torch.long)).item(),
+    }
+
+
+def finetune(model, X, y, new_idx, prior_idx, val_idx, lr=2e-5, epochs=10, batch_size=32,
+             bias_factor=3.0, replay=4.0, min_replay=256, patience=3, seed=42):
+    """
+    Fine-tune model in place on normalized X: each epoch sees all new_idx rows
+    plus a fresh random sample of prior_idx rows, and early stopping watches the
+    loss on val_idx. Returns per-epoch losses.
+    """
+    import torch
+    from torch import nn
+    import torch_optimizer as optim
+    from sklearn.utils.class_weight import compute_class_weight
+    from tensor_batches import TensorBatchIterator
+
+    rng = np.random.default_rng(seed)
+    torch.manual_seed(seed)
+    train_idx = np.concatenate([new_idx, prior_idx])
+    class_weights = compute_class_weight('balanced', classes=np.unique(y[train_idx]), y=y[train_idx])
+    class_weights[1] *= bias_factor
+    criterion = nn.CrossEntropyLoss(weight=torch.tensor(class_weights, dtype=torch.float32))
+    optimizer = optim.RAdam(model.parameters(), lr=lr)
+    n_replay = min(len(prior_idx), max(min_replay, int(replay * len(new_idx))))
+
+    X_val = torch.as_tensor(X[val_idx], dtype=torch.float32).unsqueeze(1)
+    y_val = torch.as_tensor(y[val_idx], dtype=torch.long)
+    early_stopping = EarlyStopping(patience=patience, min_delta=1e-4)
+    history = []
+    for epoch in range(epochs):
+        rows = np.concatenate([new_idx, rng.choice(prior_idx, n_replay, replace=False)])
+        loader = TensorBatchIterator(X[rows], y[rows], batch_size=batch_size, shuffle=True,
+                                     seed=seed + epoch)
+        model.train()
+        train_loss = 0
+        for data, targets in loader:
+            optimizer.zero_grad()
+            loss = criterion(model(data), targets)
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item()
+        train_loss /= len(loader)
+
+        model.eval()
+        with torch.no_grad():
+            val_loss = criterion(model(X_val), y_val).item()
+        history.append({'epoch': epoch + 1, 'train_loss': train_loss, 'val_loss': val_loss})
+        print(f"Epoch [{epoch+1}/{epochs}] Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f} "
+              f"({len(new_idx)} new + {n_replay} replay)", flush=True)
+
+        early_stopping(val_loss)
+        if early_stopping.early_stop:
+            print(f"Early stopping after {epoch+1} epochs.", flush=True)
+            break
+    return history
+
+
+def _print_metrics(name, before, after):
+    print(f"\n{name} ({before['n']} stacks)")
+    for k in ('accuracy', 'precision', 'recall', 'f1', 'roc_auc', 'nll'):
+        if before[k] is None:
+            continue
+        print(f"  {k:<10}{before[k]:>9.4f} -> {after[k]:.4f}")
+
+
+if __name__ == "__main__":
+    data_dir = os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data")
+    fold_dir = os.path.join(REPO_ROOT, "ModelTraining/fold_outputs")
+    parser = argparse.ArgumentParser(description="Append newly labeled PSD windows and fine-tune a checkpoint.")
+    parser.add_argument("--new-eq", nargs="+", help="PSD pickles of confirmed earthquakes (label 1)")
+    parser.add_argument("--new-bg", nargs="+", help="PSD pickles of confirmed background (label 0)")
+    parser.add_argument("--batch", type=int, nargs="+",
+                        help="Fine-tune on these already appended batches instead of appending")
+    parser.add_argument("--features", default=os.path.join(data_dir, "feature_set.npz"))
+    parser.add_argument("--eq", default=os.path.join(data_dir, "PSD_Windows_Earthquake_100Hz.pkl"),
+                        help="Training pickle for the initial feature set")
+    parser.add_argument("--bg", nargs="+", default=[os.path.join(data_dir, "PSD_Windows_Background_100Hz.pkl")],
+                        help="Background pickles for the initial feature set")
+    parser.add_argument("--checkpoint", default=os.path.join(fold_dir, "fold_1/CNNmodel.pth"))
+    parser.add_argument("--architecture", default="EarthquakeCNN2d",
+                        help="A cnn_model.ARCHITECTURES name (EarthquakeCNN2d, CompactEarthquakeCNN2d)")
+    parser.add_argument("--model-kwargs", type=json.loads, default={}, help="JSON constructor arguments")
+    parser.add_argument("--stats-dir", default=data_dir, help="mean.npy / std.npy of the checkpoint")
+    parser.add_argument("--out", default=os.path.join(fold_dir, "finetuned"))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--val-fold", type=int, default=1,
+                        help="Held-out fold of batch 0 (the fold of the checkpoint)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--allow-unverified-split", action="store_true",
+                        help="Run even if the checkpoint has no split.json matching --val-fold")
+    parser.add_argument("--lr", type=float, default=2e-5)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--bias-factor", type=float, default=3.0)
+    parser.add_argument("--replay", type=float, default=4.0, help="Replayed prior rows per new row")
+    parser.add_argument("--min-replay", type=int, default=256)
+    parser.add_argument("--patience", type=int, default=3)
+    parser.add_argument("--threads", type=int, help="torch threads (default: all cores)")
+    parser.add_argument("--no-train", action="store_true", help="Only append to the feature set")
+    parser.add_argument("--status", action="store_true", help="Print the feature set batches and exit")
+    args = parser.parse_args()
+
+    features = FeatureSet(args.features)
+    if args.status:
+        print(features.summary() if len(features) else f"{args.features} does not exist yet")
+        raise SystemExit
+    if args.batch and (args.new_eq or args.new_bg):
+        parser.error("--batch fine-tunes on appended rows; it cannot be combined with --new-eq / --new-bg")
+    if args.batch and 0 in args.batch:
+        parser.error("batch 0 holds the training pickles (and the validation fold)")
+    if not args.no_train:
+        from cnn_model import ARCHITECTURES
+        if args.architecture not in ARCHITECTURES:
+            parser.error(f"--architecture must be one of {', '.join(sorted(ARCHITECTURES))}")
+
+    if not len(features):
+        X_base, y_base = load_dataset(args.eq, args.bg)
+        features.append(X_base, y_base, dedupe=False)
+        print(f"Created {args.features} from the training pickles ({len(features)} stacks)")
+    if args.batch:
+        new_idx = np.flatnonzero(np.isin(features.batch, args.batch))
+    else:
+        X_new, y_new = load_new_rows(args.new_eq, args.new_bg)
+        new_idx = np.arange(0)
+        if X_new is not None:
+            new_idx = features.append(X_new, y_new)
+            print(f"Appended {len(new_idx)} new stacks ({len(X_new) - len(new_idx)} already present)")
+    features.save()
+    if args.no_train:
+        print(features.summary())
+        raise SystemExit
+    if not len(new_idx):
+        raise SystemExit("Nothing to fine-tune on: no new stacks (pass --new-eq / --new-bg, or --batch N)")
+
+    import torch
+    from sklearn.model_selection import train_test_split
+    from cnn_model import build_model
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    start = time.perf_counter()
+    mean, std = np.load(os.path.join(args.stats_dir, "mean.npy")), np.load(os.path.join(args.stats_dir, "std.npy"))
+    X = ((log_psd(features.X) - mean) / (std + 1e-6)).astype(np.float32)
+    y = features.y
+
+    base = np.flatnonzero(features.batch == 0)
+    checkpoint_dir = os.path.dirname(os.path.abspath(args.checkpoint))
+    split_problem = verify_split(checkpoint_dir, features.X[base], y[base], args.folds, args.seed, args.val_fold)
+    if split_problem and not args.allow_unverified_split:
+        raise SystemExit(f"Cannot verify that {args.checkpoint} never saw fold {args.val_fold}: {split_problem}. "
+                         f"Warm-start from a train_folds.py checkpoint (same --folds / --seed), "
+                         f"or pass --allow-unverified-split.")
+    val_idx = base[fold_splits(y[base], args.folds, args.seed)[args.val_fold - 1][1]]
+    # One half decides when to stop, the other is only measured
+    stop_idx, holdout_idx = train_test_split(val_idx, test_size=0.5, stratify=y[val_idx],
+                                             random_state=args.seed)
+    prior_idx = np.setdiff1d(np.arange(len(y)), np.concatenate([val_idx, new_idx]))
+
+    model = build_model(X.shape[1:], args.architecture, **args.model_kwargs)
+    model.load_state_dict(torch.load(args.checkpoint, map_location="cpu"))
+    before = {'holdout': evaluate(model, X[holdout_idx], y[holdout_idx]),
+              'new': evaluate(model, X[new_idx], y[new_idx])}
+
+    history = finetune(model, X, y, new_idx, prior_idx, stop_idx, lr=args.lr, epochs=args.epochs,
+                       batch_size=args.batch_size, bias_factor=args.bias_factor, replay=args.replay,
+                       min_replay=args.min_replay, patience=args.patience, seed=args.seed)
+    after = {'holdout': evaluate(model, X[holdout_idx], y[holdout_idx]),
+             'new': evaluate(model, X[new_idx], y[new_idx])}
+    seconds = time.perf_counter() - start
+
+    os.makedirs(args.out, exist_ok=True)
+    checkpoint_out = os.path.join(args.out, "CNNmodel.pth")
+    torch.save(model.state_dict(), checkpoint_out)
+    # prior_idx excludes the whole fold, so the fine-tuned model keeps the checkpoint's split
+    if not split_problem and os.path.abspath(args.out) != checkpoint_dir:
+        shutil.copyfile(os.path.join(checkpoint_dir, "split.json"), os.path.join(args.out, "split.json"))
+    record = {
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'checkpoint': os.path.abspath(args.checkpoint), 'output': os.path.abspath(checkpoint_out),
+        'architecture': args.architecture, 'model_kwargs': args.model_kwargs,
+        'features': os.path.abspath(args.features),
+        'batches': sorted(int(b) for b in np.unique(features.batch[new_idx])),
+        'n_new': int(len(new_idx)), 'n_prior': int(len(prior_idx)), 'val_fold': args.val_fold,
+        'n_early_stopping': int(len(stop_idx)), 'split_verified': split_problem is None,
+        'lr': args.lr, 'replay': args.replay, 'epochs': len(history), 'seconds': seconds,
+        'history': history, 'before': before, 'after': after,
+    }
+    with open(os.path.join(args.out, "finetune_log.jsonl"), 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+    _print_metrics(f"Held-out fold {args.val_fold}, half not used for early stopping",
+                   before['holdout'], after['holdout'])
+    if split_problem:
+        print(f"WARNING: split not verified, the checkpoint may have trained on these rows ({split_problem})")
+    _print_metrics("New stacks (after = seen in fine-tuning)", before['new'], after['new'])
+    print(f"\nFine-tuned in {seconds:.1f} s; saved {checkpoint_out}")
@@ -0,0 +1,214 @@
+"""
+Streaming Normalization Statistics for PSD Features
+---------------------------------------------------
+
+CNN2D.ipynb normalizes the dataset with a per-(window, freq_bin) mean and std of
+log10(PSD + 1e-10), computed by materialising the log array for the whole
+dataset at once. This module computes the same statistics in a single streaming
+pass with bounded memory, using Welford's algorithm with Chan's batch update so
+that chunks - and partial results from parallel workers - can be merged exactly.
+
+Key Components:
+---------------
+- RunningStats: count / mean / M2 accumulator with update(), merge(), and
+  save_partial() / load_partial() for combining worker outputs.
+- psd_stats(): global statistics over one or more PSD pickles, chunk by chunk.
+- fold_stats(): statistics over the training indices of one fold of an
+  in-memory array (used by train_folds.py, which holds X anyway).
+- streaming_fold_stats(): the per-fold statistics of all K folds in one
+  streaming pass: every chunk row goes into the accumulator of its validation
+  fold, and the training statistics of fold k are the exact merge of the other
+  K-1 accumulators.
+- fold_splits(): the seeded StratifiedKFold split used by train_folds.py, so
+  per-fold statistics line up with the fold_outputs/fold_k checkpoints.
+
+Outputs:
+--------
+- mean.npy / std.npy with the same convention as the notebook (population std
+  plus 1e-6), globally in Exported_Paros_Data and per fold in fold_outputs/fold_k.
+
+Memory:
+-------
+The log-PSD arrays are processed in chunks of `--chunk-size` events, for the
+global and the per-fold statistics alike. The pickles themselves are still
+loaded whole by load_pickle_data (a pickle cannot be read partially); the
+bound applies to the float arrays derived from them, which are several times
+larger than the nested dicts once stacked and log-scaled.
+
+Usage:
+------
+    python norm_stats.py                                   # global mean.npy / std.npy
+    python norm_stats.py --folds 5 --fold-dir fold_outputs  # plus per-fold stats
+    python norm_stats.py --shard 0/4 --partial part_0.npz   # one of 4 workers
+    python norm_stats.py --merge part_*.npz                 # combine the workers
+
+Dependencies:
+-------------
+- NumPy, scikit-learn (fold splits only)
+- Custom utilities: psd_pickle_utils (data loading)
+"""
+
+import argparse
+import os
+import numpy as np
+
+from psd_pickle_utils import load_pickle_data, iter_psd_chunks
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def _combine(self, count, mean, m2):
+        if count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = count, mean.copy(), m2.copy()
+            return
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+
+    def update(self, batch):
+        """Add a batch of samples stacked along axis 0."""
+        batch = np.asarray(batch, dtype=np.float64)
+        if len(batch) == 0:
+            return
+        batch_mean = batch.mean(axis=0)
+        batch_m2 = ((batch - batch_mean) ** 2).sum(axis=0)
+        self._combine(len(batch), batch_mean, batch_m2)
+
+    def merge(self, other):
+        self._combine(other.count, other.mean, other.m2)
+        return self
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count)
+
+    def save(self, folder):
+        """Write mean.npy / std.npy in the notebook convention (std + 1e-6)."""
+        if self.count == 0:
+            raise ValueError("No samples accumulated")
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, "mean.npy"), self.mean)
+        np.save(os.path.join(folder, "std.npy"), self.std + 1e-6)
+
+    def save_partial(self, path):
+        np.savez(path, count=self.count, mean=self.mean, m2=self.m2)
+
+    @classmethod
+    def load_partial(cls, path):
+        data = np.load(path)
+        stats = cls()
+        stats._combine(int(data['count']), data['mean'], data['m2'])
+        return stats
+
+
+def log_psd(x):
+    return np.log10(x + 1e-10)  # avoid log(0)
+
+def psd_stats(psd_structs, chunk_size=256, shard=None):
+    """Streaming log-PSD statistics over one or more parsed PSD pickles."""
+    stats = RunningStats()
+    for psd_struct in psd_structs:
+        for chunk in iter_psd_chunks(psd_struct, chunk_size=chunk_size, shard=shard):
+            stats.update(log_psd(chunk))
+    return stats
+
+def fold_stats(X, train_idx, chunk_size=256):
+    """Log-PSD statistics over the training rows of one fold of the raw PSD array."""
+    stats = RunningStats()
+    train_idx = np.sort(train_idx)
+    for start in range(0, len(train_idx), chunk_size):
+        stats.update(log_psd(X[train_idx[start:start + chunk_size]]))
+    return stats
+
+def streaming_fold_stats(psd_structs, y, K=5, seed=42, chunk_size=256):
+    """
+    Training-row statistics of each of the K folds of fold_splits(y, K, seed),
+    where y labels the valid events of psd_structs in order, chunk by chunk.
+    """
+    fold_of = np.empty(len(y), dtype=int)
+    for fold, (_, val_idx) in enumerate(fold_splits(y, K, seed)):
+        fold_of[val_idx] = fold
+
+    val_stats = [RunningStats() for _ in range(K)]
+    row = 0
+    for psd_struct in psd_structs:
+        for chunk in iter_psd_chunks(psd_struct, chunk_size=chunk_size):
+            folds = fold_of[row:row + len(chunk)]
+            row += len(chunk)
+            log_chunk = log_psd(chunk)
+            for fold in np.unique(folds):
+                val_stats[fold].update(log_chunk[folds == fold])
+    if row != len(y):
+        raise ValueError(f"{len(y)} labels for {row} events")
+
+    train_stats = []
+    for fold in range(K):
+        stats = RunningStats()
+        for other in range(K):
+            if other != fold:
+                stats.merge(val_stats[other])
+        train_stats.append(stats)
+    return train_stats
+
+def count_events(psd_struct, chunk_size=256):
+    return sum(len(chunk) for chunk in iter_psd_chunks(psd_struct, chunk_size=chunk_size))
+
+def fold_splits(y, K=5, seed=42):
+    from sklearn.model_selection import StratifiedKFold
+    skf = StratifiedKFold(n_splits=K, shuffle=True, random_state=seed)
+    return list(skf.split(np.zeros(len(y)), y))
+
+
+if __name__ == "__main__":
+    data_dir = os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data")
+    parser = argparse.ArgumentParser(description="Build mean.npy / std.npy normalization statistics.")
+    parser.add_argument("--eq", default=os.path.join(data_dir, "PSD_Windows_Earthquake_100Hz.pkl"))
+    parser.add_argument("--bg", default=os.path.join(data_dir, "PSD_Windows_Background_100Hz.pkl"))
+    parser.add_argument("--out", default=data_dir, help="Folder for the global mean.npy / std.npy")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--shard", help="k/n: process only the k-th of n event shards")
+    parser.add_argument("--partial", help="Write the shard's partial stats here instead of mean/std")
+    parser.add_argument("--merge", nargs="+", help="Partial stats files to merge")
+    parser.add_argument("--folds", type=int, help="Also write per-fold stats for K folds")
+    parser.add_argument("--fold-dir", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs"))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.merge:
+        stats = RunningStats()
+        for path in args.merge:
+            stats.merge(RunningStats.load_partial(path))
+        stats.save(args.out)
+        print(f"Merged {len(args.merge)} partial stats ({stats.count} events) into {args.out}")
+    else:
+        shard = tuple(int(v) for v in args.shard.split("/")) if args.shard else None
+        structs = [load_pickle_data(args.eq), load_pickle_data(args.bg)]
+        stats = psd_stats(structs, chunk_size=args.chunk_size, shard=shard)
+
+        if args.partial:
+            stats.save_partial(args.partial)
+            print(f"Saved partial stats ({stats.count} events) to {args.partial}")
+        else:
+            stats.save(args.out)
+            print(f"Saved mean and std ({stats.count} events) to {args.out}")
+
+        if args.folds:
+            # Labels in load_dataset order (earthquakes first), without stacking the events
+            n_eq, n_bg = (count_events(struct, args.chunk_size) for struct in structs)
+            y = np.concatenate([np.ones(n_eq, dtype=int), np.zeros(n_bg, dtype=int)])
+            fold_train_stats = streaming_fold_stats(structs, y, args.folds, args.seed, args.chunk_size)
+            for fold, stats in enumerate(fold_train_stats):
+                fold_dir = os.path.join(args.fold_dir, f"fold_{fold+1}")
+                stats.save(fold_dir)
+                print(f"Saved fold {fold+1} mean and std to {fold_dir}")
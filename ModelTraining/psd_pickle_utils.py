@@ -12,6 +12,10 @@ Functions:
     (e.g., 11), each with a 'power' field.
     Returns a NumPy array of shape (events, windows, freq_bins).
 
+- iter_psd_chunks(psd_struct, chunk_size=256, num_windows=11, shard=None):
+    Yields the same events as extract_psd_array in bounded-size chunks,
+    optionally restricted to one shard of the events.
+
 - load_pickle_data(path):
     Loads a `.pkl` file and extracts the 'psdResults' field, if present.
     This mimics loading MATLAB `.mat` files with nested PSD results.
@@ -30,6 +34,25 @@ Ethan Gelfand, 08/06/2025
 import numpy as np
 import pickle
 
+def _event_psd_array(event, num_windows=11):
+    # Filter and sort window keys
+    window_keys = [k for k in event.keys() if k.startswith("window_")]
+    window_keys = sorted(window_keys, key=lambda x: int(x.split('_')[1]))[:num_windows]
+
+    event_data = []
+    for wk in window_keys:
+        try:
+            power = np.array(event[wk]["power"])
+            if power.ndim == 2:
+                power = power[0, :]  # Take first channel if 2D
+            event_data.append(power)
+        except (KeyError, TypeError):
+            continue
+
+    if len(event_data) == num_windows:
+        return np.stack(event_data)  # (windows, freq_bins)
+    return None
+
 def extract_psd_array(psd_struct, num_windows=11):
     data = []
 
@@ -37,26 +60,46 @@ def extract_psd_array(psd_struct, num_windows=11):
     event_keys = [k for k in psd_struct.keys() if k.startswith("event_")]
 
     for key in event_keys:
-        event = psd_struct[key]
+        event_array = _event_psd_array(psd_struct[key], num_windows)
+        if event_array is not None:
+            data.append(event_array)
 
-        # Filter and sort window keys
-        window_keys = [k for k in event.keys() if k.startswith("window_")]
-        window_keys = sorted(window_keys, key=lambda x: int(x.split('_')[1]))[:num_windows]
-
-        event_data = []
-        for wk in window_keys:
-            try:
-                power = np.array(event[wk]["power"])
-                if power.ndim == 2:
-                    power = power[0, :]  # Take first channel if 2D
-                event_data.append(power)
-            except (KeyError, TypeError):
-                continue
+    return np.stack(data) if data else np.array([])  # (events, windows, freq_bins)
 
-        if len(event_data) == num_windows:
-            data.append(np.stack(event_data))  # (windows, freq_bins)
+def iter_psd_chunks(psd_struct, chunk_size=256, num_windows=11, shard=None):
+    """
+    Yield the same events as extract_psd_array in chunks of at most chunk_size.
 
-    return np.stack(data) if data else np.array([])  # (events, windows, freq_bins)
+    Parameters:
+        psd_struct (dict): Parsed PSD data (events with windows and power values)
+        chunk_size (int): Maximum number of events per yielded array
+        num_windows (int): Windows kept per event
+        shard (tuple or None): (k, n) keeps only every n-th valid event starting at k,
+            so n workers can split one dataset between them
+
+    Yields:
+        np.ndarray: (events, windows, freq_bins)
+    """
+    chunk = []
+    valid_idx = 0
+    for key in psd_struct.keys():
+        if not key.startswith("event_"):
+            continue
+        event_array = _event_psd_array(psd_struct[key], num_windows)
+        if event_array is None:
+            continue
+        keep = shard is None or valid_idx % shard[1] == shard[0]
+        valid_idx += 1
+        if not keep:
+            continue
+
+        chunk.append(event_array)
+        if len(chunk) == chunk_size:
+            yield np.stack(chunk)
+            chunk = []
+
+    if chunk:
+        yield np.stack(chunk)
 
 def load_pickle_data(path):
     """
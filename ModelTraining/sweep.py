@@ -0,0 +1,492 @@
+"""
+Parallel Hyperparameter and Architecture Sweeps for EarthquakeCNN2d
+-------------------------------------------------------------------
+
+Runs many training configurations (trials) over the same cross-validation folds
+without editing CNN2D.ipynb: learning rate, class bias factor, early stopping
+patience, batch size and the EarthquakeCNN2d architecture (channels, kernel
+sizes, hidden widths, dropout).
+
+The PSD pickles are loaded and normalized once, in the parent process, and
+placed in shared memory; the trial processes map the same pages instead of
+each receiving a pickled copy. Trials are dispatched to a process pool with a
+fixed number of torch threads per process (as in train_folds.py), and each
+trial trains its folds with train_folds.train_fold.
+
+Pruning:
+--------
+After every epoch a trial records its validation loss. From `--warmup` epochs
+on, its best validation loss so far (the quantity EarlyStopping tracks, but
+without the class weights, which depend on bias_factor and would make trials
+incomparable) is compared with the best losses other trials had reached at
+the same fold and epoch; a trial worse than their median (`--prune-quantile`) is stopped and
+marked "pruned". At least `--min-peers` other trials must have reached that
+epoch, so the first trials always run to completion. EarlyStopping still ends
+each fold as in train_folds.py.
+
+Results:
+--------
+Everything is written to an SQLite database (default sweep.db):
+
+- trials: one row per trial with its params (JSON), status (pending, running,
+  complete, pruned, failed), objective (mean over folds of the best unweighted
+  validation loss; lower is better), cross-validation accuracy / precision / recall / f1
+  / roc_auc, epochs, seconds and any error.
+- epochs: train loss, validation loss (class-weighted, as EarlyStopping sees
+  it), unweighted validation loss (val_nll) and validation accuracy per trial,
+  fold and epoch.
+
+Trials are keyed by their params, so rerunning the same sweep skips trials
+that already completed or were pruned and resumes the others. The tables can
+be queried with any SQLite client, e.g.
+
+    SELECT id, objective, f1, json_extract(params, '$.lr') AS lr
+    FROM trials WHERE status = 'complete' ORDER BY objective LIMIT 10;
+
+Search spaces:
+--------------
+A JSON object mapping each parameter to its candidate values (DEFAULT_SPACE
+below is an example). Parameters not in the space keep their train_folds.py
+defaults. `--grid` runs every combination, `--trials N` a seeded random subset
+of N combinations.
+
+Usage:
+------
+    python sweep.py run --trials 24 --workers 4 --threads-per-trial 2
+    python sweep.py run --space space.json --grid --max-folds 2 --epochs 30
+    python sweep.py run --synthetic 1100 --trials 8 --epochs 5   # smoke test
+    python sweep.py top --db sweep.db -n 10
+    python sweep.py sql --db sweep.db "SELECT status, COUNT(*) FROM trials GROUP BY status"
+
+Dependencies:
+-------------
+- PyTorch, torch_optimizer, NumPy, scikit-learn
+- Custom utilities: train_folds, norm_stats, psd_pickle_utils, cnn_model
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODEL_KEYS = ('channels', 'kernel_sizes', 'hidden', 'dropout')
+TRAIN_KEYS = ('lr', 'bias_factor', 'patience', 'min_delta', 'batch_size', 'num_epochs')
+
+DEFAULT_SPACE = {
+    'lr': [1e-4, 3e-4, 1e-3],
+    'bias_factor': [1.0, 3.0, 5.0],
+    'patience': [5, 10],
+    'batch_size': [32, 64],
+    'channels': [[16, 32], [8, 16], [32, 64]],
+    'kernel_sizes': [[[5, 5], [3, 5]], [[3, 3], [3, 3]], [[5, 7], [3, 5]]],
+    'dropout': [0.2, 0.3],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    objective REAL,
+    accuracy REAL,
+    precision REAL,
+    recall REAL,
+    f1 REAL,
+    roc_auc REAL,
+    val_acc_mean REAL,
+    folds INTEGER,
+    epochs INTEGER,
+    seconds REAL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS epochs (
+    trial_id INTEGER NOT NULL,
+    fold INTEGER NOT NULL,
+    epoch INTEGER NOT NULL,
+    train_loss REAL,
+    val_loss REAL,
+    val_nll REAL,
+    val_acc REAL,
+    PRIMARY KEY (trial_id, fold, epoch)
+);
+"""
+
+
+# --- Search space ---
+def space_size(space):
+    return int(np.prod([len(values) for values in space.values()]))
+
+
+def trial_params(space, index):
+    """The index-th combination of the grid (mixed-radix, last key fastest)."""
+    params = {}
+    for name in reversed(list(space)):
+        index, i = divmod(index, len(space[name]))
+        params[name] = space[name][i]
+    return {name: params[name] for name in space}
+
+
+def sample_trials(space, n=None, seed=0):
+    """All combinations (n=None) or n distinct random ones, in a stable order."""
+    total = space_size(space)
+    if n is None or n >= total:
+        indices = range(total)
+    else:
+        indices = np.sort(np.random.default_rng(seed).choice(total, size=n, replace=False))
+    return [trial_params(space, int(i)) for i in indices]
+
+
+def trial_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def trial_config(params, epochs=None):
+    """train_folds config for one trial: quiet, no per-fold artifacts."""
+    config = {'model': {}, 'save_artifacts': False, 'verbose': False}
+    if epochs is not None:
+        config['num_epochs'] = epochs
+    for name, value in params.items():
+        if name in MODEL_KEYS:
+            config['model'][name] = value
+        elif name in TRAIN_KEYS:
+            config[name] = value
+        else:
+            raise ValueError(f"Unknown sweep parameter {name!r} "
+                             f"(model: {', '.join(MODEL_KEYS)}; training: {', '.join(TRAIN_KEYS)})")
+    return config
+
+
+# --- Results database ---
+class SweepDB:
+    def __init__(self, path):
+        # One connection per process; WAL lets the trial processes write while
+        # the others read the pruning statistics
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def add_trials(self, trials):
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO trials (key, params) VALUES (?, ?)",
+                                  [(trial_key(p), json.dumps(p, sort_keys=True)) for p in trials])
+        keys = [trial_key(p) for p in trials]
+        rows = dict(self.conn.execute(
+            f"SELECT key, id FROM trials WHERE key IN ({','.join('?' * len(keys))})", keys).fetchall()) \
+            if keys else {}
+        return [rows[k] for k in keys]
+
+    def todo(self, ids):
+        """Trials among ids that still need to run (new, interrupted or failed)."""
+        done = {row[0] for row in self.conn.execute(
+            "SELECT id FROM trials WHERE status IN ('complete', 'pruned')")}
+        return [i for i in ids if i not in done]
+
+    def params(self, trial_id):
+        return json.loads(self.conn.execute("SELECT params FROM trials WHERE id = ?",
+                                            (trial_id,)).fetchone()[0])
+
+    def start(self, trial_id):
+        with self.conn:
+            # An interrupted run left partial epochs behind: start from scratch
+            self.conn.execute("DELETE FROM epochs WHERE trial_id = ?", (trial_id,))
+            self.conn.execute("UPDATE trials SET status = 'running', started = ?, error = NULL "
+                              "WHERE id = ?", (time.time(), trial_id))
+
+    def report_epoch(self, trial_id, fold, epoch, scores):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO epochs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (trial_id, fold, epoch, scores['train_loss'], scores['val_loss'],
+                               scores['val_nll'], scores['val_acc']))
+
+    def peer_best_losses(self, trial_id, fold, epoch):
+        """Best val_nll up to `epoch` of every other trial that reached it in `fold`."""
+        rows = self.conn.execute(
+            "SELECT MIN(val_nll) FROM epochs WHERE fold = ? AND epoch <= ? AND trial_id != ? "
+            "GROUP BY trial_id HAVING MAX(epoch) = ?", (fold, epoch, trial_id, epoch))
+        return [row[0] for row in rows]
+
+    def finish(self, trial_id, status, **values):
+        values = {**values, 'status': status, 'finished': time.time()}
+        with self.conn:
+            self.conn.execute(f"UPDATE trials SET {', '.join(f'{k} = ?' for k in values)} WHERE id = ?",
+                              (*values.values(), trial_id))
+
+    def top(self, n=10, status="complete"):
+        cursor = self.conn.execute(
+            "SELECT id, status, objective, accuracy, f1, roc_auc, folds, epochs, seconds, params "
+            "FROM trials WHERE status = ? ORDER BY objective LIMIT ?", (status, n))
+        return [dict(zip([c[0] for c in cursor.description], row)) for row in cursor]
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM trials GROUP BY status"))
+
+    def close(self):
+        self.conn.close()
+
+
+class MedianPruner:
+    """Epoch callback for train_fold: records the epoch, then decides whether to prune."""
+
+    def __init__(self, db, trial_id, fold, warmup=5, min_peers=3, quantile=0.5, min_delta=0.0):
+        self.db = db
+        self.trial_id = trial_id
+        self.fold = fold
+        self.warmup = warmup
+        self.min_peers = min_peers
+        self.quantile = quantile
+        self.min_delta = min_delta
+        self.best = None
+
+    def __call__(self, epoch, scores):
+        self.db.report_epoch(self.trial_id, self.fold, epoch, scores)
+        loss = scores['val_nll']
+        self.best = loss if self.best is None else min(self.best, loss)
+        if epoch + 1 < self.warmup:
+            return False
+        peers = self.db.peer_best_losses(self.trial_id, self.fold, epoch)
+        if len(peers) < self.min_peers:
+            return False
+        return self.best > np.quantile(peers, self.quantile) + self.min_delta
+
+
+# --- Shared memory ---
+def share_arrays(arrays):
+    """Copy arrays into new shared memory blocks; returns (blocks, specs for attach_arrays)."""
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        blocks.append(shm)
+        specs[name] = (shm.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """
+    Read-only views of the parent's shared arrays (and the blocks to keep alive).
+
+    The workers are spawned by the parent and share its resource tracker, so
+    attaching here does not make a worker's exit unlink the blocks; the parent
+    unlinks them when the sweep ends.
+    """
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        view.flags.writeable = False
+        blocks.append(shm)
+        arrays[name] = view
+    return blocks, arrays
+
+
+# --- Trial processes ---
+_worker = {}
+
+def _init_worker(specs, num_threads, db_path, pruning):
+    import torch
+    torch.set_num_threads(num_threads)
+    blocks, arrays = attach_arrays(specs)
+    _worker.update(arrays, blocks=blocks, db_path=db_path, pruning=pruning)
+
+
+def run_trial(trial_id, splits, epochs, seed):
+    from train_folds import train_fold, aggregate_metrics
+
+    db = SweepDB(_worker['db_path'])
+    start = time.perf_counter()
+    db.start(trial_id)
+    try:
+        params = db.params(trial_id)
+        config = trial_config(params, epochs)
+        X, y = _worker['X'], _worker['y']
+        results = []
+        for fold, (train_idx, val_idx) in enumerate(splits):
+            pruner = MedianPruner(db, trial_id, fold, min_delta=config.get('min_delta', 0.0),
+                                  **_worker['pruning'])
+            result = train_fold(fold, train_idx, val_idx, X, y, None, config, seed=seed,
+                                normalized=True, epoch_callback=pruner)
+            results.append(result)
+            if result['pruned']:
+                summary = {'folds': len(results), 'epochs': sum(r['epochs'] for r in results),
+                           'seconds': time.perf_counter() - start}
+                db.finish(trial_id, "pruned", **summary)
+                return trial_id, "pruned", summary
+
+        metrics = aggregate_metrics(results)
+        summary = {
+            'objective': float(np.mean([min(r['val_nlls']) for r in results])),
+            **{k: float(metrics[k]) for k in ('accuracy', 'precision', 'recall', 'f1', 'roc_auc',
+                                              'val_acc_mean')},
+            'folds': len(results),
+            'epochs': sum(r['epochs'] for r in results),
+            'seconds': time.perf_counter() - start,
+        }
+        db.finish(trial_id, "complete", **summary)
+        return trial_id, "complete", summary
+    except Exception as e:
+        db.finish(trial_id, "failed", error=repr(e), seconds=time.perf_counter() - start)
+        return trial_id, "failed", {'error': repr(e)}
+    finally:
+        db.close()
+
+
+def run_sweep(X_norm, y, trials, db_path="sweep.db", K=5, max_folds=None, seed=42, epochs=None,
+              workers=1, threads_per_trial=None, pruning=None):
+    """
+    Run every trial not yet complete/pruned in db_path on normalized features
+    X_norm (events, windows, freq_bins) and labels y; returns the status counts.
+    """
+    from norm_stats import fold_splits
+
+    for params in trials:
+        trial_config(params)  # unknown parameters fail here, not in a worker
+    pruning = {'warmup': 5, 'min_peers': 3, 'quantile': 0.5, **(pruning or {})}
+    splits = fold_splits(y, K, seed)[:max_folds]
+
+    db = SweepDB(db_path)
+    ids = db.todo(db.add_trials(trials))
+    print(f"{len(trials)} trials, {len(trials) - len(ids)} already done, {len(ids)} to run "
+          f"on {len(splits)} folds")
+    threads_per_trial = threads_per_trial or max(1, (os.cpu_count() or 1) // workers)
+
+    def report(trial_id, status, summary):
+        detail = ""
+        if status == "complete":
+            detail = f"objective {summary['objective']:.4f}, f1 {summary['f1']:.4f}, "
+        elif status == "failed":
+            detail = f"{summary['error']}, "
+        print(f"trial {trial_id:>4} {status:<8} {detail}{summary.get('folds', 0)} folds, "
+              f"{summary.get('epochs', 0)} epochs, {summary.get('seconds', 0):.1f} s  "
+              f"{json.dumps(db.params(trial_id), separators=(',', ':'))}", flush=True)
+
+    if workers == 1:
+        import torch
+        torch.set_num_threads(threads_per_trial)
+        _worker.update(X=X_norm, y=y, db_path=db_path, pruning=pruning)
+        for trial_id in ids:
+            report(*run_trial(trial_id, splits, epochs, seed))
+    elif ids:
+        blocks, specs = share_arrays({'X': np.asarray(X_norm, dtype=np.float32), 'y': y})
+        try:
+            print(f"Running on {workers} processes x {threads_per_trial} threads "
+                  f"({sum(b.size for b in blocks) / 1e6:.1f} MB shared)")
+            # spawn avoids forking a process that already holds torch thread pools
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                     initializer=_init_worker,
+                                     initargs=(specs, threads_per_trial, db_path, pruning)) as pool:
+                futures = [pool.submit(run_trial, trial_id, splits, epochs, seed) for trial_id in ids]
+                for future in as_completed(futures):
+                    report(*future.result())
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    counts = db.counts()
+    db.close()
+    return counts
+
+
+def load_features(eq, bg, synthetic=None, seed=0):
+    """Normalized float32 features and labels, as train_folds.py builds them."""
+    if synthetic:
+        # Two classes with a small shift in the low frequency bins
+        rng = np.random.default_rng(seed)
+        y = (rng.random(synthetic) < 0.1).astype(int)
+        X = rng.standard_normal((synthetic, 11, 52)).astype(np.float32)
+        X[y == 1, :, :10] += 0.5
+        return X, y
+
+    from train_folds import load_dataset
+    from norm_stats import RunningStats, log_psd
+    X, y = load_dataset(eq, bg)
+    stats = RunningStats()
+    stats.update(log_psd(X))
+    X_norm = ((log_psd(X) - stats.mean) / (stats.std + 1e-6)).astype(np.float32)
+    return X_norm, y
+
+
+def print_top(rows):
+    print(f"{'id':>5} {'objective':>10} {'acc':>7} {'f1':>7} {'auc':>7} {'folds':>5} {'epochs':>6} "
+          f"{'s':>7}  params")
+    for r in rows:
+        print(f"{r['id']:>5} {r['objective']:>10.4f} {r['accuracy']:>7.4f} {r['f1']:>7.4f} "
+              f"{r['roc_auc']:>7.4f} {r['folds']:>5} {r['epochs']:>6} {r['seconds']:>7.1f}  {r['params']}")
+
+
+if __name__ == "__main__":
+    data_dir = os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data")
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter / architecture sweeps.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Run (or resume) a sweep")
+    p_run.add_argument("--space", help="JSON search space (default: DEFAULT_SPACE)")
+    p_run.add_argument("--grid", action="store_true", help="Every combination of the space")
+    p_run.add_argument("--trials", type=int, default=20, help="Random combinations to run")
+    p_run.add_argument("--db", default="sweep.db")
+    p_run.add_argument("--eq", default=os.path.join(data_dir, "PSD_Windows_Earthquake_100Hz.pkl"))
+    p_run.add_argument("--bg", nargs="+", default=[os.path.join(data_dir, "PSD_Windows_Background_100Hz.pkl")])
+    p_run.add_argument("--synthetic", type=int, help="Use N synthetic events instead of the pickles")
+    p_run.add_argument("--folds", type=int, default=5)
+    p_run.add_argument("--max-folds", type=int, help="Train only the first N folds per trial")
+    p_run.add_argument("--epochs", type=int, help="Epoch budget per fold (default: train_folds.py's)")
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    p_run.add_argument("--threads-per-trial", type=int, help="torch threads per trial process")
+    p_run.add_argument("--warmup", type=int, default=5, help="Epochs before a trial can be pruned")
+    p_run.add_argument("--min-peers", type=int, default=3)
+    p_run.add_argument("--prune-quantile", type=float, default=0.5)
+    p_run.add_argument("--no-prune", action="store_true")
+
+    p_top = sub.add_parser("top", help="Best completed trials")
+    p_top.add_argument("--db", default="sweep.db")
+    p_top.add_argument("-n", type=int, default=10)
+
+    p_sql = sub.add_parser("sql", help="Run an SQL query against the results")
+    p_sql.add_argument("--db", default="sweep.db")
+    p_sql.add_argument("query")
+    args = parser.parse_args()
+
+    if args.command in ("top", "sql") and not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+
+    if args.command == "top":
+        db = SweepDB(args.db)
+        print(f"status: {db.counts()}")
+        print_top(db.top(args.n))
+    elif args.command == "sql":
+        cursor = sqlite3.connect(args.db).execute(args.query)
+        if cursor.description:
+            print("\t".join(c[0] for c in cursor.description))
+        for row in cursor:
+            print("\t".join(str(v) for v in row))
+    else:
+        space = DEFAULT_SPACE
+        if args.space:
+            with open(args.space) as f:
+                space = json.load(f)
+        trials = sample_trials(space, None if args.grid else args.trials, seed=args.seed)
+
+        X_norm, y = load_features(args.eq, args.bg, args.synthetic, seed=args.seed)
+        print(f"Features {X_norm.shape} ({X_norm.nbytes / 1e6:.1f} MB), {int(y.sum())} earthquakes")
+        pruning = {'warmup': args.warmup, 'min_peers': args.min_peers, 'quantile': args.prune_quantile}
+        if args.no_prune:
+            pruning['warmup'] = 10**9
+        counts = run_sweep(X_norm, y, trials, db_path=args.db, K=args.folds, max_folds=args.max_folds,
+                           seed=args.seed, epochs=args.epochs, workers=args.workers,
+                           threads_per_trial=args.threads_per_trial, pruning=pruning)
+        print(f"\nstatus: {counts}")
+        print_top(SweepDB(args.db).top(10))
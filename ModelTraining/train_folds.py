@@ -0,0 +1,478 @@
+"""
+Parallel Stratified K-Fold Training for EarthquakeCNN2d
+-------------------------------------------------------
+
+Script version of the CNN2D.ipynb training loop that runs the K cross-validation
+folds concurrently in separate CPU processes instead of one after another.
+
+Each fold is an independent job: it gets its own process, a fixed number of
+torch intra-op threads (`torch.set_num_threads`), and slices its batches in the
+main thread of that process with TensorBatchIterator (no nested DataLoader
+worker pools). With K folds on a machine with enough cores, full cross-validation
+takes roughly the wall time of a single fold.
+
+Main Features:
+--------------
+- Same data loading, log10 normalization, class weighting (bias factor),
+  RAdam optimizer, early stopping and epoch budget as CNN2D.ipynb.
+- Fold splits come from norm_stats.fold_splits (seeded StratifiedKFold), so they
+  are reproducible and line up with per-fold normalization statistics.
+- Optional per-fold normalization (`--per-fold-stats`): mean/std from the
+  training rows of each fold only, saved next to its checkpoint.
+- Writes the same artifacts as the notebook: fold_outputs/fold_k/CNNmodel.pth
+  and data.npz, plus fold_outputs/metrics.json with the aggregated metrics.
+- fold_outputs/fold_k/split.json records which rows that checkpoint never
+  trained on: K, seed, fold, a fingerprint of the dataset (X and y in load
+  order) and a hash of the validation indices. distill.py and finetune.py call
+  verify_split() before claiming a fold is unseen; checkpoints without it (e.g.
+  from CNN2D.ipynb, whose shuffle is unseeded) cannot be verified.
+- Architecture and training settings come from one config dict (DEFAULT_CONFIG
+  plus overrides), which is what sweep.py varies per trial.
+- Optional per-stage timing (`--profile`, see profiling.py) written to
+  fold_outputs/fold_k/profile.json, and a torch.profiler trace (`--torch-trace`).
+
+Usage:
+------
+    python train_folds.py --workers 5 --threads-per-worker 4
+    python train_folds.py --workers 1          # sequential, same results
+
+Dependencies:
+-------------
+- PyTorch and torch_optimizer (RAdam optimizer)
+- NumPy, scikit-learn
+- Custom utilities: psd_pickle_utils, norm_stats, tensor_batches, profiling, cnn_model
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import multiprocessing as mp
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from psd_pickle_utils import load_pickle_data, extract_psd_array
+from norm_stats import RunningStats, fold_stats, fold_splits, log_psd
+from profiling import PROFILER, stage, torch_trace
+
+# torch, torch_optimizer and scikit-learn are imported in the functions that use
+# them, so `--help` and the split helpers (verify_split, load_dataset) stay light
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+DEFAULT_CONFIG = {
+    'batch_size': 32,
+    'lr': 1e-4,
+    'bias_factor': 3.0,
+    'patience': 5,
+    'min_delta': 1e-4,
+    'num_epochs': 70,
+    'loader': 'tensor',  # 'tensor' (TensorBatchIterator) or 'dataloader'
+    'torch_trace': False,  # export a torch.profiler trace of the first epoch per fold
+    'model': {},  # EarthquakeCNN2d keyword arguments (channels, kernel_sizes, hidden, dropout)
+    'save_artifacts': True,  # CNNmodel.pth, data.npz (and stats / trace / profile) per fold
+    'verbose': True,  # epoch lines and the classification report per fold
+}
+
+
+# --- PyTorch Dataset (map-style: DataLoader only needs __len__ and __getitem__) ---
+class PSD_Dataset:
+    def __init__(self, X, y):
+        import torch
+        # X shape: (events, windows, freq_bins)
+        # Add channel dim for CNN2d: (events, 1, windows, freq_bins)
+        self.X = torch.tensor(X, dtype=torch.float32).unsqueeze(1)
+        self.y = torch.tensor(y, dtype=torch.long)
+
+    def __len__(self):
+        return len(self.X)
+
+    def __getitem__(self, idx):
+        return self.X[idx], self.y[idx]
+
+
+# --- Early stopping ---
+class EarlyStopping:
+    def __init__(self, patience=5, min_delta=0.0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.counter = 0
+        self.best_loss = None
+        self.early_stop = False
+
+    def __call__(self, val_loss):
+        if self.best_loss is None:
+            self.best_loss = val_loss
+            return
+        if val_loss < self.best_loss - self.min_delta:
+            self.best_loss = val_loss
+            self.counter = 0
+        else:
+            self.counter += 1
+            if self.counter >= self.patience:
+                self.early_stop = True
+
+
+def load_dataset(patheq, pathbg):
+    """
+    Raw PSD array (events, windows, freq_bins) and labels, earthquakes first.
+
+    pathbg may be a list of background pickles (e.g. random background hours plus
+    mined hard negatives); they are concatenated in order.
+    """
+    eq_array = extract_psd_array(load_pickle_data(patheq))
+    bg_paths = [pathbg] if isinstance(pathbg, str) else pathbg
+    bg_array = np.concatenate([extract_psd_array(load_pickle_data(p)) for p in bg_paths], axis=0)
+    print("EQ array shape:", eq_array.shape)
+    print("BG array shape:", bg_array.shape)
+
+    X = np.concatenate([eq_array, bg_array], axis=0)
+    y = np.concatenate([np.ones(len(eq_array), dtype=int), np.zeros(len(bg_array), dtype=int)])
+    return X, y
+
+
+def train_fold(fold, train_idx, val_idx, X, y, fold_dir, config, mean=None, std=None, seed=42,
+               normalized=False, epoch_callback=None):
+    """
+    Train one fold on raw PSDs X and write its artifacts to fold_dir.
+
+    If mean/std are None the statistics are computed from this fold's training rows
+    (and saved to fold_dir); with normalized=True, X already holds normalized features.
+    With config['save_artifacts'] False nothing is written and fold_dir may be None.
+    epoch_callback(epoch, scores) is called after every epoch with train_loss,
+    val_loss, val_nll (validation cross entropy without class weights) and
+    val_acc; returning True stops the fold as pruned. Returns per-fold accuracies
+    and validation outputs.
+    """
+    import torch
+    from torch import nn
+    from torch.utils.data import DataLoader
+    import torch_optimizer as optim
+    from sklearn.utils.class_weight import compute_class_weight
+    from sklearn.metrics import classification_report
+    from tensor_batches import TensorBatchIterator
+    from cnn_model import EarthquakeCNN2d
+
+    config = {**DEFAULT_CONFIG, **config}
+    torch.manual_seed(seed + fold)
+    if config['save_artifacts']:
+        os.makedirs(fold_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    if normalized:
+        X_norm = X
+    else:
+        if mean is None or std is None:
+            stats = fold_stats(X, train_idx)
+            if config['save_artifacts']:
+                stats.save(fold_dir)
+            mean, std = stats.mean, stats.std + 1e-6
+        X_norm = (log_psd(X) - mean) / std
+    X_train, X_val = X_norm[train_idx], X_norm[val_idx]
+    y_train, y_val = y[train_idx], y[val_idx]
+
+    # Compute class weights dynamically
+    class_weights = compute_class_weight('balanced', classes=np.unique(y_train), y=y_train)
+    class_weights[1] *= config['bias_factor']
+
+    if config['loader'] == 'dataloader':
+        train_loader = DataLoader(PSD_Dataset(X_train, y_train), batch_size=config['batch_size'], shuffle=True)
+        val_loader = DataLoader(PSD_Dataset(X_val, y_val), batch_size=config['batch_size'], shuffle=False)
+    else:
+        train_loader = TensorBatchIterator(X_train, y_train, batch_size=config['batch_size'],
+                                           shuffle=True, seed=seed + fold)
+        val_loader = TensorBatchIterator(X_val, y_val, batch_size=config['batch_size'])
+
+    device = torch.device("cpu")
+    model = EarthquakeCNN2d(input_shape=X.shape[1:], **config['model']).to(device)
+
+    weights = torch.tensor(class_weights, dtype=torch.float32).to(device)
+    criterion = nn.CrossEntropyLoss(weight=weights)
+    optimizer = optim.RAdam(model.parameters(), lr=config['lr'])
+
+    early_stopping = EarlyStopping(patience=config['patience'], min_delta=config['min_delta'])
+    val_nlls = []
+
+    num_epochs = config['num_epochs']
+    for epoch in range(num_epochs):
+        model.train()
+        train_loss = 0
+        correct = 0
+        total = 0
+
+        trace = torch_trace(os.path.join(fold_dir, "trace.json")) \
+            if config['torch_trace'] and config['save_artifacts'] and epoch == 0 else nullcontext()
+        with trace, stage("train_epoch"):
+            for data, targets in train_loader:
+                data = data.to(device)
+                targets = targets.to(device)
+                optimizer.zero_grad()
+                with stage("model_forward"):
+                    outputs = model(data)
+                    loss = criterion(outputs, targets)
+                with stage("backward_step"):
+                    loss.backward()
+                    optimizer.step()
+
+                train_loss += loss.item()
+                _, predicted = torch.max(outputs, 1)
+                total += targets.size(0)
+                correct += (predicted == targets).sum().item()
+
+        train_loss /= len(train_loader)
+        train_acc = correct / total
+
+        model.eval()
+        val_loss = 0
+        val_nll = 0
+        val_correct = 0
+        val_total = 0
+
+        with torch.no_grad(), stage("validation"):
+            for data, targets in val_loader:
+                data = data.to(device)
+                targets = targets.to(device)
+                outputs = model(data)
+                loss = criterion(outputs, targets)
+                val_loss += loss.item()
+                val_nll += nn.functional.cross_entropy(outputs, targets, reduction='sum').item()
+                _, predicted = torch.max(outputs, 1)
+                val_total += targets.size(0)
+                val_correct += (predicted == targets).sum().item()
+
+        val_loss /= len(val_loader)
+        val_acc = val_correct / val_total
+        val_nll /= val_total
+        val_nlls.append(val_nll)
+
+        if config['verbose'] and ((epoch + 1) % 10 == 0 or epoch == 0):
+            print(f"Fold {fold+1}, Epoch [{epoch+1}/{num_epochs}] "
+                  f"Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.4f} "
+                  f"Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.4f}", flush=True)
+
+        scores = {'train_loss': train_loss, 'val_loss': val_loss, 'val_nll': val_nll, 'val_acc': val_acc}
+        if epoch_callback is not None and epoch_callback(epoch, scores):
+            return {'fold': fold + 1, 'epochs': epoch + 1, 'seconds': time.perf_counter() - start,
+                    'pruned': True, 'val_nlls': val_nlls}
+
+        early_stopping(val_loss)
+        if early_stopping.early_stop:
+            if config['verbose']:
+                print(f"Fold {fold+1}: early stopping triggered.", flush=True)
+            break
+
+    model.eval()
+    val_preds_fold = []
+    val_labels_fold = []
+    val_probs_fold = []
+
+    with torch.no_grad():
+        for data, targets in val_loader:
+            outputs = model(data.to(device))  # logits
+            probs = torch.softmax(outputs, dim=1)[:, 1]  # earthquake class probability
+            _, predicted = torch.max(outputs, 1)
+            val_preds_fold.extend(predicted.cpu().numpy().tolist())
+            val_labels_fold.extend(targets.numpy().tolist())
+            val_probs_fold.extend(probs.cpu().numpy().tolist())
+
+    if config['save_artifacts']:
+        np.savez(os.path.join(fold_dir, "data.npz"),
+                 X_train=X_train, y_train=y_train,
+                 X_val=X_val, y_val=y_val)
+
+        torch.save(model.state_dict(), os.path.join(fold_dir, "CNNmodel.pth"))
+
+    if PROFILER.enabled:
+        if config['save_artifacts']:
+            PROFILER.write_report(os.path.join(fold_dir, "profile.json"))
+        PROFILER.reset()
+
+    if config['verbose']:
+        print(f"\nClassification report for fold {fold+1}:")
+        print(classification_report(val_labels_fold, val_preds_fold, digits=4), flush=True)
+
+    return {
+        'fold': fold + 1,
+        'epochs': epoch + 1,
+        'seconds': time.perf_counter() - start,
+        'train_acc': train_acc,
+        'val_acc': val_acc,
+        'pruned': False,
+        'val_nlls': val_nlls,
+        'val_labels': val_labels_fold,
+        'val_preds': val_preds_fold,
+        'val_probs': val_probs_fold,
+    }
+
+
+def dataset_fingerprint(X, y, chunk_size=4096):
+    """SHA-256 of the rows (as float64, in order) and labels; independent of the stored dtype."""
+    h = hashlib.sha256()
+    for i in range(0, len(X), chunk_size):
+        h.update(np.ascontiguousarray(X[i:i + chunk_size], dtype=np.float64).tobytes())
+    h.update(np.asarray(y, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def split_record(fingerprint, K, seed, fold, val_idx):
+    """Contents of split.json for fold `fold` (1-based) of fold_splits(y, K, seed)."""
+    return {'folds': K, 'seed': seed, 'fold': fold, 'dataset_sha256': fingerprint,
+            'val_sha256': hashlib.sha256(np.asarray(val_idx, dtype=np.int64).tobytes()).hexdigest()}
+
+
+def verify_split(checkpoint_dir, X, y, K, seed, fold):
+    """
+    None if the checkpoint in checkpoint_dir was trained by train_folds.py on
+    this dataset with fold `fold` of fold_splits(y, K, seed) held out;
+    otherwise the reason it cannot be verified.
+    """
+    path = os.path.join(checkpoint_dir, "split.json")
+    if not os.path.exists(path):
+        return f"{path} not found: the checkpoint was not written by train_folds.py"
+    with open(path) as f:
+        saved = json.load(f)
+    expected = split_record(dataset_fingerprint(X, y), K, seed, fold, fold_splits(y, K, seed)[fold - 1][1])
+    differ = [k for k in expected if saved.get(k) != expected[k]]
+    return f"{path} does not match ({', '.join(differ)})" if differ else None
+
+
+# --- Worker process state ---
+_worker_data = {}
+
+def _init_worker(X, y, num_threads):
+    import torch
+    torch.set_num_threads(num_threads)
+    _worker_data['X'] = X
+    _worker_data['y'] = y
+
+def _run_fold(fold, train_idx, val_idx, fold_dir, config, mean, std, seed):
+    return train_fold(fold, train_idx, val_idx, _worker_data['X'], _worker_data['y'],
+                      fold_dir, config, mean=mean, std=std, seed=seed)
+
+
+def aggregate_metrics(fold_results):
+    from sklearn.metrics import (
+        accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, confusion_matrix
+    )
+
+    labels = np.concatenate([r['val_labels'] for r in fold_results])
+    preds = np.concatenate([r['val_preds'] for r in fold_results])
+    probs = np.concatenate([r['val_probs'] for r in fold_results])
+    train_accs = [r['train_acc'] for r in fold_results]
+    val_accs = [r['val_acc'] for r in fold_results]
+
+    return {
+        'accuracy': accuracy_score(labels, preds),
+        'precision': precision_score(labels, preds),
+        'recall': recall_score(labels, preds),
+        'f1': f1_score(labels, preds),
+        'roc_auc': roc_auc_score(labels, probs),
+        'confusion_matrix': confusion_matrix(labels, preds).tolist(),
+        'train_acc_mean': float(np.mean(train_accs)),
+        'train_acc_std': float(np.std(train_accs)),
+        'val_acc_mean': float(np.mean(val_accs)),
+        'val_acc_std': float(np.std(val_accs)),
+        'folds': [{k: r[k] for k in ('fold', 'epochs', 'seconds', 'train_acc', 'val_acc')}
+                  for r in fold_results],
+    }
+
+
+def run_folds(X, y, K=5, seed=42, workers=None, threads_per_worker=None,
+              out_dir="fold_outputs", config=None, mean=None, std=None):
+    """
+    Train all K folds, in parallel when workers > 1, and return aggregated metrics.
+
+    mean/std are the global normalization statistics; pass None for per-fold stats.
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    workers = workers or K
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    splits = fold_splits(y, K, seed)
+    jobs = [(fold, train_idx, val_idx, os.path.join(out_dir, f"fold_{fold+1}"), config, mean, std, seed)
+            for fold, (train_idx, val_idx) in enumerate(splits)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(X, y, threads_per_worker)
+        fold_results = [_run_fold(*job) for job in jobs]
+    else:
+        print(f"Training {K} folds on {workers} processes x {threads_per_worker} threads")
+        # spawn avoids forking a process that already holds torch thread pools
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(X, y, threads_per_worker)) as pool:
+            futures = [pool.submit(_run_fold, *job) for job in jobs]
+            fold_results = [f.result() for f in futures]
+
+    metrics = aggregate_metrics(fold_results)
+    metrics['wall_seconds'] = time.perf_counter() - start
+
+    if config['save_artifacts']:
+        fingerprint = dataset_fingerprint(X, y)
+        for fold, (_, val_idx) in enumerate(splits):
+            with open(os.path.join(out_dir, f"fold_{fold+1}", "split.json"), 'w') as f:
+                json.dump(split_record(fingerprint, K, seed, fold + 1, val_idx), f, indent=2)
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "metrics.json"), 'w') as f:
+        json.dump(metrics, f, indent=2)
+    return metrics
+
+
+if __name__ == "__main__":
+    data_dir = os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data")
+    parser = argparse.ArgumentParser(description="Train EarthquakeCNN2d folds in parallel processes.")
+    parser.add_argument("--eq", default=os.path.join(data_dir, "PSD_Windows_Earthquake_100Hz.pkl"))
+    parser.add_argument("--bg", nargs="+", default=[os.path.join(data_dir, "PSD_Windows_Background_100Hz.pkl")],
+                        help="Background PSD pickles (e.g. plus PSD_Windows_HardNegatives_100Hz.pkl)")
+    parser.add_argument("--stats-dir", default=data_dir, help="Where the global mean.npy / std.npy go")
+    parser.add_argument("--out-dir", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs"))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, help="Parallel fold processes (default: one per fold)")
+    parser.add_argument("--threads-per-worker", type=int, help="torch threads per process")
+    parser.add_argument("--epochs", type=int, default=DEFAULT_CONFIG['num_epochs'])
+    parser.add_argument("--loader", choices=["tensor", "dataloader"], default=DEFAULT_CONFIG['loader'])
+    parser.add_argument("--profile", action="store_true",
+                        help="Write per-stage timing to fold_outputs/fold_k/profile.json")
+    parser.add_argument("--torch-trace", action="store_true",
+                        help="Export a torch.profiler trace of each fold's first epoch")
+    parser.add_argument("--per-fold-stats", action="store_true",
+                        help="Normalize each fold with its own training statistics")
+    args = parser.parse_args()
+
+    if args.profile:
+        # Spawned fold workers inherit the environment, not the parent's profiler
+        os.environ["PAROS_PROFILE"] = "1"
+        PROFILER.enable()
+
+    X, y = load_dataset(args.eq, args.bg)
+
+    mean = std = None
+    if not args.per_fold_stats:
+        stats = RunningStats()
+        stats.update(log_psd(X))
+        stats.save(args.stats_dir)
+        mean, std = stats.mean, stats.std + 1e-6
+        print(f"Saved mean and std to {args.stats_dir}")
+
+    metrics = run_folds(X, y, K=args.folds, seed=args.seed, workers=args.workers,
+                        threads_per_worker=args.threads_per_worker, out_dir=args.out_dir,
+                        config={'num_epochs': args.epochs, 'loader': args.loader,
+                                'torch_trace': args.torch_trace}, mean=mean, std=std)
+
+    print("\n===== Final Cross-Validation Metrics =====")
+    print(f"Accuracy:  {metrics['accuracy']:.4f}")
+    print(f"Precision: {metrics['precision']:.4f}")
+    print(f"Recall:    {metrics['recall']:.4f}")
+    print(f"F1 Score:  {metrics['f1']:.4f}")
+    print(f"ROC AUC:   {metrics['roc_auc']:.4f}")
+    print("Confusion Matrix:")
+    print(np.array(metrics['confusion_matrix']))
+
+    print(f"\nCross-validation results over {args.folds} folds ({metrics['wall_seconds']:.1f} s wall):")
+    print(f"Average Train Accuracy: {metrics['train_acc_mean']:.4f} +/- {metrics['train_acc_std']:.4f}")
+    print(f"Average Validation Accuracy: {metrics['val_acc_mean']:.4f} +/- {metrics['val_acc_std']:.4f}")
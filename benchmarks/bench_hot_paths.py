@@ -0,0 +1,228 @@
+"""
+Benchmark Suite for the Feature Extraction and Inference Hot Paths
+------------------------------------------------------------------
+
+Times the functions every prediction goes through on synthetic 20 Hz Paros
+waveforms, fails when a benchmark regresses against earlier recorded runs on the
+same host, and on request (`--record`) adds the run to a machine-readable
+history file.
+
+Benchmarks:
+-----------
+- safe_resample:       one 60 s segment, 20 Hz -> 100 Hz
+- preprocess:          DC block + 0.1 Hz high-pass on 6000 samples
+- welch_psd:           one 10 s window at 100 Hz
+- feature_60s:         full 60 s -> (11, 52) normalized log-PSD (psd_features_from_samples)
+- extract_psd_array:   500-event PSD pickle structure -> (500, 11, 52)
+- cnn_forward_bN:      EarthquakeCNN2d eval forward for several batch sizes N
+
+Regression check:
+-----------------
+The baseline for a benchmark is the median of its last `--window` recorded
+results from the same host; the run fails (exit code 1) if any median exceeds
+baseline * (1 + tolerance). A plain run only checks. With `--record` a run
+without regressions is appended as one JSON line to the history file (default
+benchmarks/history.jsonl, git-ignored: timings are per host) with the host, git
+commit, library versions and the median / min seconds per call of every
+benchmark. Regressed runs are never recorded, so the baseline cannot drift
+towards a regression; to accept an intended slowdown, record it with a larger
+`--tolerance`.
+
+Usage:
+------
+    python benchmarks/bench_hot_paths.py --record      # on a known-good commit: add to the baseline
+    python benchmarks/bench_hot_paths.py               # check only, history unchanged
+    python benchmarks/bench_hot_paths.py --tolerance 0.15 --filter cnn_forward
+
+Dependencies:
+-------------
+- NumPy, SciPy, PyTorch
+- Eval (Preprocessing_fun, DataQueryUtils, cnn_model) and ModelTraining (psd_pickle_utils)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "ModelTraining"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "Eval"))
+# torch and the code under test are imported in build_benchmarks / after argument parsing
+
+DEFAULT_HISTORY = os.path.join(REPO_ROOT, "benchmarks", "history.jsonl")
+
+
+def synthetic_waveform(seconds=60, fs=20, seed=0):
+    """Noise at roughly the Paros background level plus a short low-frequency burst."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fs)) / fs
+    x = 3e-4 * rng.standard_normal(len(t))
+    x += 2e-3 * np.exp(-((t - seconds / 2) / 3) ** 2) * np.sin(2 * np.pi * 1.5 * t)
+    return x
+
+def synthetic_psd_struct(n_events=500, num_windows=11, n_bins=52, seed=0):
+    rng = np.random.default_rng(seed)
+    freqs = np.linspace(0, 10, n_bins)
+    return {
+        f"event_{i+1:03d}": {
+            f"window_{w+1:03d}": {'power': rng.random(n_bins) * 1e-8, 'frequency': freqs}
+            for w in range(num_windows)
+        }
+        for i in range(n_events)
+    }
+
+
+def time_call(fn, min_time=0.2, repeats=5):
+    """Median and min seconds per call over `repeats` timed batches of calls."""
+    fn()  # warm-up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats or number >= 1 << 20:
+            break
+        number *= 2
+
+    per_call = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - start) / number)
+    return {'median_s': float(np.median(per_call)), 'min_s': float(np.min(per_call)), 'number': number}
+
+
+def build_benchmarks(batch_sizes=(1, 32, 256)):
+    import torch
+    from Preprocessing_fun import preprocess, welch_psd, safe_resample
+    from DataQueryUtils import psd_features_from_samples
+    from psd_pickle_utils import extract_psd_array
+    from cnn_model import EarthquakeCNN2d
+
+    raw = synthetic_waveform()
+    x100 = safe_resample(raw, 20, 100)
+    segment = preprocess(x100, 100)[:1000]
+    mean = np.full((11, 52), -8.0)
+    std = np.ones((11, 52))
+    psd_struct = synthetic_psd_struct()
+
+    def feature_60s():
+        # psd_features_from_samples reports short segments on stdout; keep the timing quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            psd_features_from_samples(raw, mean=mean, std=std)
+
+    benchmarks = {
+        'safe_resample': lambda: safe_resample(raw, 20, 100),
+        'preprocess': lambda: preprocess(x100, 100),
+        'welch_psd': lambda: welch_psd(segment, 100),
+        'feature_60s': feature_60s,
+        'extract_psd_array': lambda: extract_psd_array(psd_struct),
+    }
+
+    model = EarthquakeCNN2d(input_shape=(11, 52))
+    model.eval()
+    for bs in batch_sizes:
+        batch = torch.randn(bs, 1, 11, 52)
+
+        def forward(batch=batch):
+            with torch.no_grad():
+                model(batch)
+        benchmarks[f'cnn_forward_b{bs}'] = forward
+
+    return benchmarks
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def check_regressions(results, history, host, tolerance, window):
+    regressions = {}
+    for name, r in results.items():
+        past = [h['results'][name]['median_s'] for h in history
+                if h.get('host') == host and name in h.get('results', {})][-window:]
+        if not past:
+            continue
+        baseline = float(np.median(past))
+        ratio = r['median_s'] / baseline
+        r['baseline_s'] = baseline
+        r['ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions[name] = ratio
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the feature extraction and inference hot paths.")
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown vs the baseline (0.25 = 25%%)")
+    parser.add_argument("--window", type=int, default=5, help="Past runs forming the baseline")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 256])
+    parser.add_argument("--min-time", type=float, default=0.2, help="Target seconds per benchmark")
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads for the CNN benchmarks")
+    parser.add_argument("--record", action="store_true",
+                        help="Append this run to the history if it has no regressions")
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    results = {}
+    for name, fn in build_benchmarks(args.batch_sizes).items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = time_call(fn, min_time=args.min_time)
+
+    host = platform.node()
+    regressions = check_regressions(results, load_history(args.history), host,
+                                    args.tolerance, args.window)
+
+    print(f"{'benchmark':<22}{'median (ms)':>13}{'min (ms)':>11}{'vs baseline':>13}")
+    for name, r in results.items():
+        ratio = f"{r['ratio']:.2f}x" if 'ratio' in r else "-"
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<22}{r['median_s'] * 1e3:>13.4f}{r['min_s'] * 1e3:>11.4f}{ratio:>13}{flag}")
+
+    if args.record and regressions:
+        print("\nNot recorded: a regressed run would move the baseline towards the regression")
+    elif args.record:
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'host': host,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'torch': torch.__version__,
+            'torch_threads': torch.get_num_threads(),
+            'results': results,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"\nRecorded in {args.history}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than {1 + args.tolerance:.2f}x baseline")
+        sys.exit(1)
@@ -0,0 +1,197 @@
+"""
+float32 vs float64 Precision Report
+-----------------------------------
+
+Runs the PSD feature path (as_waveform -> safe_resample -> preprocess -> Welch ->
+log / z-score -> EarthquakeCNN2d) once in float64 and once in float32 (see the
+precision notes in paros_quake/preprocessing.py) on the same segments, and reports what
+float32 saves and what it changes.
+
+Report:
+-------
+- memory: raw waveform arrays, PSD pickle structure (in memory and pickled size)
+  and the stacked (events, 11, 52) training array, per precision.
+- speed: median seconds per call of the full 60 s feature path and of each stage.
+- deltas vs float64: max / mean absolute difference of log10 PSD and of the
+  z-scored features, max |delta prob_earthquake| and the number of class flips.
+- naive_cast: the same deltas for casting the raw samples straight to float32
+  without removing the DC offset first, to show why as_waveform does that.
+
+Segments are synthetic 20 Hz waveforms with the absolute pressure offset of the
+raw Paros data (`--offset`, half of them with an earthquake-like burst), or the
+raw event / background pickles with `--pickles`.
+
+Usage:
+------
+    python benchmarks/precision_report.py
+    python benchmarks/precision_report.py --pickles DataCollection_Preprocessing/Exported_Paros_Data --out precision.json
+
+Dependencies:
+-------------
+- NumPy, SciPy, PyTorch
+- Eval (Preprocessing_fun, DataQueryUtils, cnn_model), benchmarks/bench_hot_paths.py
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import sys
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "Eval"))
+
+from bench_hot_paths import synthetic_waveform, time_call
+# torch and the feature path are imported where they are used
+
+
+def synthetic_segments(n, offset, seed=0):
+    segments = []
+    for i in range(n):
+        x = synthetic_waveform(seed=seed + i)
+        if i % 2:
+            # Background only: remove the burst synthetic_waveform adds
+            x = 3e-4 * np.random.default_rng(seed + i).standard_normal(len(x))
+        segments.append(offset + x)
+    return segments
+
+def recorded_segments(folder, limit, sensor_key="parost2_141929"):
+    segments = []
+    for name in ("EarthQuakeEvents.pkl", "background_data.pkl"):
+        with open(os.path.join(folder, name), 'rb') as f:
+            data = pickle.load(f)
+        for entry in list(data.values())[:limit // 2]:
+            segments.append(np.asarray(entry['waveform'][sensor_key][:, -1], dtype=np.float64))
+    return segments
+
+
+def run_mode(segments, dtype, naive=False):
+    """Raw PSD windows and frequency axis of every usable segment."""
+    from Preprocessing_fun import as_waveform
+    from DataQueryUtils import psd_windows_from_samples
+    powers, frequency, raw_bytes = [], None, 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for x in segments:
+            if naive:
+                x = np.asarray(x, dtype=np.float32).astype(np.float64)
+            raw_bytes += as_waveform(x, dtype).nbytes
+            out = psd_windows_from_samples(x, dtype=dtype)
+            if out is None:
+                powers.append(None)
+                continue
+            powers.append(out[0])
+            frequency = out[1]
+    return powers, frequency, raw_bytes
+
+
+def psd_struct_bytes(powers, frequency):
+    struct = {f"event_{i+1:03d}": {f"window_{w+1:03d}": {'power': p[w], 'frequency': frequency}
+                                   for w in range(len(p))}
+              for i, p in enumerate(powers)}
+    in_memory = sum(p.nbytes for p in powers) + len(powers) * len(powers[0]) * frequency.nbytes
+    return in_memory, len(pickle.dumps(struct))
+
+
+def stage_timings(x, dtype, min_time):
+    from Preprocessing_fun import as_waveform, safe_resample, preprocess, welch_psd
+    from DataQueryUtils import psd_windows_from_samples
+    w = as_waveform(x, dtype)
+    x100 = safe_resample(w, 20, 100, dtype)
+    pre = preprocess(x100, 100, dtype)
+
+    def full():
+        with contextlib.redirect_stdout(io.StringIO()):
+            psd_windows_from_samples(x, dtype=dtype)
+
+    return {
+        'feature_60s': time_call(full, min_time)['median_s'],
+        'safe_resample': time_call(lambda: safe_resample(w, 20, 100, dtype), min_time)['median_s'],
+        'preprocess': time_call(lambda: preprocess(x100, 100, dtype), min_time)['median_s'],
+        'welch_psd': time_call(lambda: welch_psd(pre[:1000], 100, dtype), min_time)['median_s'],
+    }
+
+
+def deltas(ref_powers, powers, model, mean, std):
+    import torch
+    from DataQueryUtils import normalize_psd
+    both = [(a, b) for a, b in zip(ref_powers, powers) if a is not None and b is not None]
+    ref = np.stack([a for a, _ in both]).astype(np.float64)
+    cur = np.stack([b for _, b in both]).astype(np.float64)
+    log_diff = np.abs(np.log10(cur + 1e-10) - np.log10(ref + 1e-10))
+
+    z_ref = np.stack([normalize_psd(a, mean, std) for a, _ in both])
+    z_cur = np.stack([normalize_psd(b, mean, std) for _, b in both])
+    with torch.no_grad():
+        p_ref = torch.softmax(model(torch.from_numpy(z_ref).unsqueeze(1)), dim=1).numpy()
+        p_cur = torch.softmax(model(torch.from_numpy(z_cur).unsqueeze(1)), dim=1).numpy()
+    return {
+        'segments': len(both),
+        'log_psd_max_abs': float(log_diff.max()),
+        'log_psd_mean_abs': float(log_diff.mean()),
+        'feature_max_abs': float(np.abs(z_cur - z_ref).max()),
+        'prob_max_abs': float(np.abs(p_cur[:, 1] - p_ref[:, 1]).max()),
+        'class_flips': int((p_cur.argmax(1) != p_ref.argmax(1)).sum()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the float32 and float64 feature paths.")
+    parser.add_argument("--pickles", help="Folder with EarthQuakeEvents.pkl / background_data.pkl")
+    parser.add_argument("--segments", type=int, default=200)
+    parser.add_argument("--offset", type=float, default=1013.25,
+                        help="Absolute pressure offset of the synthetic segments")
+    parser.add_argument("--model", default=os.path.join(REPO_ROOT, "ModelTraining/fold_outputs/fold_5/CNNmodel.pth"))
+    parser.add_argument("--stats-dir", default=os.path.join(REPO_ROOT, "DataCollection_Preprocessing/Exported_Paros_Data"))
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--out", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    import torch
+    from cnn_model import EarthquakeCNN2d
+
+    segments = (recorded_segments(args.pickles, args.segments) if args.pickles
+                else synthetic_segments(args.segments, args.offset))
+    model = EarthquakeCNN2d(input_shape=(11, 52))
+    model.load_state_dict(torch.load(args.model, map_location="cpu"))
+    model.eval()
+    mean = np.load(os.path.join(args.stats_dir, "mean.npy"))
+    std = np.load(os.path.join(args.stats_dir, "std.npy"))
+
+    report = {'segments': len(segments), 'source': args.pickles or f"synthetic (offset {args.offset})"}
+    results = {}
+    for name in ("float64", "float32"):
+        powers, frequency, raw_bytes = run_mode(segments, name)
+        valid = [p for p in powers if p is not None]
+        struct_bytes, pickled_bytes = psd_struct_bytes(valid, frequency)
+        results[name] = powers
+        report[name] = {
+            'memory_bytes': {
+                'raw_waveforms': raw_bytes,
+                'psd_struct': struct_bytes,
+                'psd_pickle': pickled_bytes,
+                'training_array': int(np.stack(valid).nbytes),
+            },
+            'seconds': stage_timings(segments[0], name, args.min_time),
+        }
+
+    report['float32_vs_float64'] = deltas(results['float64'], results['float32'], model, mean, std)
+    naive_powers, _, _ = run_mode(segments, "float64", naive=True)
+    report['naive_cast_vs_float64'] = deltas(results['float64'], naive_powers, model, mean, std)
+
+    m64, m32 = report['float64']['memory_bytes'], report['float32']['memory_bytes']
+    s64, s32 = report['float64']['seconds'], report['float32']['seconds']
+    print(f"{'memory':<16}{'float64 (MB)':>14}{'float32 (MB)':>14}{'ratio':>8}")
+    for key in m64:
+        print(f"{key:<16}{m64[key] / 1e6:>14.3f}{m32[key] / 1e6:>14.3f}{m32[key] / m64[key]:>8.2f}")
+    print(f"\n{'stage':<16}{'float64 (ms)':>14}{'float32 (ms)':>14}{'speedup':>8}")
+    for key in s64:
+        print(f"{key:<16}{s64[key] * 1e3:>14.4f}{s32[key] * 1e3:>14.4f}{s64[key] / s32[key]:>8.2f}")
+    print("\nfloat32 vs float64:", json.dumps(report['float32_vs_float64']))
+    print("naive float32 cast vs float64:", json.dumps(report['naive_cast_vs_float64']))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,151 @@
+"""
+Startup Time per `paros` Command
+--------------------------------
+
+Measures how long each `paros` command takes from process start to exit in a
+fresh interpreter, and which heavy libraries it imports on the way. Script
+commands run with `--help`: their module-level imports are what a user waits for
+before any work starts. The quick commands (catalog filtering, prediction store
+and registry queries, scan status) run a real, small invocation against
+temporary fixtures.
+
+Report:
+-------
+- median / min wall seconds over `--repeats` runs per command
+- heavy: the heavy packages (numpy, pandas, scipy, torch, sklearn, geopy, tqdm)
+  the command imported, with the seconds spent importing their modules (sum of
+  the self times of `python -X importtime`, so packages are not counted twice)
+- python: a bare `python -c pass` for reference
+
+Commands in QUICK must finish within `--budget` seconds (default 0.5); the run
+exits with code 1 otherwise. The data collection commands are skipped: the
+fetchers import the InfluxDB client (paros_data_grabber) at startup.
+
+Usage:
+------
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --repeats 10 --filter catalog --out startup.json
+
+Dependencies:
+-------------
+- NumPy (fixtures only); the commands are timed in subprocesses
+- paros_quake (installed, or imported from this checkout)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from paros_quake.cli import SCRIPTS
+
+HEAVY = ("numpy", "pandas", "scipy", "torch", "sklearn", "geopy", "tqdm")
+QUICK = ("help", "catalog", "catalog --arrivals", "store", "store --events",
+         "registry list", "range-scan status")
+
+
+def make_fixtures(folder):
+    """A small prediction store, an empty registry and a scan directory."""
+    from paros_quake.prediction_store import PredictionStore
+    store = PredictionStore(os.path.join(folder, "store"))
+    for minute in range(2880):
+        start = 1746403200 * 10**9 + minute * 60 * 10**9
+        prob = 0.9 if minute % 97 < 3 else 0.1
+        store.append(start, start + 60 * 10**9, int(prob > 0.5), prob, query_time=start)
+    store.close()
+    os.makedirs(os.path.join(folder, "registry"))
+    subprocess.run([sys.executable, "-m", "paros_quake", "range-scan", "init", "--dir",
+                    os.path.join(folder, "scan"), "--start", "2025-05-05", "--end", "2025-05-06",
+                    "--shard-minutes", "60", "--fake"], check=True, capture_output=True, cwd=REPO_ROOT)
+
+
+def cases(folder):
+    store = os.path.join(folder, "store")
+    yield "help", ["--help"]
+    yield "catalog", ["catalog", "--min-mag", "5", "--count"]
+    yield "catalog --arrivals", ["catalog", "--min-mag", "5", "--arrivals", "--out", os.devnull]
+    yield "store", ["store", store, "--min-prob", "0.5", "--out", os.devnull]
+    yield "store --events", ["store", store, "--events", "--out", os.devnull]
+    yield "registry list", ["registry", "--root", os.path.join(folder, "registry"), "list"]
+    yield "range-scan status", ["range-scan", "status", "--dir", os.path.join(folder, "scan")]
+    for name, (_, in_folder, _) in SCRIPTS.items():
+        if not in_folder and name != "startup":
+            yield f"{name} --help", [name, "--help"]
+
+
+def run(args, env):
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-m", "paros_quake", *args], capture_output=True,
+                          text=True, env=env, cwd=REPO_ROOT)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"paros {' '.join(args)} failed:\n{proc.stderr[-2000:]}")
+    return elapsed
+
+
+def heavy_imports(args, env):
+    """Seconds spent importing the modules of each heavy package a command loads."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-m", "paros_quake", *args],
+                          capture_output=True, text=True, env=env, cwd=REPO_ROOT)
+    found = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        self_us, _, name = line.split("|")
+        root = name.strip().split(".")[0]
+        if root in HEAVY:
+            found[root] = found.get(root, 0.0) + int(self_us.split(":")[1]) / 1e6
+    return found
+
+
+def measure(args, env, repeats):
+    times = [run(args, env) for _ in range(repeats)]
+    return {'median_s': statistics.median(times), 'min_s': min(times)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup time per paros command.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="Max median seconds for the quick commands")
+    parser.add_argument("--filter", help="Only commands containing this string")
+    parser.add_argument("--out", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    report = {}
+    t0 = time.perf_counter()
+    for _ in range(args.repeats):
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+    report['python'] = {'median_s': (time.perf_counter() - t0) / args.repeats}
+
+    with tempfile.TemporaryDirectory() as folder:
+        make_fixtures(folder)
+        for name, command in cases(folder):
+            if args.filter and args.filter not in name:
+                continue
+            report[name] = {**measure(command, env, args.repeats), 'heavy': heavy_imports(command, env)}
+
+    over = []
+    print(f"{'command':<28}{'median (s)':>11}{'min (s)':>9}  heavy imports (s)")
+    for name, r in report.items():
+        heavy = ", ".join(f"{k} {v:.2f}" for k, v in sorted(r.get('heavy', {}).items(), key=lambda kv: -kv[1]))
+        flag = ""
+        if name in QUICK and r['median_s'] > args.budget:
+            over.append(name)
+            flag = "  OVER BUDGET"
+        print(f"{name:<28}{r['median_s']:>11.3f}{r.get('min_s', r['median_s']):>9.3f}  {heavy or '-'}{flag}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'budget_s': args.budget, 'results': report}, f, indent=2)
+    if over:
+        print(f"\n{len(over)} quick command(s) over the {args.budget:.2f} s budget: {', '.join(over)}")
+        sys.exit(1)
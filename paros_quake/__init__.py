@@ -0,0 +1,72 @@
+"""
+paros_quake: Earthquake vs. Background Classification Suite as a Package
+------------------------------------------------------------------------
+
+Single home for the code that used to be copy-pasted between
+DataCollection_Preprocessing, Eval and ModelTraining. The old module names in
+those folders (Preprocessing_fun, cnn_model, profiling, DataQueryUtils,
+gridding, prediction_store) are shims that return these modules.
+
+Modules:
+--------
+- preprocessing     as_waveform, dc_block, preprocess, welch_psd, safe_resample
+- model             ConvBlock2d, EarthquakeCNN2d, CompactEarthquakeCNN2d, build_model
+- data_query        live / range InfluxDB queries and the 60 s PSD feature path
+- gridding          timestamp gridding and per-window quality
+- prediction_store  columnar prediction log
+- catalog           USGS catalog reading and surface-wave arrival windows
+- profiling         opt-in stage timers
+- cli               the `paros` command (see `paros --help`)
+
+Heavy dependencies load lazily: `import paros_quake` imports nothing else, and
+the names below resolve to their module on first access, so
+`from paros_quake import EarthquakeCNN2d` imports torch but not SciPy or pandas.
+
+Usage:
+------
+    pip install -e .                  # from the repository root
+    paros --help
+    from paros_quake import EarthquakeCNN2d, psd_features_from_samples
+"""
+
+import importlib
+
+__version__ = "0.1.0"
+
+_EXPORTS = {
+    'as_waveform': "preprocessing",
+    'dc_block': "preprocessing",
+    'preprocess': "preprocessing",
+    'welch_psd': "preprocessing",
+    'safe_resample': "preprocessing",
+    'ConvBlock2d': "model",
+    'EarthquakeCNN2d': "model",
+    'CompactEarthquakeCNN2d': "model",
+    'build_model': "model",
+    'psd_windows_from_samples': "data_query",
+    'psd_features_from_samples': "data_query",
+    'psd_features_from_grid': "data_query",
+    'normalize_psd': "data_query",
+    'live_stream_query_for_model': "data_query",
+    'psd_vectors_from_range': "data_query",
+    'grid_samples': "gridding",
+    'window_quality': "gridding",
+    'PredictionStore': "prediction_store",
+    'read_catalog': "catalog",
+    'surface_wave_delay': "catalog",
+    'PROFILER': "profiling",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
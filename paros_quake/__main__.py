@@ -0,0 +1,3 @@
+from paros_quake.cli import main
+
+main()
@@ -0,0 +1,214 @@
+"""
+`paros` Command-Line Interface
+------------------------------
+
+One entry point for the preprocessing, training, evaluation and benchmark
+scripts of the repository:
+
+    paros <command> [options]         (or: python -m paros_quake <command> ...)
+
+Script commands run the existing script (Eval/, ModelTraining/,
+DataCollection_Preprocessing/, benchmarks/) as `__main__` with its folder on
+sys.path, so `paros range-scan ...` behaves exactly like
+`python Eval/range_scan.py ...`. The data collection scripts have hard-coded
+relative paths and run inside their folder; all other commands keep the current
+directory, so relative paths on the command line mean what they say.
+
+`catalog` and `store` are implemented here on NumPy alone (no pandas, SciPy or
+torch), for quick catalog filtering and prediction log queries.
+
+Nothing is imported before a command is chosen: this module only needs the
+standard library, and each command loads what it uses.
+benchmarks/startup_time.py measures the resulting startup time per command.
+
+Script commands need a source checkout (`pip install -e .`); `catalog` and
+`store` work from any install.
+
+Dependencies:
+-------------
+- Standard library (dispatch); each command imports its own dependencies
+"""
+
+import argparse
+import os
+import runpy
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CATALOG = os.path.join(REPO_ROOT, "DataCollection_Preprocessing", "EarthQuakeData.csv")
+
+# command: (script relative to the repository root, run inside its folder, help)
+SCRIPTS = {
+    'fetch-background': ("DataCollection_Preprocessing/generateBackgroundData.py", True,
+                         "Query new background hours from InfluxDB into background_data.pkl"),
+    'fetch-events': ("DataCollection_Preprocessing/usgsEarthquakeDataGrabber.py", True,
+                     "Query new catalog event waveforms into EarthQuakeEvents.pkl"),
+    'psd-background': ("DataCollection_Preprocessing/PSD_Background_processor.py", True,
+                       "Background waveforms -> PSD window pickle (new waveforms only)"),
+    'psd-events': ("DataCollection_Preprocessing/PSD_Earthquake_processor.py", True,
+                   "Earthquake waveforms -> PSD window pickle (new waveforms only)"),
+    'norm-stats': ("ModelTraining/norm_stats.py", False, "Streaming mean.npy / std.npy builder"),
+    'train': ("ModelTraining/train_folds.py", False, "Train the K folds in parallel processes"),
+    'sweep': ("ModelTraining/sweep.py", False, "Parallel hyperparameter / architecture sweeps"),
+    'distill': ("ModelTraining/distill.py", False, "Distill the fold ensemble into a compact student"),
+    'finetune': ("ModelTraining/finetune.py", False, "Append confirmed events and fine-tune a checkpoint"),
+    'bench-batches': ("ModelTraining/tensor_batches.py", False, "TensorBatchIterator vs DataLoader epoch time"),
+    'catalog-eval': ("Eval/catalog_eval.py", False, "Score predictions against catalog arrivals"),
+    'hard-negatives': ("Eval/hard_negatives.py", False, "Mine high-probability non-earthquake windows"),
+    'range-scan': ("Eval/range_scan.py", False, "Sharded, resumable range scans (init/run/status/merge)"),
+    'registry': ("Eval/model_registry.py", False, "Manage versioned model bundles"),
+    'live': ("Eval/live_monitor.py", False, "Long-running live monitor with hot model reload"),
+    'replay': ("Eval/replay_monitor.py", False, "Replay the live loop on fake data at Nx speed"),
+    'pretrigger': ("Eval/pretrigger.py", False, "Calibrate / evaluate the STA/LTA pre-trigger"),
+    'sliding': ("Eval/sliding_cnn.py", False, "Score a long span at a 5 s hop in one pass"),
+    'bench': ("benchmarks/bench_hot_paths.py", False, "Hot path benchmarks with regression check"),
+    'precision': ("benchmarks/precision_report.py", False, "float32 vs float64 feature path report"),
+    'startup': ("benchmarks/startup_time.py", False, "Startup time per paros command"),
+}
+NATIVE = {
+    'catalog': "Filter the USGS catalog and list expected arrival windows",
+    'store': "Query a prediction store (windows or merged events)",
+}
+
+
+def _usage():
+    lines = ["usage: paros <command> [options]", "", "commands:"]
+    for name, help_text in NATIVE.items():
+        lines.append(f"  {name:<18}{help_text}")
+    for name, (_, _, help_text) in SCRIPTS.items():
+        lines.append(f"  {name:<18}{help_text}")
+    lines += ["", "Run `paros <command> --help` for the options of a command."]
+    return "\n".join(lines)
+
+
+def run_script(command, argv):
+    script, in_folder, _ = SCRIPTS[command]
+    path = os.path.join(REPO_ROOT, script)
+    if not os.path.exists(path):
+        sys.exit(f"paros {command}: {script} not found; script commands need a source checkout "
+                 f"(pip install -e .)")
+    folder = os.path.dirname(path)
+    sys.path.insert(0, folder)
+    sys.argv = [f"paros {command}", *argv]
+    if in_folder:
+        os.chdir(folder)
+    runpy.run_path(path, run_name="__main__")
+
+
+def _format_ns(ns):
+    import numpy as np
+    return np.datetime_as_string(np.asarray(ns, dtype='datetime64[ns]'), unit='s')
+
+
+def _write_rows(columns, header, out):
+    import csv
+    f = open(out, 'w', newline='') if out else sys.stdout
+    try:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(zip(*columns))
+    finally:
+        if out:
+            f.close()
+
+
+def catalog_command(argv):
+    parser = argparse.ArgumentParser(prog="paros catalog", description=NATIVE['catalog'])
+    parser.add_argument("--csv", default=DEFAULT_CATALOG, help="USGS catalog CSV")
+    parser.add_argument("--start", help="ISO time (UTC)")
+    parser.add_argument("--end", help="ISO time (UTC)")
+    parser.add_argument("--min-mag", type=float)
+    parser.add_argument("--max-mag", type=float)
+    parser.add_argument("--max-distance", type=float, help="Max distance to the station (km)")
+    parser.add_argument("--arrivals", action="store_true",
+                        help="Add distance, arrival time and the 15 s / 45 s arrival window")
+    parser.add_argument("--count", action="store_true", help="Only print the number of events")
+    parser.add_argument("--out", help="Write CSV here instead of stdout")
+    args = parser.parse_args(argv)
+
+    from paros_quake.catalog import read_catalog, distances_km, select, VSURFACE
+    catalog = read_catalog(args.csv, args.min_mag, args.max_mag, args.start, args.end)
+    distance = None
+    if args.max_distance is not None or args.arrivals:
+        distance = distances_km(catalog)
+        if args.max_distance is not None:
+            keep = distance <= args.max_distance
+            catalog, distance = select(catalog, keep), distance[keep]
+    if args.count:
+        print(len(catalog['time']))
+        return
+
+    header = ["time", "latitude", "longitude", "depth", "mag", "magtype", "id", "place"]
+    columns = [_format_ns(catalog['time'])] + [catalog[name] for name in header[1:]]
+    if args.arrivals:
+        arrival = catalog['time'] + (distance / VSURFACE * 1e9).astype('int64')
+        header += ["distance_km", "arrival_time", "arrival_start", "arrival_end"]
+        columns += [distance.round(3), _format_ns(arrival),
+                    _format_ns(arrival - 15 * 10**9), _format_ns(arrival + 45 * 10**9)]
+    _write_rows(columns, header, args.out)
+
+
+def store_command(argv):
+    parser = argparse.ArgumentParser(prog="paros store", description=NATIVE['store'])
+    parser.add_argument("root", help="PredictionStore directory")
+    parser.add_argument("--start", help="ISO time (UTC)")
+    parser.add_argument("--end", help="ISO time (UTC)")
+    parser.add_argument("--min-prob", type=float, help="Min prob_earthquake (events: min max_prob)")
+    parser.add_argument("--class", dest="predicted_class", type=int, choices=[0, 1])
+    parser.add_argument("--events", action="store_true", help="Merged event intervals instead of windows")
+    parser.add_argument("--count", action="store_true", help="Only print the number of rows")
+    parser.add_argument("--limit", type=int, help="Print at most this many rows")
+    parser.add_argument("--out", help="Write CSV here instead of stdout")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.root):
+        sys.exit(f"paros store: {args.root} is not a directory")
+
+    from paros_quake.prediction_store import PredictionStore
+    store = PredictionStore(args.root)
+    if args.events:
+        data = store.event_columns(args.start, args.end, min_max_prob=args.min_prob)
+        header = ["event_start", "event_end", "n_windows", "max_prob", "mean_prob"]
+    else:
+        data = store.query_columns(args.start, args.end, min_prob=args.min_prob,
+                                   predicted_class=args.predicted_class)
+        header = ["window_start", "window_end", "predicted_class", "prob_earthquake", "prob_background"]
+    n = len(data[header[0]])
+    if args.count:
+        print(n)
+        return
+
+    rows = slice(0, args.limit)
+    columns = [_format_ns(data[name][rows]) if name.endswith(('_start', '_end')) else
+               data[name][rows].round(5) if data[name].dtype.kind == 'f' else data[name][rows]
+               for name in header]
+    _write_rows(columns, header, args.out)
+    if args.limit is not None and n > args.limit and not args.out:
+        print(f"... {n - args.limit} more rows", file=sys.stderr)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(_usage())
+        return
+    if argv[0] in ("-V", "--version"):
+        from paros_quake import __version__
+        print(__version__)
+        return
+
+    command, rest = argv[0], argv[1:]
+    if command in NATIVE:
+        try:
+            catalog_command(rest) if command == "catalog" else store_command(rest)
+        except BrokenPipeError:
+            # Output piped into `head` and the like: stop quietly
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    elif command in SCRIPTS:
+        run_script(command, rest)
+    else:
+        print(_usage(), file=sys.stderr)
+        sys.exit(f"\nparos: unknown command {command!r}")
+
+
+if __name__ == "__main__":
+    main()
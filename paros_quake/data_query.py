@@ -0,0 +1,399 @@
+"""
+Paros Infrasound PSD Feature Extraction Module for Earthquake Detection
+----------------------------------------------------------------------
+
+This module provides functions to query, preprocess, and extract Power Spectral
+Density (PSD) features from raw waveform data collected by Paros infrasound sensors.
+
+Functions:
+----------
+1. live_stream_query_for_model():
+   - Queries the most recent 60-second waveform segment from the Paros sensor via InfluxDB.
+   - Resamples and preprocesses the raw waveform to a target sampling rate.
+   - Splits the 60-second segment into eleven overlapping 10-second windows.
+   - Computes the Welch PSD for each window and stacks them into a 2D PSD feature array.
+   - Applies log scaling and optional z-score normalization using provided mean and std.
+   - Returns the normalized PSD feature array for immediate model inference.
+
+2. psd_vectors_from_range():
+   - Iterates over a user-defined datetime range in 60-second increments.
+   - For each 60-second segment, performs identical preprocessing and PSD extraction as above.
+   - Returns a list of timestamped PSD feature arrays suitable for batch inference or analysis.
+
+3. psd_features_from_samples():
+   - Shared feature path used by both queries: resample, preprocess, window, Welch PSD,
+     log scaling and optional normalization of one 60-second segment.
+   - Split into psd_windows_from_samples() (raw PSD windows in the pickle format) and
+     normalize_psd() (log scaling + z-score) for callers that need the raw powers.
+   - `dtype` (or PAROS_PRECISION=float32) runs resampling and Welch in float32, see
+     preprocessing.py. Both query functions pass their `dtype` through, on the
+     gridded path too.
+
+With `gridded=True` both query functions place the samples on the exact 20 Hz grid
+of the requested minute using their timestamps (see gridding.py) instead of
+assuming they are contiguous. Gaps no longer shift the windows; each of the
+eleven windows gets a quality mask, partially valid minutes still produce
+features (masked windows at z = 0), and minutes with fewer than `min_windows`
+usable windows skip the PSD and inference stages. psd_vectors_from_range returns
+the same (start, end, features) tuples either way; with `return_masks=True` it
+also returns the per-window masks as a separate list aligned with the results
+(all True on the contiguous path).
+
+Both query functions accept an optional `pretrigger` (see Eval/pretrigger.py). When given,
+the raw 20 Hz samples are screened first and quiet segments skip the feature
+extraction and CNN stages entirely. They also accept `query_fn`, a stand-in for
+query_influx_data (see Eval/fake_influx.py), and the live query takes an explicit
+`end_time` so it can be driven by a simulated clock.
+
+Inputs:
+-------
+- Sensor and database connection parameters.
+- Raw waveform data queried from InfluxDB.
+- Optional normalization parameters (mean, std) computed from training data.
+
+Outputs:
+--------
+- Normalized PSD feature arrays shaped (windows x frequency_bins) ready for
+  input into machine learning models for earthquake detection.
+
+Dependencies:
+-------------
+- NumPy
+- datetime
+- Custom utilities: paros_data_grabber.query_influx_data, preprocessing (preprocess, welch_psd, safe_resample),
+  profiling (opt-in per-stage timers, see profiling.py), gridding (timestamp gridding and window quality)
+
+Author: Ethan Gelfand
+Date: 08/12/2025
+"""
+
+import numpy as np
+from datetime import datetime, timedelta, timezone
+try:
+    from paros_data_grabber import query_influx_data
+except ImportError:  # offline use: pass query_fn (e.g. fake_influx.FakeInflux)
+    query_influx_data = None
+from .preprocessing import preprocess, welch_psd, safe_resample, as_waveform
+from .profiling import stage, count
+from .gridding import grid_samples, window_quality, df_times_ns
+
+def psd_windows_from_samples(
+    samples,
+    fs_in=20,
+    fs_out=100,
+    window_duration=10,
+    overlap=0.5,
+    dtype=None
+):
+    """
+    Raw Welch PSDs of the eleven windows of one 60-second segment.
+
+    Returns (power (11, freq_bins), frequency) as written to the PSD pickles,
+    or None if the segment is too short to yield the expected eleven windows.
+    dtype selects the working precision (default preprocessing.PRECISION).
+    """
+    samples = as_waveform(samples, dtype)
+    with stage("safe_resample"):
+        x = safe_resample(samples, fs_in, fs_out, dtype)
+    with stage("preprocess"):
+        x = preprocess(x, fs_out, dtype)
+
+    # Pad only if close to 6000 ~95% or greater
+    if 5700 <= len(x) < 6000:
+        pad_len = 6000 - len(x)
+        x = np.pad(x, (0, pad_len), mode='constant')
+        print(f"Padded waveform with {pad_len} zeros to reach 6000 samples.")
+
+    # Early exit if not enough data
+    if len(x) < 6000:
+        print(f"Insufficient data after resampling: {len(x)} samples")
+        return None
+
+    # PSD windowing
+    win_length = int(window_duration * fs_out)
+    step = int(win_length * (1 - overlap))
+    n_windows = (len(x) - win_length) // step + 1
+
+    if n_windows != 11:
+        print(f"Number of windows found: {n_windows} (expected 11). Skipping.")
+        return None
+
+    psd_list = []
+    for i in range(n_windows):
+        start_idx = i * step
+        end_idx = start_idx + win_length
+        window_data = x[start_idx:end_idx]
+        with stage("welch_psd"):
+            pxx, f = welch_psd(window_data, fs_out, dtype)
+        psd_list.append(pxx)
+
+    return np.vstack(psd_list), f
+
+
+def psd_features_from_samples(
+    samples,
+    fs_in=20,
+    fs_out=100,
+    window_duration=10,
+    overlap=0.5,
+    mean=None,
+    std=None,
+    dtype=None
+):
+    """
+    Turn one 60-second segment of raw samples into the (11, 52) model input.
+
+    Returns the (optionally z-scored) log10 PSD array as float32, or None if the
+    segment is too short to yield the expected eleven windows.
+    """
+    windows = psd_windows_from_samples(samples, fs_in, fs_out, window_duration, overlap, dtype)
+    if windows is None:
+        return None
+    return normalize_psd(windows[0], mean, std)
+
+
+def normalize_psd(psd_array, mean=None, std=None):
+    """log10 scaling and optional z-score of raw PSD windows, as float32."""
+    log_pxx = np.log10(psd_array + 1e-10)
+    if mean is not None and std is not None:
+        z_pxx = (log_pxx - mean) / (std + 1e-6)
+    else:
+        z_pxx = log_pxx
+
+    return z_pxx.astype(np.float32)
+
+
+def psd_features_from_grid(
+    grid,
+    valid,
+    fs_in=20,
+    fs_out=100,
+    window_duration=10,
+    overlap=0.5,
+    mean=None,
+    std=None,
+    dtype=None,
+    min_quality=0.9,
+    min_windows=6
+):
+    """
+    Model input from one 60-second segment placed on the sample grid (see gridding.py).
+
+    Returns (features, window_ok). Windows with less than min_quality valid samples
+    skip their Welch PSD and are imputed at the training mean (z = 0). With fewer
+    than min_windows usable windows, features is None and the segment skips
+    resampling and filtering altogether.
+    """
+    window_ok = window_quality(valid, fs_in, window_duration, overlap) >= min_quality
+    count("windows_masked", int((~window_ok).sum()))
+    if window_ok.sum() < max(min_windows, 1):
+        return None, window_ok
+
+    x = as_waveform(grid, dtype)
+    with stage("safe_resample"):
+        x = safe_resample(x, fs_in, fs_out, dtype)
+    with stage("preprocess"):
+        x = preprocess(x, fs_out, dtype)
+
+    win_length = int(window_duration * fs_out)
+    step = int(win_length * (1 - overlap))
+    psd_array = None
+    for i in np.flatnonzero(window_ok):
+        with stage("welch_psd"):
+            pxx, _ = welch_psd(x[i * step:i * step + win_length], fs_out, dtype)
+        if psd_array is None:
+            psd_array = np.full((len(window_ok), len(pxx)), np.nan)
+        psd_array[i] = pxx
+
+    z_pxx = normalize_psd(psd_array, mean, std)
+    if mean is not None and std is not None:
+        z_pxx[~window_ok] = 0.0
+    else:
+        z_pxx[~window_ok] = z_pxx[window_ok].mean(axis=0)
+    return z_pxx, window_ok
+
+
+def _gridded_features(waveform, start_time, total_duration, fs_in, fs_out, window_duration, overlap,
+                      mean, std, min_quality, min_windows, dtype=None):
+    start_ns = int(np.datetime64(start_time, 'ns').astype(np.int64))
+    grid, valid, grid_stats = grid_samples(df_times_ns(waveform), waveform['value'].values, start_ns,
+                                           n_samples=int(total_duration * fs_in), fs=fs_in)
+    count("samples_missing", grid_stats['missing'])
+    count("samples_duplicate", grid_stats['duplicates'])
+    return psd_features_from_grid(grid, valid, fs_in=fs_in, fs_out=fs_out, window_duration=window_duration,
+                                  overlap=overlap, mean=mean, std=std, dtype=dtype, min_quality=min_quality,
+                                  min_windows=min_windows)
+
+
+def live_stream_query_for_model(
+    sensor_id="141929",
+    box_id="parost2",
+    password="******", # Replace with actual password
+    fs_in=20,
+    fs_out=100,
+    total_duration=60,
+    window_duration=10,
+    overlap=0.5,
+    mean=None,
+    std=None,
+    pretrigger=None,
+    query_fn=None,
+    end_time=None,
+    gridded=False,
+    min_quality=0.9,
+    min_windows=6,
+    dtype=None
+):
+    query_fn = query_fn or query_influx_data
+    try:
+        # Get timestamps for 60-second segment
+        if end_time is None:
+            end_time = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+        start_time = end_time - timedelta(seconds=total_duration)
+
+        start_str = start_time.isoformat(timespec='seconds')
+        end_str = end_time.isoformat(timespec='seconds')
+        print(f"Querying data from {start_str} to {end_str}")
+
+        # Query data
+        with stage("query_influx_data"):
+            data = query_fn(
+                start_time=start_str,
+                end_time=end_str,
+                box_id=box_id,
+                sensor_id=sensor_id,
+                password=password
+            )
+
+        key = f"{box_id}_{sensor_id}"
+        waveform = data.get(key)
+        if waveform is None or waveform.empty:
+            print("No data received")
+            return None
+
+        samples = waveform['value'].values
+        count("samples_received", len(samples))
+
+        # Cheap first stage: skip the full pipeline on quiet segments
+        if pretrigger is not None and not pretrigger(samples):
+            count("pretrigger_skipped")
+            print("Pre-trigger: quiet segment, skipping CNN features")
+            return None
+
+        if gridded:
+            z_pxx, window_ok = _gridded_features(waveform, start_time, total_duration, fs_in, fs_out,
+                                                 window_duration, overlap, mean, std, min_quality,
+                                                 min_windows, dtype)
+            if z_pxx is None:
+                print(f"Only {window_ok.sum()} usable windows, skipping")
+            return z_pxx
+
+        return psd_features_from_samples(
+            samples,
+            fs_in=fs_in,
+            fs_out=fs_out,
+            window_duration=window_duration,
+            overlap=overlap,
+            mean=mean,
+            std=std,
+            dtype=dtype
+        )
+
+    except Exception as e:
+        print("Error during stream:", e)
+        return None
+
+        
+def psd_vectors_from_range(
+    start_time,
+    end_time,
+    sensor_id="141929",
+    box_id="parost2",
+    password="*****", # Replace with actual password
+    fs_in=20,
+    fs_out=100,
+    window_duration=10,
+    overlap=0.5,
+    mean=None,
+    std=None,
+    pretrigger=None,
+    query_fn=None,
+    gridded=False,
+    min_quality=0.9,
+    min_windows=6,
+    return_masks=False,
+    dtype=None
+):
+    query_fn = query_fn or query_influx_data
+    results = []
+    masks = []
+    skipped = 0
+
+    duration = 60  # 60-second segments
+    current_time = start_time
+
+    while current_time + timedelta(seconds=duration) <= end_time:
+        seg_start = current_time
+        seg_end = current_time + timedelta(seconds=duration)
+        current_time = seg_end
+
+        # Query
+        try:
+            with stage("query_influx_data"):
+                data = query_fn(
+                    start_time=seg_start.isoformat(timespec="seconds"),
+                    end_time=seg_end.isoformat(timespec="seconds"),
+                    box_id=box_id,
+                    sensor_id=sensor_id,
+                    password=password
+                )
+
+            key = f"{box_id}_{sensor_id}"
+            waveform = data.get(key)
+            if waveform is None or waveform.empty:
+                print(f"No data for window {seg_start} to {seg_end}")
+                continue
+
+            samples = waveform['value'].values
+            count("samples_received", len(samples))
+
+            if pretrigger is not None and not pretrigger(samples):
+                skipped += 1
+                count("pretrigger_skipped")
+                continue
+
+            if gridded:
+                z_pxx, window_ok = _gridded_features(waveform, seg_start, duration, fs_in, fs_out,
+                                                     window_duration, overlap, mean, std, min_quality,
+                                                     min_windows, dtype)
+                if z_pxx is not None:
+                    results.append((seg_start, seg_end, z_pxx))
+                    masks.append(window_ok)
+                continue
+
+            z_pxx = psd_features_from_samples(
+                samples,
+                fs_in=fs_in,
+                fs_out=fs_out,
+                window_duration=window_duration,
+                overlap=overlap,
+                mean=mean,
+                std=std,
+                dtype=dtype
+            )
+            if z_pxx is None:
+                continue
+
+            results.append((seg_start, seg_end, z_pxx))
+            masks.append(np.ones(len(z_pxx), dtype=bool))
+
+        except Exception as e:
+            print(f"Failed to process window {seg_start} to {seg_end}: {e}")
+            continue
+
+    if pretrigger is not None:
+        print(f"Pre-trigger skipped {skipped} quiet segments")
+
+    if return_masks:
+        return results, masks  # masks[i]: usable windows of results[i]
+    return results  # List of (start_time, end_time, psd_vector)
@@ -0,0 +1,167 @@
+"""
+EarthquakeCNN2d Model Definition for Infrasound PSD Classification
+------------------------------------------------------------------
+
+This script defines a 2D Convolutional Neural Network architecture tailored
+for classifying earthquake vs background events using Power Spectral Density
+(PSD) features extracted from infrasound waveform data.
+
+Key Components:
+---------------
+- ConvBlock2d: A reusable convolutional block including convolution, batch
+  normalization, ReLU activation, max pooling, and dropout for regularization.
+- EarthquakeCNN2d: The main CNN model consisting of two ConvBlock2d layers,
+  followed by fully connected layers that output class logits for binary
+  classification (earthquake or background).
+- DepthwiseSeparableBlock2d: ConvBlock2d with the convolution split into a
+  per-channel (depthwise) and a 1x1 (pointwise) convolution.
+- CompactEarthquakeCNN2d: small student model for the sensor host (one
+  ConvBlock2d, one depthwise-separable block, one hidden layer; about a tenth
+  of the parameters), trained by distillation from the fold ensemble
+  (ModelTraining/distill.py). Same input and output as EarthquakeCNN2d.
+- build_model(input_shape, architecture, **kwargs): either model by class
+  name, as stored in model registry configs.
+
+Features:
+---------
+- Automatic padding calculation to preserve spatial dimensions during convolution.
+- Dynamic computation of the flattened feature vector size to accommodate varying
+  input PSD dimensions (windows x frequency bins).
+- Uses ReLU activations and dropout for effective training and generalization.
+- Outputs raw logits for subsequent use with softmax and cross-entropy loss.
+- Channel counts, kernel sizes, hidden widths and dropout are constructor
+  arguments (used by ModelTraining/sweep.py). The defaults are the original
+  architecture, and the layer names do not depend on them, so existing
+  CNNmodel.pth checkpoints load unchanged.
+
+Inputs and Outputs:
+-------------------
+- Input: 4D tensor with shape (batch_size, 1, windows, freq_bins), representing PSD
+  features as a 2D image with one channel.
+- Output: Tensor with shape (batch_size, 2) containing logits for the two classes.
+
+Author: Ethan Gelfand
+Date: 08/12/2025
+"""
+
+import torch
+import torch.nn as nn
+
+# --- Model Definition ---
+class ConvBlock2d(nn.Module):
+    def __init__(self, in_channels, out_channels, kernel_size, pool_kernel=2, padding=None, dropout=0.3):
+        super().__init__()
+        
+        # Automatically compute padding if not given
+        if padding is None:
+            if isinstance(kernel_size, tuple):
+                padding = tuple(k // 2 for k in kernel_size)
+            else:
+                padding = kernel_size // 2
+        
+        self.conv = nn.Conv2d(in_channels, out_channels, kernel_size, padding=padding)
+        self.bn = nn.BatchNorm2d(out_channels)
+        self.relu = nn.ReLU()
+        self.pool = nn.MaxPool2d(kernel_size=pool_kernel, stride=pool_kernel)
+        self.dropout = nn.Dropout(dropout)
+
+    def forward(self, x):
+        x = self.conv(x)
+        x = self.bn(x)
+        x = self.relu(x)
+        x = self.pool(x)
+        x = self.dropout(x)
+        return x
+
+
+class EarthquakeCNN2d(nn.Module):
+    def __init__(self, input_shape, channels=(16, 32), kernel_sizes=((5, 5), (3, 5)),
+                 hidden=(128, 64), dropout=0.3):
+        super().__init__()
+        # input_shape: (windows, freq_bins)
+        self.conv1 = ConvBlock2d(1, channels[0], kernel_size=tuple(kernel_sizes[0]), dropout=dropout)
+        self.conv2 = ConvBlock2d(channels[0], channels[1], kernel_size=tuple(kernel_sizes[1]),
+                                 dropout=dropout)  # (3, 5) by default: more time context
+        
+        # Calculate flattened feature size dynamically
+        self.flatten_dim = self._get_flattened_size(input_shape)
+
+        self.fc1 = nn.Linear(self.flatten_dim, hidden[0])
+        self.fc_hidden = nn.Linear(hidden[0], hidden[1])
+        self.fc2 = nn.Linear(hidden[1], 2)
+
+    def _get_flattened_size(self, input_shape):
+        with torch.no_grad():
+            dummy = torch.zeros(1, 1, *input_shape)
+            x = self.conv1(dummy)
+            x = self.conv2(x)
+            return x.view(1, -1).shape[1]
+
+    def forward(self, x):
+        x = self.conv1(x)
+        x = self.conv2(x)
+        x = x.view(x.size(0), -1)
+        x = torch.relu(self.fc1(x))
+        x = torch.relu(self.fc_hidden(x))
+        x = self.fc2(x)
+        return x
+
+
+class DepthwiseSeparableBlock2d(nn.Module):
+    def __init__(self, in_channels, out_channels, kernel_size, pool_kernel=2, dropout=0.1):
+        super().__init__()
+        padding = tuple(k // 2 for k in kernel_size)
+        # BatchNorm follows, so the convolutions need no bias
+        self.depthwise = nn.Conv2d(in_channels, in_channels, kernel_size, padding=padding,
+                                   groups=in_channels, bias=False)
+        self.pointwise = nn.Conv2d(in_channels, out_channels, kernel_size=1, bias=False)
+        self.bn = nn.BatchNorm2d(out_channels)
+        self.relu = nn.ReLU()
+        self.pool = nn.MaxPool2d(kernel_size=pool_kernel, stride=pool_kernel)
+        self.dropout = nn.Dropout(dropout)
+
+    def forward(self, x):
+        x = self.pointwise(self.depthwise(x))
+        x = self.bn(x)
+        x = self.relu(x)
+        x = self.pool(x)
+        x = self.dropout(x)
+        return x
+
+
+class CompactEarthquakeCNN2d(nn.Module):
+    def __init__(self, input_shape, channels=(8, 16), kernel_sizes=((5, 5), (3, 5)), hidden=32, dropout=0.1):
+        super().__init__()
+        # A depthwise convolution of the single input channel would be one filter,
+        # so the first block stays a regular convolution
+        self.conv1 = ConvBlock2d(1, channels[0], kernel_size=tuple(kernel_sizes[0]), dropout=dropout)
+        self.conv2 = DepthwiseSeparableBlock2d(channels[0], channels[1], tuple(kernel_sizes[1]), dropout=dropout)
+
+        self.flatten_dim = self._get_flattened_size(input_shape)
+
+        self.fc1 = nn.Linear(self.flatten_dim, hidden)
+        self.fc2 = nn.Linear(hidden, 2)
+
+    def _get_flattened_size(self, input_shape):
+        with torch.no_grad():
+            dummy = torch.zeros(1, 1, *input_shape)
+            return self.conv2(self.conv1(dummy)).view(1, -1).shape[1]
+
+    def forward(self, x):
+        x = self.conv1(x)
+        x = self.conv2(x)
+        x = x.view(x.size(0), -1)
+        x = torch.relu(self.fc1(x))
+        return self.fc2(x)
+
+
+ARCHITECTURES = {
+    'EarthquakeCNN2d': EarthquakeCNN2d,
+    'CompactEarthquakeCNN2d': CompactEarthquakeCNN2d,
+}
+
+
+def build_model(input_shape, architecture="EarthquakeCNN2d", **kwargs):
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture {architecture!r} (known: {', '.join(ARCHITECTURES)})")
+    return ARCHITECTURES[architecture](input_shape=tuple(input_shape), **kwargs)
\ No newline at end of file
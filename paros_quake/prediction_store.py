@@ -0,0 +1,364 @@
+"""
+Columnar, Time-Partitioned Prediction Store
+-------------------------------------------
+
+Replaces the row-per-minute CSV logs written by the Eval notebooks with a store
+that appends predictions in batches to columnar NumPy files partitioned by day,
+and merges consecutive positive windows into event intervals as they are written.
+
+Layout:
+-------
+    <root>/predictions/date=YYYY-MM-DD/part-NNNNN.npz
+        window_start, window_end, query_time   int64 (ns since epoch, UTC, naive)
+        predicted_class                        int8
+        prob_earthquake, prob_background       float32
+    <root>/events/date=YYYY-MM-DD/part-NNNNN.npz
+        event_start, event_end                 int64 (ns)
+        n_windows                              int32
+        max_prob, mean_prob                    float32
+    <root>/state.json                          event still open at the last flush
+
+Behaviour:
+----------
+- append() buffers rows; flush() happens every `batch_size` rows and on close().
+- A window predicted as class 1 extends the open event if it starts no later than
+  `merge_gap` seconds after the event's end, otherwise it closes the open event
+  and starts a new one. Events are partitioned by their start day. The open event
+  is kept in state.json, so a restarted monitor keeps merging into it.
+- When appends move on to a new day, the previous day's part files are compacted
+  into a single file.
+- Predictions are keyed by window_start: a window written again (e.g. a range
+  scored a second time) replaces the earlier row in query results and in
+  compaction (last write wins). Identical event intervals are deduplicated the
+  same way, but events of a run with different predictions would still add to
+  the old ones, so a range that is scored again should first be cleared with
+  delete_range(start, end), as the range notebook does. delete_range removes
+  the predictions starting in [start, end) and every event overlapping it.
+- query() / events() read only the partitions overlapping the requested range and
+  filter with vectorized masks (time range, probability threshold, class).
+  query_columns() / event_columns() return the same rows as NumPy arrays without
+  importing pandas, which keeps `paros store` quick to start.
+- export_csv() writes the previous CSV layout (query_time, window_start,
+  window_end, predicted_class, prob_earthquake, prob_background); import_csv()
+  loads an existing CSV log into a store.
+
+Usage:
+------
+    store = PredictionStore("LoggedData/prediction_store")
+    store.append(window_start, window_end, pred, prob_earthquake)
+    store.close()
+    strong = store.query(start, end, predicted_class=1, min_prob=0.90)
+    store.export_csv("LoggedData/Earthquake_Event_Log.csv", start, end, predicted_class=1)
+
+Dependencies:
+-------------
+- NumPy, pandas (DataFrame results and CSV import/export only)
+"""
+
+import glob
+import json
+import os
+from datetime import datetime, timezone
+import re
+import numpy as np
+
+
+PREDICTION_COLUMNS = {
+    'window_start': np.int64,
+    'window_end': np.int64,
+    'query_time': np.int64,
+    'predicted_class': np.int8,
+    'prob_earthquake': np.float32,
+    'prob_background': np.float32,
+}
+EVENT_COLUMNS = {
+    'event_start': np.int64,
+    'event_end': np.int64,
+    'n_windows': np.int32,
+    'max_prob': np.float32,
+    'mean_prob': np.float32,
+}
+CSV_HEADER = ["query_time", "window_start", "window_end", "predicted_class", "prob_earthquake", "prob_background"]
+NS_PER_DAY = 86_400 * 10**9
+_NAIVE_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+
+
+def to_ns(t):
+    """datetime / ISO string / Timestamp (naive = UTC) -> int ns since epoch."""
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    # Plain datetimes and naive ISO strings are handled without pandas
+    if type(t) is datetime:
+        if t.tzinfo is not None:
+            t = t.astimezone(timezone.utc).replace(tzinfo=None)
+        return int(np.datetime64(t, 'ns').astype(np.int64))
+    if isinstance(t, str) and _NAIVE_ISO.match(t):
+        return int(np.datetime64(t, 'ns').astype(np.int64))
+    import pandas as pd
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert(None)
+    return int(ts.value)
+
+def _day(ns):
+    return str(np.datetime64(int(ns), 'ns').astype('datetime64[D]'))
+
+_KEYS = {'predictions': 'window_start', 'events': 'event_start'}
+
+def _latest(columns, key):
+    """Rows sorted by key, keeping only the last-written row of each key."""
+    keys = columns[key]
+    # Last occurrence of each key: unique over the reversed array
+    _, last = np.unique(keys[::-1], return_index=True)
+    keep = len(keys) - 1 - last  # sorted by key, as np.unique sorts
+    return {name: values[keep] for name, values in columns.items()}
+
+def _save_npz(path, columns):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **columns)
+    os.replace(tmp, path)  # readers never see a partial part file
+
+
+class PredictionStore:
+    def __init__(self, root, batch_size=1440, merge_gap=0.0):
+        self.root = root
+        self.batch_size = batch_size
+        self.merge_gap_ns = int(merge_gap * 1e9)
+        self._rows = {name: [] for name in PREDICTION_COLUMNS}
+        self._closed_events = []
+        self._open_event = None
+        self._last_day = None
+        os.makedirs(root, exist_ok=True)
+
+        state_path = os.path.join(root, "state.json")
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            self._open_event = state.get('open_event')
+            self._last_day = state.get('last_day')
+
+    # --- Writing ---
+    def append(self, window_start, window_end, predicted_class, prob_earthquake,
+               prob_background=None, query_time=None):
+        start_ns, end_ns = to_ns(window_start), to_ns(window_end)
+        query_ns = to_ns(query_time) if query_time is not None else to_ns(datetime.now(timezone.utc))
+        predicted_class = int(predicted_class)
+        prob_earthquake = float(prob_earthquake)
+        prob_background = 1 - prob_earthquake if prob_background is None else float(prob_background)
+
+        day = _day(start_ns)
+        if self._last_day is not None and day != self._last_day:
+            self.flush()
+            self.compact(self._last_day)
+        self._last_day = day
+
+        for name, value in zip(PREDICTION_COLUMNS,
+                               (start_ns, end_ns, query_ns, predicted_class, prob_earthquake,
+                                prob_background)):
+            self._rows[name].append(value)
+
+        self._merge_event(start_ns, end_ns, predicted_class, prob_earthquake)
+
+        if len(self._rows['window_start']) >= self.batch_size:
+            self.flush()
+
+    def _merge_event(self, start_ns, end_ns, predicted_class, prob):
+        event = self._open_event
+        if event is not None and start_ns > event['event_end'] + self.merge_gap_ns:
+            self._closed_events.append(event)
+            event = self._open_event = None
+
+        if predicted_class != 1:
+            return
+        if event is None:
+            self._open_event = {'event_start': start_ns, 'event_end': end_ns, 'n_windows': 1,
+                                'max_prob': prob, 'sum_prob': prob}
+        else:
+            event['event_end'] = max(event['event_end'], end_ns)
+            event['n_windows'] += 1
+            event['max_prob'] = max(event['max_prob'], prob)
+            event['sum_prob'] += prob
+
+    def _next_part(self, table, day):
+        parts = glob.glob(os.path.join(self.root, table, f"date={day}", "part-*.npz"))
+        numbers = [int(os.path.basename(p)[5:10]) for p in parts]
+        return os.path.join(self.root, table, f"date={day}", f"part-{max(numbers, default=-1) + 1:05d}.npz")
+
+    def _write_events(self, events):
+        if not events:
+            return
+        days = np.array([_day(e['event_start']) for e in events])
+        for day in np.unique(days):
+            sel = [e for e, d in zip(events, days) if d == day]
+            _save_npz(self._next_part("events", day), {
+                'event_start': np.array([e['event_start'] for e in sel], dtype=np.int64),
+                'event_end': np.array([e['event_end'] for e in sel], dtype=np.int64),
+                'n_windows': np.array([e['n_windows'] for e in sel], dtype=np.int32),
+                'max_prob': np.array([e['max_prob'] for e in sel], dtype=np.float32),
+                'mean_prob': np.array([e['sum_prob'] / e['n_windows'] for e in sel], dtype=np.float32),
+            })
+
+    def flush(self):
+        if self._rows['window_start']:
+            columns = {name: np.array(values, dtype=PREDICTION_COLUMNS[name])
+                       for name, values in self._rows.items()}
+            days = (columns['window_start'] // NS_PER_DAY)
+            for day_index in np.unique(days):
+                sel = days == day_index
+                day = _day(int(day_index) * NS_PER_DAY)
+                _save_npz(self._next_part("predictions", day),
+                          {name: values[sel] for name, values in columns.items()})
+            self._rows = {name: [] for name in PREDICTION_COLUMNS}
+
+        self._write_events(self._closed_events)
+        self._closed_events = []
+
+        with open(os.path.join(self.root, "state.json"), 'w') as f:
+            json.dump({'open_event': self._open_event, 'last_day': self._last_day}, f)
+
+    def close(self):
+        """Flush buffered rows and close the open event."""
+        if self._open_event is not None:
+            self._closed_events.append(self._open_event)
+            self._open_event = None
+        self.flush()
+
+    def _rewrite_day(self, table, day, keep=None):
+        """Replace the part files of one day by one sorted, deduplicated part filtered by keep(columns)."""
+        day_dir = os.path.join(self.root, table, f"date={day}")
+        parts = sorted(glob.glob(os.path.join(day_dir, "part-*.npz")))
+        if not parts:
+            return
+        loaded = []
+        for p in parts:
+            with np.load(p) as d:
+                loaded.append({name: d[name] for name in d.files})
+        columns = _latest({name: np.concatenate([d[name] for d in loaded]) for name in loaded[0]},
+                          _KEYS[table])
+        if keep is not None:
+            mask = keep(columns)
+            columns = {name: values[mask] for name, values in columns.items()}
+        tmp_path = os.path.join(day_dir, "compact.npz")
+        _save_npz(tmp_path, columns)
+        for p in parts:
+            os.remove(p)
+        os.replace(tmp_path, os.path.join(day_dir, "part-00000.npz"))
+
+    def compact(self, day):
+        """Merge all part files of one day into a single part per table."""
+        for table in ("predictions", "events"):
+            if len(glob.glob(os.path.join(self.root, table, f"date={day}", "part-*.npz"))) >= 2:
+                self._rewrite_day(table, day)
+
+    def delete_range(self, start, end):
+        """Remove predictions with window_start in [start, end) and events overlapping it."""
+        self.flush()
+        start_ns, end_ns = to_ns(start), to_ns(end)
+        event = self._open_event
+        if event is not None and event['event_end'] > start_ns and event['event_start'] < end_ns:
+            self._open_event = None
+        for table, first_day in (("predictions", _day(start_ns)), ("events", _day(start_ns - NS_PER_DAY))):
+            for day_dir in sorted(glob.glob(os.path.join(self.root, table, "date=*"))):
+                day = os.path.basename(day_dir)[5:]
+                if first_day <= day <= _day(end_ns):
+                    if table == "predictions":
+                        keep = lambda c: (c['window_start'] < start_ns) | (c['window_start'] >= end_ns)
+                    else:
+                        keep = lambda c: (c['event_end'] <= start_ns) | (c['event_start'] >= end_ns)
+                    self._rewrite_day(table, day, keep)
+        self.flush()  # persist the open event change
+
+    # --- Reading ---
+    def _load(self, table, columns, start, end):
+        start_ns = to_ns(start) if start is not None else None
+        end_ns = to_ns(end) if end is not None else None
+        first_day = _day(start_ns) if start_ns is not None else None
+        # Events are partitioned by start day but may begin before `start`
+        if table == "events" and start_ns is not None:
+            first_day = _day(start_ns - NS_PER_DAY)
+        last_day = _day(end_ns) if end_ns is not None else None
+
+        chunks = []
+        for day_dir in sorted(glob.glob(os.path.join(self.root, table, "date=*"))):
+            day = os.path.basename(day_dir)[5:]
+            if (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            for part in sorted(glob.glob(os.path.join(day_dir, "part-*.npz"))):
+                with np.load(part) as d:
+                    chunks.append({name: d[name] for name in columns})
+
+        if not chunks:
+            return {name: np.array([], dtype=dtype) for name, dtype in columns.items()}, start_ns, end_ns
+        data = {name: np.concatenate([c[name] for c in chunks]) for name in columns}
+        return data, start_ns, end_ns
+
+    def query_columns(self, start=None, end=None, min_prob=None, predicted_class=None):
+        """Predictions with window_start in [start, end) as sorted NumPy columns (times in ns)."""
+        data, start_ns, end_ns = self._load("predictions", PREDICTION_COLUMNS, start, end)
+        data = _latest(data, 'window_start')
+        mask = np.ones(len(data['window_start']), dtype=bool)
+        if start_ns is not None:
+            mask &= data['window_start'] >= start_ns
+        if end_ns is not None:
+            mask &= data['window_start'] < end_ns
+        if min_prob is not None:
+            mask &= data['prob_earthquake'] >= min_prob
+        if predicted_class is not None:
+            mask &= data['predicted_class'] == predicted_class
+        order = np.argsort(data['window_start'][mask], kind='stable')
+        return {name: values[mask][order] for name, values in data.items()}
+
+    def query(self, start=None, end=None, min_prob=None, predicted_class=None):
+        """Predictions with window_start in [start, end), sorted by time."""
+        import pandas as pd
+        df = pd.DataFrame(self.query_columns(start, end, min_prob, predicted_class))
+        for col in ('window_start', 'window_end', 'query_time'):
+            df[col] = pd.to_datetime(df[col], unit='ns')
+        return df
+
+    def event_columns(self, start=None, end=None, min_max_prob=None):
+        """Merged event intervals overlapping [start, end) as sorted NumPy columns."""
+        data, start_ns, end_ns = self._load("events", EVENT_COLUMNS, start, end)
+        data = _latest(data, 'event_start')
+        mask = np.ones(len(data['event_start']), dtype=bool)
+        if start_ns is not None:
+            mask &= data['event_end'] > start_ns
+        if end_ns is not None:
+            mask &= data['event_start'] < end_ns
+        if min_max_prob is not None:
+            mask &= data['max_prob'] >= min_max_prob
+        order = np.argsort(data['event_start'][mask], kind='stable')
+        return {name: values[mask][order] for name, values in data.items()}
+
+    def events(self, start=None, end=None, min_max_prob=None):
+        """Merged event intervals overlapping [start, end), sorted by start."""
+        import pandas as pd
+        df = pd.DataFrame(self.event_columns(start, end, min_max_prob))
+        for col in ('event_start', 'event_end'):
+            df[col] = pd.to_datetime(df[col], unit='ns')
+        return df
+
+    # --- CSV compatibility ---
+    def export_csv(self, path, start=None, end=None, min_prob=None, predicted_class=None):
+        import pandas as pd
+        df = self.query(start, end, min_prob=min_prob, predicted_class=predicted_class)
+        out = pd.DataFrame({
+            'query_time': df['query_time'].dt.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+            'window_start': df['window_start'].dt.strftime("%Y-%m-%dT%H:%M:%S"),
+            'window_end': df['window_end'].dt.strftime("%Y-%m-%dT%H:%M:%S"),
+            'predicted_class': df['predicted_class'].astype(int),
+            'prob_earthquake': df['prob_earthquake'].astype(float).round(5),
+            'prob_background': df['prob_background'].astype(float).round(5),
+        }, columns=CSV_HEADER)
+        out.to_csv(path, index=False)
+        return len(out)
+
+    def import_csv(self, path):
+        import pandas as pd
+        df = pd.read_csv(path)
+        time_col = 'query_time' if 'query_time' in df.columns else 'timestamp'
+        for row in df.itertuples(index=False):
+            self.append(row.window_start, row.window_end, row.predicted_class, row.prob_earthquake,
+                        prob_background=row.prob_background, query_time=getattr(row, time_col))
+        return len(df)
@@ -0,0 +1,113 @@
+"""
+Waveform Processing Utilities for Infrasound/Earthquake Data
+
+This script provides signal processing functions to prepare raw waveform data
+for PSD computation and model inference. It includes DC blocking, filtering,
+resampling, and Welch PSD estimation.
+
+Functions:
+- dc_block(x, a=0.999):
+    Applies a DC blocking filter to remove low-frequency bias.
+
+- preprocess(x, fs):
+    Applies DC blocking and a high-pass Butterworth filter with 0.1 Hz cutoff.
+
+- welch_psd(x, fs):
+    Computes the Welch Power Spectral Density (PSD) using a 5-second Hann window,
+    75% overlap, and keeps frequency components up to 10 Hz. x may also be a
+    stack of windows (n_windows, samples); the PSD is taken along the last axis.
+
+- safe_resample(x, fs_in, fs_out):
+    Resamples the signal from fs_in to fs_out safely by applying low-pass filtering
+    before resampling to avoid aliasing.
+
+- as_waveform(x):
+    Converts raw samples to a 1D array in the working precision.
+
+Settings:
+- FILTER_SETTINGS holds the DC-block coefficient, filter cutoffs and orders and
+  the Welch parameters the functions above use.
+
+Precision:
+- PRECISION (env PAROS_PRECISION, default "float64") or the `dtype` argument of
+  each function selects the working precision. In "float32" mode the raw samples
+  have their DC offset removed in float64 before the cast (absolute pressures
+  would otherwise lose the small infrasound signal to float32 rounding), the
+  resampling FIR and Welch PSD run in float32, and outputs are float32. The IIR
+  filters (DC block, Butterworth) always run in float64: their poles sit close to
+  the unit circle and are not stable to compute in float32. "float64" reproduces
+  the previous results exactly.
+
+Intended Use:
+- These functions are designed to prepare infrasound waveform data for
+  spectral analysis and classification with machine learning models.
+
+Dependencies:
+- NumPy
+- SciPy (signal module)
+
+Ethan Gelfand, 08/06/2025
+"""
+
+import os
+import numpy as np
+from scipy.signal import windows, welch, filtfilt, butter, resample_poly
+
+
+## --- Functions for processing waveform data --- ##
+PRECISION = np.dtype(os.environ.get("PAROS_PRECISION", "float64"))
+
+# Filter and PSD settings used by the functions below (the data collection
+# pipeline hashes them to decide which cached PSDs are still valid)
+FILTER_SETTINGS = {
+    'dc_block_a': 0.999,
+    'highpass_hz': 0.1,
+    'highpass_order': 4,
+    'antialias_fraction': 0.9,   # of the lower Nyquist frequency
+    'antialias_order': 4,
+    'welch_window': "hann",
+    'welch_segment_s': 5,
+    'welch_overlap': 0.75,
+    'psd_fmax_hz': 10,
+}
+
+def as_waveform(x, dtype=None):
+    dtype = np.dtype(dtype or PRECISION)
+    x = np.asarray(x, dtype=np.float64).ravel()
+    if dtype == np.float64:
+        return x
+    return (x - x.mean()).astype(dtype)
+
+def dc_block(x, a=FILTER_SETTINGS['dc_block_a']):
+    b = [1, -1]
+    a_coeffs = [1, -a]
+    return filtfilt(b, a_coeffs, x)
+
+def preprocess(x, fs, dtype=None):
+    x = dc_block(x)
+    low_cutoff = FILTER_SETTINGS['highpass_hz']
+    Wn = low_cutoff / (fs / 2)
+    b, a = butter(FILTER_SETTINGS['highpass_order'], Wn, btype='high')
+    return filtfilt(b, a, x).astype(dtype or PRECISION, copy=False)
+
+def welch_psd(x, fs, dtype=None):
+    dtype = np.dtype(dtype or PRECISION)
+    window_duration = FILTER_SETTINGS['welch_segment_s']
+    nperseg = int(fs * window_duration)
+    noverlap = int(nperseg * FILTER_SETTINGS['welch_overlap'])
+    nfft = int(2 ** np.ceil(np.log2(nperseg)))
+
+    window = windows.get_window(FILTER_SETTINGS['welch_window'], nperseg, fftbins=False).astype(dtype, copy=False)
+    x = np.asarray(x).astype(dtype, copy=False)
+    f, pxx = welch(x, fs, window=window, noverlap=noverlap, nfft=nfft, detrend=False)
+
+    keep = f <= FILTER_SETTINGS['psd_fmax_hz']
+    return pxx[..., keep], f[keep]
+
+def safe_resample(x, fs_in, fs_out, dtype=None):
+    x = dc_block(x)
+    fc = FILTER_SETTINGS['antialias_fraction'] * min(fs_in, fs_out) / 2
+    b_lp, a_lp = butter(FILTER_SETTINGS['antialias_order'], fc / (fs_in / 2), btype='low')
+    x = filtfilt(b_lp, a_lp, x).astype(dtype or PRECISION, copy=False)
+    y = resample_poly(x, fs_out, fs_in)
+    return y
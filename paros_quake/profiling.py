@@ -0,0 +1,165 @@
+"""
+Opt-In Stage Profiling for Training and Inference
+-------------------------------------------------
+
+Lightweight instrumentation layer that records how long each pipeline stage takes
+(InfluxDB queries, resampling, filtering, Welch PSD, model forward, CSV logging,
+...) and how often things happen, then summarizes the distribution per stage.
+
+Profiling is off by default. While disabled, `stage()` returns a shared no-op
+context manager, so the instrumented code paths pay only an attribute check.
+
+Key Components:
+---------------
+- Profiler: collects per-stage durations and named counters.
+    - stage(name): context manager timing one execution of a stage.
+    - count(name, n=1): increments a counter.
+    - summary(): count, total, mean, p50/p95/p99 and max per stage, plus a
+      log-spaced duration histogram.
+    - write_report(path): JSON (full summary) or CSV (one row per stage),
+      chosen by the file extension.
+- PROFILER: module-level instance used by the instrumented modules; `stage`,
+  `count`, `enable`, `disable` and `write_report` are its bound methods.
+- torch_trace(path): optional torch.profiler context that exports a Chrome trace.
+
+Usage:
+------
+    from paros_quake.profiling import PROFILER, stage
+    PROFILER.enable()                    # or set PAROS_PROFILE=1 before starting
+    with stage("model_forward"):
+        output = model(input_tensor)
+    PROFILER.write_report("profile.json")
+
+Dependencies:
+-------------
+- NumPy
+- PyTorch (torch_trace only)
+"""
+
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+
+
+# Histogram bucket upper edges in seconds: 10 us ... 100 s, 4 per decade
+HISTOGRAM_EDGES = np.logspace(-5, 2, 29)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('samples', 'start')
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.durations = defaultdict(list)
+        self.counters = defaultdict(int)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.durations.clear()
+        self.counters.clear()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self.durations[name])
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def summary(self):
+        stages = {}
+        for name, samples in self.durations.items():
+            if not samples:
+                continue
+            d = np.asarray(samples)
+            hist, _ = np.histogram(d, bins=np.concatenate(([0.0], HISTOGRAM_EDGES, [np.inf])))
+            stages[name] = {
+                'count': int(d.size),
+                'total_s': float(d.sum()),
+                'mean_s': float(d.mean()),
+                'p50_s': float(np.percentile(d, 50)),
+                'p95_s': float(np.percentile(d, 95)),
+                'p99_s': float(np.percentile(d, 99)),
+                'max_s': float(d.max()),
+                'histogram': {'upper_edges_s': HISTOGRAM_EDGES.tolist() + ['inf'],
+                              'counts': hist.tolist()},
+            }
+        return {'stages': stages, 'counters': dict(self.counters)}
+
+    def write_report(self, path):
+        summary = self.summary()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        if path.endswith(".csv"):
+            fields = ['stage', 'count', 'total_s', 'mean_s', 'p50_s', 'p95_s', 'p99_s', 'max_s']
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(fields)
+                for name, s in sorted(summary['stages'].items()):
+                    writer.writerow([name] + [s[k] for k in fields[1:]])
+                for name, value in sorted(summary['counters'].items()):
+                    writer.writerow([f"counter:{name}", value] + [''] * (len(fields) - 2))
+        else:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+        return summary
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"{'stage':<24}{'count':>8}{'total (s)':>12}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}")
+        for name, s in sorted(summary['stages'].items(), key=lambda kv: -kv[1]['total_s']):
+            print(f"{name:<24}{s['count']:>8}{s['total_s']:>12.3f}"
+                  f"{s['p50_s'] * 1e3:>11.2f}{s['p95_s'] * 1e3:>11.2f}{s['p99_s'] * 1e3:>11.2f}")
+        for name, value in sorted(summary['counters'].items()):
+            print(f"{name:<24}{value:>8}")
+
+
+PROFILER = Profiler(enabled=os.environ.get("PAROS_PROFILE", "0") not in ("", "0"))
+stage = PROFILER.stage
+count = PROFILER.count
+enable = PROFILER.enable
+disable = PROFILER.disable
+write_report = PROFILER.write_report
+
+
+@contextmanager
+def torch_trace(path, record_shapes=False):
+    """Run the enclosed block under torch.profiler and export a Chrome trace to path."""
+    from torch.profiler import profile, ProfilerActivity
+
+    with profile(activities=[ProfilerActivity.CPU], record_shapes=record_shapes) as prof:
+        yield prof
+    prof.export_chrome_trace(path)